@@ -0,0 +1,259 @@
+# analytics.py
+# Отчёты для администратора: активные пользователи, удержание по неделям,
+# точность по категориям и понятия с самой крутой кривой обучения
+#
+# Таблицы читаются порциями по ANALYTICS_CHUNK строк (короткие запросы без
+# долгой транзакции, запись обработчиков не ждёт) в столбцы NumPy, отчёты
+# считаются векторно. Готовый отчёт кэшируется на ANALYTICS_TTL секунд.
+
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+import cache
+import database
+import metrics
+from config import (
+    ANALYTICS_CHUNK, ANALYTICS_TTL, ANALYTICS_DAYS, ANALYTICS_COHORT_WEEKS,
+    ANALYTICS_MIN_ATTEMPTS, ANALYTICS_MIN_USERS, ANALYTICS_TOP
+)
+
+BUILD_SECONDS = metrics.histogram(
+    'webtech_analytics_build_seconds', 'Время построения отчёта аналитики')
+
+report_cache = cache.LRUCache('analytics', 1, ANALYTICS_TTL)
+
+EPOCH = date(1970, 1, 1)
+
+def _day(number):
+    """Номер дня от 1970-01-01 -> 'ГГГГ-ММ-ДД'"""
+    return (EPOCH + timedelta(days=int(number))).isoformat()
+
+def _week(days):
+    """Номер недели (с понедельника); 1970-01-01 — четверг"""
+    return (days + 3) // 7
+
+# =============================================================================
+# ЗАГРУЗКА
+# =============================================================================
+
+def load_columns(fetch, width, chunk=ANALYTICS_CHUNK):
+    """Таблица порциями fetch(после_ключа, сколько) -> массив int64 (строк, width)"""
+    parts = []
+    after = 0
+    while True:
+        rows = fetch(after, chunk)
+        if not rows:
+            break
+        part = np.array(rows, dtype=np.int64)
+        parts.append(part)
+        after = int(part[-1, 0])
+        if len(rows) < chunk:
+            break
+    if not parts:
+        return np.empty((0, width), dtype=np.int64)
+    return np.concatenate(parts)
+
+def activity(quizzes, daily, progress):
+    """Уникальные пары (пользователь, день активности), отсортированные по пользователю и дню"""
+    reviewed = progress[:, 3] >= 0
+    users = np.concatenate([quizzes[:, 1], daily[:, 1], progress[reviewed, 1]])
+    days = np.concatenate([quizzes[:, 2], daily[:, 2], progress[reviewed, 3]])
+    # Пара упаковывается в одно число: день занимает младшие 16 бит
+    keys = np.unique(users * 65536 + days)
+    return keys >> 16, keys & 0xFFFF
+
+# =============================================================================
+# ОТЧЁТЫ
+# =============================================================================
+
+def daily_active_users(users, days, today, window):
+    """Активные пользователи по дням за window дней, за 7 и за 30 дней"""
+    start = today - window + 1
+    recent = (days >= start) & (days <= today)
+    counts = np.bincount(days[recent] - start, minlength=window)
+    return {
+        'daily': [{'day': _day(start + i), 'users': int(count)} for i, count in enumerate(counts)],
+        'wau': int(np.unique(users[days > today - 7]).size),
+        'mau': int(np.unique(users[days > today - 30]).size),
+    }
+
+def retention_cohorts(users, days, today, weeks):
+    """Когорты по неделе первой активности: доля вернувшихся на 0..weeks-1 неделе"""
+    if users.size == 0:
+        return []
+    # Пары отсортированы по пользователю, первая пара пользователя — его первый день
+    starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+    first_week = np.repeat(_week(days[starts]), np.diff(np.r_[starts, users.size]))
+    offset = _week(days) - first_week
+
+    oldest = _week(today) - weeks + 1
+    cohort = first_week - oldest
+    recent = (cohort >= 0) & (offset < weeks)
+    # Несколько дней одной недели считаются одним возвратом
+    cells = np.unique(users[recent] * weeks * weeks + cohort[recent] * weeks + offset[recent]) % (weeks * weeks)
+    matrix = np.bincount(cells, minlength=weeks * weeks).reshape(weeks, weeks)
+
+    result = []
+    for index in range(weeks):
+        size = int(matrix[index, 0])
+        observed = weeks - index
+        result.append({
+            'week': _day((oldest + index) * 7 - 3),
+            'users': size,
+            'retention': [round(float(matrix[index, k]) * 100 / size, 1)
+                          for k in range(observed)] if size else [],
+        })
+    return result
+
+def accuracy_by_category(progress, categories, min_attempts):
+    """Распределение точности пользователей в викторинах по категориям понятий
+    (учитываются пары пользователь-категория с min_attempts ответами и больше)"""
+    if progress.size == 0 or not categories:
+        return {}
+    ids = np.fromiter(categories.keys(), dtype=np.int64, count=len(categories))
+    # np.unique не сравнивает None со строками; понятие без категории — General,
+    # как при добавлении (add_concept)
+    labels = [name if name is not None else 'General' for name in categories.values()]
+    names, codes = np.unique(np.array(labels, dtype=object), return_inverse=True)
+    lookup = np.full(int(ids.max()) + 1, -1, dtype=np.int64)
+    lookup[ids] = codes
+
+    concept = progress[:, 2]
+    known = (concept <= ids.max()) & (progress[:, 4] > 0)
+    category = lookup[np.where(known, concept, 0)]
+    known &= category >= 0
+    _, user_index = np.unique(progress[known, 1], return_inverse=True)
+
+    # Суммы ответов и ошибок по парам (пользователь, категория)
+    pair_keys, pair_index = np.unique(user_index * len(names) + category[known], return_inverse=True)
+    attempts = np.bincount(pair_index, weights=progress[known, 4])
+    errors = np.bincount(pair_index, weights=progress[known, 5])
+    enough = attempts >= min_attempts
+    accuracy = 1 - errors[enough] / attempts[enough]
+    pair_category = pair_keys[enough] % len(names)
+
+    order = np.lexsort((accuracy, pair_category))
+    accuracy, pair_category = accuracy[order], pair_category[order]
+    bounds = np.searchsorted(pair_category, np.arange(len(names) + 1))
+    histogram = np.bincount(pair_category * 10 + np.minimum((accuracy * 10).astype(np.int64), 9),
+                            minlength=len(names) * 10).reshape(len(names), 10)
+
+    result = {}
+    for code, name in enumerate(names):
+        group = accuracy[bounds[code]:bounds[code + 1]]
+        if group.size == 0:
+            continue
+        p25, p50, p75 = np.percentile(group, [25, 50, 75]) * 100
+        result[name] = {
+            'users': int(group.size),
+            'mean': round(float(group.mean()) * 100, 1),
+            'p25': round(float(p25), 1),
+            'median': round(float(p50), 1),
+            'p75': round(float(p75), 1),
+            'histogram': [int(count) for count in histogram[code]],
+        }
+    return result
+
+def learning_curves(progress, min_users, top):
+    """Понятия, где точность сильнее всего растёт с числом ответов:
+    наклон прямой «точность ~ log2(ответов)» по всем пользователям понятия"""
+    answered = progress[:, 4] > 0
+    if not answered.any():
+        return []
+    concept_ids, group = np.unique(progress[answered, 2], return_inverse=True)
+    x = np.log2(progress[answered, 4].astype(np.float64))
+    y = 1 - progress[answered, 5] / progress[answered, 4]
+
+    # Наклон по каждому понятию из сумм: (nΣxy - ΣxΣy) / (nΣx² - (Σx)²)
+    n = np.bincount(group).astype(np.float64)
+    sx = np.bincount(group, weights=x)
+    sy = np.bincount(group, weights=y)
+    sxx = np.bincount(group, weights=x * x)
+    sxy = np.bincount(group, weights=x * y)
+    denominator = n * sxx - sx * sx
+    valid = (n >= min_users) & (denominator > 1e-9)
+    slope = np.full(n.size, -np.inf)
+    slope[valid] = (n[valid] * sxy[valid] - sx[valid] * sy[valid]) / denominator[valid]
+
+    best = [i for i in np.argsort(-slope)[:top] if slope[i] > 0]
+    result = []
+    for i in best:
+        concept = database.get_concept_by_id(int(concept_ids[i]))
+        result.append({
+            'concept_id': int(concept_ids[i]),
+            'term': concept['term'] if concept else None,
+            'users': int(n[i]),
+            'accuracy': round(float(sy[i] / n[i]) * 100, 1),
+            # Прирост точности (п. п.) при удвоении числа ответов
+            'gain_per_doubling': round(float(slope[i]) * 100, 1),
+        })
+    return result
+
+# =============================================================================
+# СБОРКА И КЭШ
+# =============================================================================
+
+def build_report(today=None):
+    """Полный отчёт (словарь, пригодный для JSON)"""
+    started = time.perf_counter()
+    quizzes = load_columns(database.get_quiz_results_chunk, 5)
+    daily = load_columns(database.get_quiz_daily_chunk, 6)
+    progress = load_columns(database.get_progress_chunk, 7)
+    categories = database.get_concept_categories()
+
+    # Дни в базе — по UTC (CURRENT_TIMESTAMP)
+    today = int(time.time() // 86400) if today is None else today
+    users, days = activity(quizzes, daily, progress)
+
+    report = {
+        'today': _day(today),
+        'totals': {
+            'users': int(np.unique(users).size),
+            'quizzes': int(quizzes.shape[0] + daily[:, 5].sum()),
+            'progress_rows': int(progress.shape[0]),
+        },
+        'active': daily_active_users(users, days, today, ANALYTICS_DAYS),
+        'cohorts': retention_cohorts(users, days, today, ANALYTICS_COHORT_WEEKS),
+        'accuracy': accuracy_by_category(progress, categories, ANALYTICS_MIN_ATTEMPTS),
+        'learning_curves': learning_curves(progress, ANALYTICS_MIN_USERS, ANALYTICS_TOP),
+    }
+    duration = time.perf_counter() - started
+    BUILD_SECONDS.observe(duration)
+    report['build_seconds'] = round(duration, 3)
+    report['built_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    return report
+
+def get_report(refresh=False):
+    """Отчёт из кэша; одновременные запросы ждут одну сборку"""
+    if refresh:
+        report_cache.clear()
+    return report_cache.get('report', build_report)
+
+def format_report(report):
+    """Текстовый отчёт для команды администратора"""
+    totals = report['totals']
+    active = report['active']
+    lines = [
+        f"📈 Аналитика на {report['today']} (собрана {report['built_at']}, {report['build_seconds']} с)",
+        f"Пользователей: {totals['users']}, викторин: {totals['quizzes']}",
+        f"Активны за 7 дней: {active['wau']}, за 30 дней: {active['mau']}",
+        "",
+        "По дням: " + ", ".join(f"{item['day'][5:]}: {item['users']}" for item in active['daily'][-7:]),
+        "",
+        "Удержание (неделя первой активности: размер, % по неделям):",
+    ]
+    for cohort in report['cohorts']:
+        retention = ' '.join(f"{value:g}" for value in cohort['retention'][1:])
+        lines.append(f"{cohort['week']}: {cohort['users']}" + (f" | {retention}" if retention else ""))
+
+    lines += ["", "Точность по категориям (медиана, 25–75%):"]
+    for name, item in report['accuracy'].items():
+        lines.append(f"{name}: {item['median']}% ({item['p25']}–{item['p75']}), пользователей {item['users']}")
+
+    if report['learning_curves']:
+        lines += ["", "Быстрее всего осваиваются (+п. п. точности при удвоении ответов):"]
+        for item in report['learning_curves']:
+            lines.append(f"{item['term']}: +{item['gain_per_doubling']}, пользователей {item['users']}")
+    return '\n'.join(lines)
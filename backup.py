@@ -0,0 +1,282 @@
+# backup.py
+# Резервные копии базы без остановки бота: Connection.backup небольшими
+# порциями страниц, сжатые снимки с контрольной суммой, ротация и восстановление
+#
+# Между порциями копирование спит, и запись обработчиков успевает пройти.
+# Если база меняется быстрее, чем копируется (каждое изменение начинает
+# пошаговую копию заново), снимок делается одним шагом: в режиме WAL
+# писатели его не ждут.
+#
+# Восстановление (перед ним снимается копия текущего состояния):
+#   python backup.py list
+#   python backup.py restore [файл]     # по умолчанию — последний снимок
+
+import gzip
+import hashlib
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+
+import database
+import logs
+import metrics
+from leaderboard import leaderboard
+from config import (
+    BACKUP_ENABLED, BACKUP_DIR, BACKUP_INTERVAL, BACKUP_KEEP,
+    BACKUP_PAGES, BACKUP_STEP_PAUSE, BACKUP_MAX_RESTARTS
+)
+
+BACKUP_SECONDS = metrics.histogram(
+    'webtech_backup_seconds', 'Длительность резервного копирования', ['result'],
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+BACKUP_BYTES = metrics.gauge('webtech_backup_bytes', 'Размер последнего сжатого снимка')
+BACKUP_LAST_SUCCESS = metrics.gauge(
+    'webtech_backup_last_success_time_seconds', 'Время последнего удачного снимка (unix time)')
+BACKUP_RESTARTS = metrics.counter(
+    'webtech_backup_restarts_total', 'Перезапуски пошаговой копии из-за записи в базу')
+
+# Идёт ли сейчас копирование (процессы-обработчики кластера узнают об этом
+# из таблицы meta вместе с версиями)
+in_progress = False
+
+PREFIX = 'webtech-'
+SUFFIX = '.db.gz'
+
+class BackupError(Exception):
+    """Снимок не прошёл проверку"""
+
+class _TooManyRestarts(Exception):
+    pass
+
+def _set_in_progress(flag):
+    global in_progress
+    in_progress = flag
+    database.set_meta('backup_running', int(flag))
+
+# =============================================================================
+# СНИМОК
+# =============================================================================
+
+def _copy(target):
+    """Копия базы в target порциями по BACKUP_PAGES страниц; число перезапусков"""
+    source = database.get_connection()
+    destination = sqlite3.connect(target)
+    state = {'remaining': None, 'restarts': 0}
+
+    def progress(status, remaining, total):
+        # Копия без продвижения — её начали заново после записи в базу
+        if state['remaining'] is not None and remaining >= state['remaining']:
+            state['restarts'] += 1
+            BACKUP_RESTARTS.inc()
+            if state['restarts'] > BACKUP_MAX_RESTARTS:
+                raise _TooManyRestarts()
+        state['remaining'] = remaining
+        time.sleep(BACKUP_STEP_PAUSE)
+
+    try:
+        try:
+            source.backup(destination, pages=BACKUP_PAGES, progress=progress)
+        except _TooManyRestarts:
+            logs.log_event('backup_single_step', restarts=state['restarts'])
+            source.backup(destination)
+    finally:
+        destination.close()
+        source.close()
+    return state['restarts']
+
+def _check_integrity(path):
+    conn = sqlite3.connect(path)
+    try:
+        result = conn.execute('PRAGMA integrity_check').fetchone()[0]
+    finally:
+        conn.close()
+    if result != 'ok':
+        raise BackupError(f"integrity_check: {result}")
+
+def _sha256(stream):
+    digest = hashlib.sha256()
+    for block in iter(lambda: stream.read(1024 * 1024), b''):
+        digest.update(block)
+    return digest.hexdigest()
+
+def _compress(source, target):
+    """Сжатие копии; sha256 несжатых данных"""
+    digest = hashlib.sha256()
+    with open(source, 'rb') as raw, gzip.open(target, 'wb', compresslevel=6) as packed:
+        for block in iter(lambda: raw.read(1024 * 1024), b''):
+            digest.update(block)
+            packed.write(block)
+    return digest.hexdigest()
+
+def verify(path):
+    """Проверка снимка по записанной рядом контрольной сумме"""
+    with open(path + '.sha256', encoding='utf-8') as f:
+        expected = f.read().split()[0]
+    with gzip.open(path, 'rb') as packed:
+        actual = _sha256(packed)
+    if actual != expected:
+        raise BackupError(f"{os.path.basename(path)}: sha256 {actual} вместо {expected}")
+    return actual
+
+def create_backup(keep=BACKUP_KEEP):
+    """Снимок базы в BACKUP_DIR: {'path', 'bytes', 'sha256', 'seconds', 'restarts'}.
+    После снимка остаются keep последних (None — старые не удаляются)"""
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(BACKUP_DIR, f'{PREFIX}{stamp}{SUFFIX}')
+    temp = os.path.join(BACKUP_DIR, f'.{PREFIX}{stamp}.db')
+    started = time.perf_counter()
+
+    _set_in_progress(True)
+    try:
+        restarts = _copy(temp)
+        _check_integrity(temp)
+        digest = _compress(temp, path)
+        with open(path + '.sha256', 'w', encoding='utf-8') as f:
+            f.write(f"{digest}  {os.path.basename(path)[:-3]}\n")
+        # Записанный файл перечитывается: битый снимок лучше заметить сейчас
+        verify(path)
+    except Exception:
+        BACKUP_SECONDS.labels('failed').observe(time.perf_counter() - started)
+        for leftover in (path, path + '.sha256'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+        _set_in_progress(False)
+
+    duration = time.perf_counter() - started
+    size = os.path.getsize(path)
+    BACKUP_SECONDS.labels('ok').observe(duration)
+    BACKUP_BYTES.set(size)
+    BACKUP_LAST_SUCCESS.set(time.time())
+    if keep:
+        rotate(keep)
+    logs.log_event('backup_created', path=path, bytes=size, seconds=round(duration, 2), restarts=restarts)
+    return {'path': path, 'bytes': size, 'sha256': digest,
+            'seconds': round(duration, 2), 'restarts': restarts}
+
+def list_backups():
+    """Снимки от новых к старым: [{'path', 'bytes', 'created'}]"""
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    names = sorted((name for name in os.listdir(BACKUP_DIR)
+                    if name.startswith(PREFIX) and name.endswith(SUFFIX)), reverse=True)
+    result = []
+    for name in names:
+        path = os.path.join(BACKUP_DIR, name)
+        result.append({
+            'path': path,
+            'bytes': os.path.getsize(path),
+            'created': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(os.path.getmtime(path))),
+        })
+    return result
+
+def rotate(keep=BACKUP_KEEP):
+    """Удаление снимков сверх keep последних"""
+    for item in list_backups()[keep:]:
+        for path in (item['path'], item['path'] + '.sha256'):
+            if os.path.exists(path):
+                os.remove(path)
+
+# =============================================================================
+# ВОССТАНОВЛЕНИЕ
+# =============================================================================
+
+def restore(path):
+    """Замена содержимого базы снимком (после проверки суммы и целостности).
+    Через backup API: открытые соединения других процессов видят новую базу,
+    а по выросшим версиям сбрасывают кэши каталога и рейтинга"""
+    verify(path)
+    previous = database.get_versions()
+    temp = path[:-len('.gz')] + '.restore'
+    try:
+        with gzip.open(path, 'rb') as packed, open(temp, 'wb') as raw:
+            shutil.copyfileobj(packed, raw, 1024 * 1024)
+        _check_integrity(temp)
+        source = sqlite3.connect(temp)
+        destination = database.get_connection()
+        try:
+            source.backup(destination)
+        finally:
+            destination.close()
+            source.close()
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+    # Снимок сделан во время копирования — флаг в нём поднят
+    database.set_meta('backup_running', 0)
+    # Версии в снимке старше тех, что видели процессы
+    versions = database.advance_versions(previous)
+    database.sync_catalog_version(versions['catalog_version'])
+    leaderboard.sync(versions['leaderboard_version'], versions['leaderboard_reset'])
+    logs.log_event('backup_restored', path=path, **versions)
+
+# =============================================================================
+# РАСПИСАНИЕ
+# =============================================================================
+
+class Backup:
+    """Периодические снимки в фоновом потоке"""
+
+    def __init__(self):
+        self.running = threading.Lock()
+        self.stopping = False
+        self.last_result = None
+
+    def start(self):
+        if BACKUP_ENABLED:
+            threading.Thread(target=self._schedule, name='backup', daemon=True).start()
+
+    def _schedule(self):
+        # Отсчёт от последнего снимка: перезапуски бота не учащают копирование
+        backups = list_backups()
+        last = os.path.getmtime(backups[0]['path']) if backups else 0
+        next_run = time.monotonic() + max(60, BACKUP_INTERVAL - (time.time() - last))
+        while not self.stopping:
+            if time.monotonic() >= next_run:
+                self.run()
+                next_run = time.monotonic() + BACKUP_INTERVAL
+            time.sleep(30)
+
+    def run(self):
+        """Снимок сейчас; None, если копирование уже идёт или не удалось"""
+        if not self.running.acquire(blocking=False):
+            return None
+        try:
+            self.last_result = create_backup()
+            return self.last_result
+        except Exception as e:
+            logs.log_error('backup_failed', e)
+            return None
+        finally:
+            self.running.release()
+
+    def stop(self):
+        self.stopping = True
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == 'list':
+        for item in list_backups():
+            print(f"{item['created']}  {item['bytes']:>12}  {item['path']}")
+    elif command == 'create':
+        print(create_backup())
+    elif command == 'restore':
+        backups = list_backups()
+        path = sys.argv[2] if len(sys.argv) > 2 else (backups[0]['path'] if backups else None)
+        if path is None:
+            sys.exit("Снимков нет")
+        verify(path)
+        # Без ротации: восстанавливаемый снимок может оказаться самым старым
+        current = create_backup(keep=None)
+        print(f"✓ Текущее состояние сохранено: {current['path']}")
+        restore(path)
+        print(f"✓ База восстановлена из {path}")
+    else:
+        print("Использование: python backup.py list | create | restore [файл]")
@@ -0,0 +1,248 @@
+# benchmark.py
+# Микро-бенчмарки функций database.py на синтетической базе реального масштаба
+#
+# Пример запуска:
+#   python benchmark.py --output bench.json
+#   python benchmark.py --scale 0.1 --compare bench.json
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import cache
+import database
+
+CATEGORIES = [
+    "Frontend", "Backend", "General", "Tools",
+    "Python Basics", "Python Libraries"
+]
+
+# Размеры по умолчанию (при --scale 1.0)
+DEFAULT_CONCEPTS = 100_000
+DEFAULT_PROGRESS = 1_000_000
+DEFAULT_QUIZZES = 200_000
+DEFAULT_USERS = 20_000
+
+WORDS = [
+    "api", "python", "css", "html", "server", "client", "request", "response",
+    "function", "class", "module", "data", "query", "index", "cache", "stream",
+    "функция", "класс", "модуль", "данные", "запрос", "сервер", "список", "словарь"
+]
+
+# =============================================================================
+# ГЕНЕРАЦИЯ ДАННЫХ
+# =============================================================================
+
+def _random_text(rng, words):
+    """Случайная фраза из словаря"""
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+def generate_database(path, concepts, progress, quizzes, users, seed=42):
+    """Создание синтетической базы заданного размера"""
+    rng = random.Random(seed)
+    database.DATABASE_NAME = path
+
+    with contextlib.redirect_stdout(sys.stderr):
+        database.init_database()
+
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    start = datetime(2026, 1, 1)
+
+    cursor.executemany('''
+        INSERT INTO concepts (term, definition, category, example)
+        VALUES (?, ?, ?, ?)
+    ''', (
+        (f"TERM_{i:07d}", _random_text(rng, 12), rng.choice(CATEGORIES), _random_text(rng, 4))
+        for i in range(concepts)
+    ))
+
+    # Пары (user_id, concept_id) уникальны, как и в рабочей базе
+    def progress_rows():
+        seen = set()
+        while len(seen) < progress:
+            pair = (rng.randint(1, users), rng.randint(1, concepts))
+            if pair in seen:
+                continue
+            seen.add(pair)
+            shown = rng.randint(1, 10)
+            correct = rng.randint(0, shown)
+            reviewed = start + timedelta(seconds=rng.randint(0, 250 * 86400))
+            yield (pair[0], pair[1], correct >= 3, shown, correct, reviewed.isoformat(' '))
+
+    cursor.executemany('''
+        INSERT INTO user_progress (user_id, concept_id, is_learned, times_shown, times_correct, last_reviewed)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', progress_rows())
+
+    def quiz_rows():
+        for _ in range(quizzes):
+            completed = start + timedelta(seconds=rng.randint(0, 250 * 86400))
+            yield (rng.randint(1, users), rng.randint(0, 5), 5, completed.isoformat(' '))
+
+    cursor.executemany('''
+        INSERT INTO quiz_results (user_id, score, total_questions, completed_at)
+        VALUES (?, ?, ?, ?)
+    ''', quiz_rows())
+
+    conn.commit()
+    conn.close()
+
+# =============================================================================
+# ЗАМЕРЫ
+# =============================================================================
+
+def measure(func, iterations, warmup=3):
+    """Замер времени вызова функции, результат в миллисекундах"""
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+
+    samples.sort()
+    return {
+        'iterations': iterations,
+        'min_ms': round(samples[0], 4),
+        'median_ms': round(statistics.median(samples), 4),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        'max_ms': round(samples[-1], 4),
+        'mean_ms': round(statistics.fmean(samples), 4),
+    }
+
+def build_cases(concepts, users, rng):
+    """Набор сценариев: имя -> функция без аргументов"""
+    user_ids = [rng.randint(1, users) for _ in range(1000)]
+    counter = iter(range(10 ** 9))
+
+    def pick_user():
+        return rng.choice(user_ids)
+
+    return {
+        'get_random_concept': lambda: database.get_random_concept(),
+        'get_random_concept[categories]': lambda: database.get_random_concept(
+            categories=["Python Basics", "Python Libraries"]),
+        'get_random_concept[exclude_ids]': lambda: database.get_random_concept(
+            exclude_ids=[rng.randint(1, concepts) for _ in range(20)]),
+        'search_concepts[short]': lambda: database.search_concepts(rng.choice(["api", "css", "python"])),
+        'search_concepts[miss]': lambda: database.search_concepts("zzz_not_found"),
+        'search_concepts[cached]': lambda: cache.search_concepts(rng.choice(["api", "css", "python"])),
+        'get_user_stats': lambda: database.get_user_stats(pick_user()),
+        'save_user_progress[existing]': lambda: database.save_user_progress(pick_user(), rng.randint(1, concepts), True),
+        'save_user_progress[new]': lambda: database.save_user_progress(users + next(counter), 1, False),
+        'get_all_categories': lambda: database.get_all_categories(),
+        'get_user_quiz_history': lambda: database.get_user_quiz_history(pick_user()),
+        'add_concept': lambda: database.add_concept(
+            f"BENCH_{next(counter):09d}", "benchmark definition", "General", ""),
+    }
+
+def compare(current, previous):
+    """Сравнение медиан с предыдущим прогоном"""
+    lines = []
+    for name, result in current['results'].items():
+        old = previous.get('results', {}).get(name)
+        if not old:
+            lines.append(f"{name:36} {result['median_ms']:>10.3f} ms   (новый)")
+            continue
+        ratio = result['median_ms'] / max(old['median_ms'], 1e-9)
+        lines.append(f"{name:36} {result['median_ms']:>10.3f} ms   x{ratio:.2f}")
+    return '\n'.join(lines)
+
+# =============================================================================
+# ЗАПУСК
+# =============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк функций database.py")
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help="Множитель размеров (1.0 = 100k понятий, 1M прогресса, 200k викторин)")
+    parser.add_argument('--iterations', type=int, default=50, help="Повторов на сценарий")
+    parser.add_argument('--only', action='append', help="Запустить только указанные сценарии")
+    parser.add_argument('--db', help="Использовать/сохранить базу по этому пути")
+    parser.add_argument('--output', help="Файл для JSON-результата (по умолчанию stdout)")
+    parser.add_argument('--compare', help="JSON предыдущего прогона для сравнения")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    concepts = max(10, int(DEFAULT_CONCEPTS * args.scale))
+    progress = max(10, int(DEFAULT_PROGRESS * args.scale))
+    quizzes = max(10, int(DEFAULT_QUIZZES * args.scale))
+    users = max(10, int(DEFAULT_USERS * args.scale))
+    # Уникальных пар (user_id, concept_id) не может быть больше, чем users * concepts
+    progress = min(progress, users * concepts // 2)
+
+    tmpdir = None
+    path = args.db
+    if not path:
+        tmpdir = tempfile.TemporaryDirectory(prefix="webtech-bench-")
+        path = os.path.join(tmpdir.name, "bench.db")
+
+    try:
+        generated = False
+        if not os.path.exists(path):
+            started = time.perf_counter()
+            print(f"Генерация базы: {concepts} понятий, {progress} прогресса, {quizzes} викторин...",
+                  file=sys.stderr)
+            generate_database(path, concepts, progress, quizzes, users, seed=args.seed)
+            print(f"Готово за {time.perf_counter() - started:.1f} с", file=sys.stderr)
+            generated = True
+        database.DATABASE_NAME = path
+        # Сохранённая база могла быть создана до новых столбцов и таблиц:
+        # init_database дополняет схему и ничего не трогает в актуальной
+        with contextlib.redirect_stdout(sys.stderr):
+            database.init_database()
+
+        rng = random.Random(args.seed)
+        cases = build_cases(concepts, users, rng)
+        if args.only:
+            cases = {name: func for name, func in cases.items() if name in args.only}
+
+        results = {}
+        for name, func in cases.items():
+            print(f"  {name}...", file=sys.stderr)
+            results[name] = measure(func, args.iterations)
+
+        report = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'generated': generated,
+            'dataset': {
+                'concepts': concepts,
+                'user_progress': progress,
+                'quiz_results': quizzes,
+                'users': users,
+            },
+            'results': results,
+        }
+
+        payload = json.dumps(report, ensure_ascii=False, indent=2)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(payload + '\n')
+        else:
+            print(payload)
+
+        if args.compare:
+            with open(args.compare, encoding='utf-8') as f:
+                previous = json.load(f)
+            print(compare(report, previous), file=sys.stderr)
+    finally:
+        if tmpdir:
+            tmpdir.cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -2,25 +2,298 @@
 # Telegram бот для изучения Web Technologies и Python
 
 import telebot
-from telebot import types
+from telebot import types, apihelper
+import functools
+import hmac
+import os
 import random
-from config import BOT_TOKEN, ADMIN_IDS, QUESTIONS_PER_SESSION
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import backup
+import broadcast
+import cache
+import charts
+import database
+import health
+import logs
+import maintenance
+from leaderboard import leaderboard, GLOBAL_SCOPE, week_scope, category_scope
+import metrics
+import prefix_index
+import ratelimit
+import seed
+import sqltrace
+import startup
+from sampler import WeightedSampler
+from config import (
+    BOT_TOKEN, ADMIN_IDS, QUESTIONS_PER_SESSION, CATALOG_PAGE_SIZE, UPDATE_DEDUP_SIZE,
+    RATE_LIMITS, ANALYTICS_TOKEN, QUIZ_PREFETCH_WORKERS, RELATED_BUTTONS,
+    INLINE_RESULTS_LIMIT, INLINE_CACHE_TIME,
+    QUIZ_USER_WEAKNESS_WEIGHT, QUIZ_GLOBAL_DIFFICULTY_WEIGHT, QUIZ_DIFFICULTY_TTL
+)
 from database import (
-    init_database, add_concept, get_random_concept, get_all_concepts,
-    get_concepts_by_category, get_concepts_by_categories, get_all_categories,
-    delete_concept, update_concept, search_concepts, get_concept_count,
-    save_user_progress, get_user_stats, save_quiz_result, get_user_quiz_history,
-    get_concept_by_id
+    add_concept, get_random_concept,
+    get_concepts_by_category, get_all_categories,
+    delete_concept, update_concept, get_concept_count,
+    save_user_progress, get_user_stats, get_user_quiz_history,
+    get_concept_by_id, ping, get_concept_difficulty, get_user_quiz_errors,
+    get_hardest_concepts, get_concepts_page
+)
+
+# =============================================================================
+# ДИСПЕТЧЕРИЗАЦИЯ ОБНОВЛЕНИЙ
+# =============================================================================
+
+UPDATES = metrics.counter(
+    'webtech_updates_total', 'Полученные обновления по типам', ['type'])
+DUPLICATE_UPDATES = metrics.counter(
+    'webtech_duplicate_updates_total', 'Повторно доставленные обновления (отброшены)')
+
+# Типы обновлений, которые обрабатывает бот
+UPDATE_TYPES = ('message', 'edited_message', 'callback_query', 'inline_query')
+
+def describe_update(update):
+    """Тип обновления, его объект и отправитель"""
+    for kind in UPDATE_TYPES:
+        payload = getattr(update, kind, None)
+        if payload is not None:
+            user = getattr(payload, 'from_user', None)
+            return kind, payload, user.id if user else None
+    return 'other', None, None
+
+# Политики ограничения частоты (RATE_LIMITS) для кнопок, команд и callback
+RATE_LIMITED_TEXTS = {
+    "📚 Изучить понятие": 'study', "🐍 Python понятия": 'study',
+    "🌐 Веб понятия": 'study', "📂 Категории": 'study',
+    "🎯 Викторина": 'quiz', "/quiz": 'quiz',
+    "🔍 Поиск": 'search', "/search": 'search',
+    "➕ Добавить понятие": 'admin', "📝 Редактировать": 'admin',
+    "🗑️ Удалить понятие": 'admin', "📋 Все понятия": 'admin',
+    "🔥 Сложные понятия": 'admin', "/hardest": 'admin', "/sqltrace": 'admin',
+    "/sqltop": 'admin', "/cachestats": 'admin',
+}
+RATE_LIMITED_CALLBACKS = (
+    ('next_concept', 'study'), ('cat_', 'study'), ('rel_', 'study'), ('quiz_', 'quiz'), ('adm_', 'admin'),
 )
 
+def parse_quiz_answer(data):
+    """(номер вопроса, id вопроса, id ответа) из quiz_<номер>_<id>_<id> или None"""
+    parts = data.split('_')
+    if len(parts) != 4 or parts[0] != 'quiz' or not all(part.isdigit() for part in parts[1:]):
+        return None
+    return tuple(int(part) for part in parts[1:])
+
+def rate_limited_action(kind, payload):
+    """Политика ограничения для обновления или None"""
+    if kind == 'message' and payload.text:
+        text = payload.text.split()[0] if payload.text.startswith('/') else payload.text
+        return RATE_LIMITED_TEXTS.get(text.split('@')[0])
+    if kind == 'callback_query' and payload.data:
+        # Ответы викторины — отдельно от её запуска: обычный темп ответов
+        # не должен исчерпывать ведро запуска
+        if parse_quiz_answer(payload.data):
+            return 'answer'
+        for prefix, action in RATE_LIMITED_CALLBACKS:
+            if payload.data.startswith(prefix):
+                return action
+    if kind == 'inline_query':
+        return 'inline'
+    return None
+
+def sync_versions():
+    """Изменения каталога и рейтинга, сделанные другими процессами
+    (обработчики кластера, восстановление снимка из python backup.py)"""
+    versions = database.get_versions()
+    database.sync_catalog_version(versions.get('catalog_version', 0))
+    leaderboard.sync(versions.get('leaderboard_version', 0), versions.get('leaderboard_reset', 0))
+    backup.in_progress = bool(versions.get('backup_running'))
+
+class WebTechBot(telebot.TeleBot):
+    """TeleBot с учётом и журналированием входящих обновлений"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Повторная доставка вебхука или повтор getUpdates не должны
+        # второй раз писать в базу и отправлять сообщения
+        self.seen_updates = cache.RecentKeys(UPDATE_DEDUP_SIZE)
+        self.limiter = ratelimit.RateLimiter(RATE_LIMITS)
+
+    def process_new_updates(self, updates):
+        if updates:
+            sync_versions()
+        fresh = []
+        for update in updates:
+            if not self.seen_updates.add(update.update_id):
+                DUPLICATE_UPDATES.inc()
+                logs.log_event('duplicate_update', update_id=update.update_id)
+                continue
+            kind, payload, user_id = describe_update(update)
+            UPDATES.labels(kind).inc()
+            logs.log_event('update', update_id=update.update_id, type=kind, user_id=user_id)
+            if self.admit(kind, payload, user_id):
+                fresh.append(update)
+        super().process_new_updates(fresh)
+        if updates:
+            health.mark_update()
+            startup.mark_first_update()
+
+    def admit(self, kind, payload, user_id):
+        """Проверка частоты до обработчиков: лишние нажатия не доходят до базы.
+        На callback отвечаем коротким уведомлением, на сообщение — один раз"""
+        action = rate_limited_action(kind, payload)
+        if action is None or user_id is None:
+            return True
+        if action == 'answer':
+            index, question_id, _ = parse_quiz_answer(payload.data)
+            if not is_current_answer(user_sessions.get(user_id), index, question_id):
+                # Повтор и кнопка старого вопроса не тратят токен: обработчик
+                # только подтвердит нажатие
+                return True
+        allowed, first = self.limiter.check(action, user_id)
+        if allowed:
+            return True
+        logs.log_event('rate_limited', action=action, user_id=user_id)
+        if kind == 'callback_query' or (kind == 'message' and first):
+            # Уведомление — в пуле потоков: поток приёма не ждёт Bot API из-за
+            # того, кто шлёт слишком часто, а ошибка сети не теряет пачку обновлений
+            if self.threaded:
+                self.worker_pool.put(self._notify_limited, kind, payload, user_id)
+            else:
+                self._notify_limited(kind, payload, user_id)
+        return False
+
+    def _notify_limited(self, kind, payload, user_id):
+        try:
+            if kind == 'callback_query':
+                self.answer_callback_query(payload.id, "⏳ Не так быстро!")
+            else:
+                self.send_message(payload.chat.id, "⏳ Слишком часто. Подождите пару секунд.")
+        except Exception as e:
+            logs.log_error('rate_limit_notice_failed', e, user_id=user_id)
+
 # Инициализация бота
-bot = telebot.TeleBot(BOT_TOKEN)
+bot = WebTechBot(BOT_TOKEN)
+
+# Рассылка понятия дня (запускается в main)
+broadcaster = broadcast.Broadcaster(bot)
+
+# Обслуживание базы и резервные копии (запускаются в main)
+maintainer = maintenance.Maintenance()
+backups = backup.Backup()
+
+def start_related_index():
+    """Фоновый пересчёт похожих понятий (в одном процессе, не в обработчиках кластера)"""
+    def run():
+        # NumPy загружается в потоке и не задерживает запуск
+        import related
+        related.run_forever()
+    threading.Thread(target=run, name='related', daemon=True).start()
 
 # Хранилище состояний пользователей
 user_states = {}
 
 # Текущая сессия викторины
 user_sessions = {}
+# Защищает переход к следующему вопросу от двойного нажатия
+quiz_lock = threading.Lock()
+
+# Подготовка следующего вопроса викторины, пока пользователь читает текущий
+quiz_prefetch = ThreadPoolExecutor(QUIZ_PREFETCH_WORKERS, thread_name_prefix='quiz-prefetch')
+
+# Фильтры и позиция каталога администраторов
+catalog_filters = {}
+
+# =============================================================================
+# МЕТРИКИ
+# =============================================================================
+
+HANDLER_SECONDS = metrics.histogram(
+    'webtech_handler_seconds', 'Время выполнения обработчиков', ['handler'])
+HANDLER_ERRORS = metrics.counter(
+    'webtech_handler_errors_total', 'Исключения в обработчиках', ['handler'])
+# Для сравнения с webtech_handler_seconds: как резервное копирование сказывается на ответах
+HANDLER_BACKUP_SECONDS = metrics.histogram(
+    'webtech_handler_during_backup_seconds', 'Время выполнения обработчиков во время резервного копирования')
+QUIZ_PREFETCH = metrics.counter(
+    'webtech_quiz_prefetch_total',
+    'Вопросы викторины по готовности к ответу: ready — подготовлен заранее, '
+    'waited — пришлось дождаться подготовки, miss — подготовлен при ответе', ['result'])
+STALE_CALLBACKS = metrics.counter(
+    'webtech_stale_callbacks_total', 'Повторные и устаревшие ответы викторины (отброшены)')
+TELEGRAM_REQUESTS = metrics.counter(
+    'webtech_telegram_requests_total', 'Запросы к Telegram Bot API', ['method'])
+TELEGRAM_ERRORS = metrics.counter(
+    'webtech_telegram_errors_total', 'Ошибки запросов к Telegram Bot API', ['method', 'reason'])
+TELEGRAM_SECONDS = metrics.histogram(
+    'webtech_telegram_request_seconds', 'Время запросов к Telegram Bot API', ['method'])
+
+metrics.gauge('webtech_user_sessions', 'Активные сессии викторины',
+              function=lambda: len(user_sessions))
+metrics.gauge('webtech_user_states', 'Незавершённые диалоги (состояния пользователей)',
+              function=lambda: len(user_states))
+def handler_queue_depth():
+    """Обновления, ожидающие свободного потока обработчиков"""
+    return bot.worker_pool.tasks.qsize() if bot.threaded else 0
+
+metrics.gauge('webtech_handler_queue_depth', 'Обновления в очереди пула обработчиков',
+              function=handler_queue_depth)
+
+health.add_probe('queue_backlog', handler_queue_depth)
+health.add_probe('sessions', lambda: len(user_sessions) + len(user_states))
+
+def _sender_id(args):
+    """ID пользователя из первого аргумента обработчика (message или call)"""
+    user = getattr(args[0], 'from_user', None) if args else None
+    return user.id if user else None
+
+def instrumented(func):
+    """Замер времени, учёт ошибок и журнал результата обработчика"""
+    name = func.__name__
+    observe = HANDLER_SECONDS.labels(name).observe
+    failed = HANDLER_ERRORS.labels(name)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            failed.inc()
+            logs.log_error('handler_error', e, handler=name, user_id=_sender_id(args))
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            observe(duration)
+            if backup.in_progress:
+                HANDLER_BACKUP_SECONDS.observe(duration)
+        logs.log_event('handler', handler=name, user_id=_sender_id(args),
+                       duration_ms=round(duration * 1000, 3))
+        return result
+    return wrapper
+
+def send_telegram_request(method, url, **kwargs):
+    """Отправка запроса к Bot API с учётом в метриках"""
+    api_method = url.rsplit('/', 1)[-1]
+    TELEGRAM_REQUESTS.labels(api_method).inc()
+    started = time.perf_counter()
+    try:
+        response = apihelper._get_req_session().request(method, url, **kwargs)
+    except Exception as e:
+        TELEGRAM_ERRORS.labels(api_method, type(e).__name__).inc()
+        raise
+    finally:
+        TELEGRAM_SECONDS.labels(api_method).observe(time.perf_counter() - started)
+    if response.status_code != 200:
+        TELEGRAM_ERRORS.labels(api_method, str(response.status_code)).inc()
+    elif api_method == 'getUpdates':
+        health.mark_poll()
+    return response
+
+apihelper.CUSTOM_REQUEST_SENDER = send_telegram_request
+
+# Другой адрес Bot API (локальный сервер или заглушка для нагрузочных тестов)
+apihelper.API_URL = os.environ.get('TELEGRAM_API_URL', apihelper.API_URL)
 
 # =============================================================================
 # КЛАВИАТУРЫ
@@ -50,14 +323,17 @@ def get_admin_keyboard():
         types.KeyboardButton("📝 Редактировать"),
         types.KeyboardButton("🗑️ Удалить понятие"),
         types.KeyboardButton("📋 Все понятия"),
+        types.KeyboardButton("🔥 Сложные понятия"),
         types.KeyboardButton("🔙 Главное меню")
     ]
     keyboard.add(*buttons)
     return keyboard
 
-def get_continue_keyboard():
-    """Клавиатура продолжения"""
+def get_continue_keyboard(related=()):
+    """Клавиатура продолжения; related — похожие понятия [{'id', 'term'}]"""
     keyboard = types.InlineKeyboardMarkup()
+    for item in related:
+        keyboard.add(types.InlineKeyboardButton(f"🔗 {item['term']}", callback_data=f"rel_{item['id']}"))
     keyboard.add(
         types.InlineKeyboardButton("➡️ Следующее понятие", callback_data="next_concept"),
         types.InlineKeyboardButton("🔙 В меню", callback_data="main_menu")
@@ -74,6 +350,18 @@ def get_category_keyboard(categories):
     keyboard.add(types.InlineKeyboardButton("🔙 Назад", callback_data="main_menu"))
     return keyboard
 
+def get_leaderboard_keyboard():
+    """Клавиатура переключения рейтингов"""
+    keyboard = types.InlineKeyboardMarkup(row_width=2)
+    keyboard.add(
+        types.InlineKeyboardButton("🏆 Общий", callback_data="top_all"),
+        types.InlineKeyboardButton("📅 За неделю", callback_data="top_week"),
+        types.InlineKeyboardButton("🌐 Веб", callback_data="top_web"),
+        types.InlineKeyboardButton("🐍 Python", callback_data="top_python")
+    )
+    keyboard.add(types.InlineKeyboardButton("🔙 В меню", callback_data="main_menu"))
+    return keyboard
+
 def get_quiz_category_keyboard():
     """Клавиатура выбора категории викторины"""
     keyboard = types.InlineKeyboardMarkup(row_width=2)
@@ -90,10 +378,12 @@ def get_quiz_category_keyboard():
 # =============================================================================
 
 @bot.message_handler(commands=['start'])
+@instrumented
 def send_welcome(message):
     """Обработка команды /start"""
     user_id = message.from_user.id
     user_name = message.from_user.first_name
+    database.register_user(user_id, message.chat.id, user_name, message.from_user.username)
     
     total_concepts = get_concept_count()
     
@@ -117,6 +407,7 @@ def send_welcome(message):
 /stats — Моя статистика
 /search — Поиск понятия
 /quiz — Начать викторину
+/top — Рейтинг участников
 
 Выбери действие в меню ниже! 👇
     """
@@ -128,6 +419,7 @@ def send_welcome(message):
     )
 
 @bot.message_handler(commands=['help'])
+@instrumented
 def send_help(message):
     """Обработка команды /help"""
     help_text = """
@@ -160,6 +452,7 @@ def send_help(message):
 /stats — Твоя статистика
 /quiz — Начать викторину
 /search — Поиск понятия
+/top — Рейтинг участников
 
 **Для администраторов:**
 ➕ Добавить понятие
@@ -169,6 +462,7 @@ def send_help(message):
     bot.send_message(message.chat.id, text, parse_mode='HTML')
 
 @bot.message_handler(commands=['stats'])
+@instrumented
 def send_stats(message):
     """Обработка команды /stats"""
     user_id = message.from_user.id
@@ -189,14 +483,29 @@ def send_stats(message):
 📈 Прогресс обучения: {progress}%
 🎯 Успешность: {success_rate}%
     """
-    bot.send_message(message.chat.id, text, parse_mode='HTML')
+    stats_text += format_rank_line(user_id)
+    bot.send_message(message.chat.id, stats_text, parse_mode='HTML')
+    charts.send_progress_card(bot, message.chat.id, user_id)
+
+@bot.message_handler(commands=['top'])
+@instrumented
+def send_leaderboard(message):
+    """Обработка команды /top"""
+    bot.send_message(
+        message.chat.id,
+        format_leaderboard(GLOBAL_SCOPE, message.from_user.id),
+        reply_markup=get_leaderboard_keyboard(),
+        parse_mode='HTML'
+    )
 
 @bot.message_handler(commands=['quiz'])
+@instrumented
 def start_quiz_command(message):
     """Обработка команды /quiz"""
     quiz_category_choice(message)
 
 @bot.message_handler(commands=['search'])
+@instrumented
 def search_command(message):
     """Обработка команды /search"""
     msg = bot.send_message(
@@ -211,6 +520,7 @@ def search_command(message):
 # =============================================================================
 
 @bot.message_handler(func=lambda message: message.text == "📚 Изучить понятие")
+@instrumented
 def show_random_concept(message):
     """Показ случайного понятия (все категории)"""
     concept = get_random_concept()
@@ -222,6 +532,7 @@ def show_random_concept(message):
         bot.send_message(message.chat.id, "❌ В базе пока нет понятий.")
 
 @bot.message_handler(func=lambda message: message.text == "🐍 Python понятия")
+@instrumented
 def show_python_concepts(message):
     """Показ случайного понятия из Python категорий"""
     python_categories = ["Python Basics", "Python Libraries"]
@@ -234,6 +545,7 @@ def show_python_concepts(message):
         bot.send_message(message.chat.id, "❌ Python понятия пока не добавлены.")
 
 @bot.message_handler(func=lambda message: message.text == "🌐 Веб понятия")
+@instrumented
 def show_web_concepts(message):
     """Показ случайного понятия из Веб категорий"""
     web_categories = ["Frontend", "Backend", "General", "Tools"]
@@ -265,11 +577,13 @@ def show_concept_message(chat_id, concept):
     bot.send_message(
         chat_id,
         concept_text,
-        reply_markup=get_continue_keyboard(),
+        reply_markup=get_continue_keyboard(database.get_related_concepts(concept['id'], RELATED_BUTTONS)),
         parse_mode='HTML'
     )
+    logs.log_event('concept_view', chat_id=chat_id, concept_id=concept['id'])
 
 @bot.message_handler(func=lambda message: message.text == "🎯 Викторина")
+@instrumented
 def quiz_category_choice(message):
     """Выбор категории для викторины"""
     keyboard = get_quiz_category_keyboard()
@@ -298,9 +612,9 @@ def start_quiz(message, category_type):
     
     # Получаем понятия для викторины
     if categories:
-        all_concepts = get_concepts_by_categories(categories)
+        all_concepts = cache.concepts_by_categories(categories)
     else:
-        all_concepts = get_all_concepts()
+        all_concepts = cache.all_concepts()
     
     if len(all_concepts) < 4:
         bot.send_message(
@@ -309,35 +623,62 @@ def start_quiz(message, category_type):
         )
         return
     
-    # Выбираем 5 случайных вопросов
-    questions = random.sample(all_concepts, min(5, len(all_concepts)))
+    # Выбираем вопросы с упором на слабые места пользователя
+    questions = select_quiz_questions(user_id, all_concepts, category_type)
     
     # Сохраняем сессию викторины
     user_sessions[user_id] = {
         'questions': questions,
         'current_question': 0,
         'score': 0,
-        'category': category_type
+        'category': category_type,
+        'user_name': message.from_user.first_name
     }
     
     send_quiz_question(message, user_id)
 
-def send_quiz_question(message, user_id):
-    """Отправка вопроса викторины"""
-    session = user_sessions.get(user_id)
-    
-    if not session or session['current_question'] >= len(session['questions']):
-        finish_quiz(message, user_id)
-        return
-    
-    question = session['questions'][session['current_question']]
-    
-    # Создаем варианты ответов (1 правильный + 3 неправильных)
-    all_concepts = get_all_concepts()
-    wrong_answers = random.sample(
-        [c for c in all_concepts if c['id'] != question['id']],
-        min(3, len(all_concepts) - 1)
-    )
+# Основа весов викторины по набору понятий (категории викторины): общая
+# сложность и доля ошибок «новичка» 0.5. Общая на всех пользователей
+quiz_weights = cache.LRUCache('quiz_weights', 8, QUIZ_DIFFICULTY_TTL)
+
+def _quiz_base(concepts):
+    """(выборщик по основе весов, {concept_id: номер}) для набора понятий"""
+    difficulty = get_concept_difficulty()
+    weights = []
+    for concept in concepts:
+        # Доли ошибок со сглаживанием: для новых понятий — 0.5
+        attempts, errors = difficulty.get(concept['id'], (0, 0))
+        global_rate = (errors + 1) / (attempts + 2)
+        weights.append(0.25
+                       + QUIZ_USER_WEAKNESS_WEIGHT * 0.5
+                       + QUIZ_GLOBAL_DIFFICULTY_WEIGHT * global_rate)
+    positions = {concept['id']: index for index, concept in enumerate(concepts)}
+    return WeightedSampler(concepts, weights), positions
+
+def select_quiz_questions(user_id, concepts, pool, count=QUESTIONS_PER_SESSION):
+    """Вопросы викторины: чаще попадаются понятия, в которых пользователь
+    ошибается, и в целом сложные понятия; давно освоенные — реже.
+    Основа весов набора pool кэшируется, ответы пользователя — поправка к ней"""
+    sampler, positions = quiz_weights.get(
+        pool, lambda: _quiz_base(concepts), database.catalog_version)
+    
+    corrections = {}
+    for concept_id, (attempts, errors) in get_user_quiz_errors(user_id).items():
+        index = positions.get(concept_id)
+        if index is not None:
+            user_rate = (errors + 1) / (attempts + 2)
+            corrections[index] = QUIZ_USER_WEAKNESS_WEIGHT * (user_rate - 0.5)
+    
+    return sampler.sample(count, corrections=corrections)
+
+def render_quiz_question(question, index, total):
+    """Текст и клавиатура (уже в JSON) вопроса: 1 правильный и 3 случайных неверных варианта"""
+    all_concepts = cache.all_concepts()
+    # Четыре случайных понятия: если среди них правильное, неверных всё равно хватит
+    wrong_answers = [
+        c for c in random.sample(all_concepts, min(4, len(all_concepts)))
+        if c['id'] != question['id']
+    ][:3]
     
     answers = [question] + wrong_answers
     random.shuffle(answers)
@@ -347,61 +688,116 @@ def send_quiz_question(message, user_id):
     for answer in answers:
         btn = types.InlineKeyboardButton(
             answer['term'],
-            callback_data=f"quiz_{question['id']}_{answer['id']}"
+            callback_data=f"quiz_{index}_{question['id']}_{answer['id']}"
         )
         keyboard.add(btn)
     
     quiz_text = f"""
-🎯 **Викторина** | Вопрос {session['current_question'] + 1}/{len(session['questions'])}
+🎯 **Викторина** | Вопрос {index + 1}/{total}
 
 ❓ **Определение:**
 {question['definition']}
 
 Выберите правильный термин: 👇
     """
+    return quiz_text, keyboard.to_json()
+
+def prepare_quiz_question(session, index):
+    """Подготовка вопроса index в фоне"""
+    questions = session['questions']
+    session['prepared'] = (
+        index, quiz_prefetch.submit(render_quiz_question, questions[index], index, len(questions)))
+
+def take_quiz_question(session, index):
+    """Вопрос index: подготовленный заранее или, если его нет, сейчас"""
+    prepared = session.pop('prepared', None)
+    if prepared and prepared[0] == index:
+        QUIZ_PREFETCH.labels('ready' if prepared[1].done() else 'waited').inc()
+        try:
+            return prepared[1].result()
+        except Exception as e:
+            logs.log_error('quiz_prefetch_failed', e)
+    else:
+        QUIZ_PREFETCH.labels('miss').inc()
+    return render_quiz_question(session['questions'][index], index, len(session['questions']))
+
+def send_quiz_question(message, user_id):
+    """Отправка текущего вопроса викторины и подготовка следующего"""
+    session = user_sessions.get(user_id)
     
+    if not session or session['current_question'] >= len(session['questions']):
+        finish_quiz(message, user_id)
+        return
+    
+    index = session['current_question']
+    quiz_text, keyboard = take_quiz_question(session, index)
     bot.send_message(
         message.chat.id,
         quiz_text,
         reply_markup=keyboard,
         parse_mode='HTML'
     )
+    
+    if index + 1 < len(session['questions']):
+        prepare_quiz_question(session, index + 1)
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('quiz_'))
+def is_current_answer(session, index, question_id):
+    """Ответ на текущий вопрос сессии (не повторное нажатие и не старая кнопка)"""
+    current = session['current_question'] if session else None
+    return (current == index and current < len(session['questions'])
+            and session['questions'][current]['id'] == question_id)
+
+# Ответ на вопрос: quiz_<номер вопроса>_<id вопроса>_<id ответа>
+# (выбор категории — quiz_web и т.п.)
+@bot.callback_query_handler(func=lambda call: parse_quiz_answer(call.data) is not None)
+@instrumented
 def handle_quiz_answer(call):
     """Обработка ответа викторины"""
     user_id = call.from_user.id
-    session = user_sessions.get(user_id)
-    
-    if not session:
-        return
     
     # Парсим данные из callback
-    parts = call.data.split('_')
-    correct_id = int(parts[1])
-    selected_id = int(parts[2])
+    index, correct_id, selected_id = parse_quiz_answer(call.data)
+    
+    # Ответ засчитывается только на текущий вопрос и только один раз:
+    # повторное нажатие или кнопка старой викторины лишь подтверждаются
+    with quiz_lock:
+        session = user_sessions.get(user_id)
+        if not is_current_answer(session, index, correct_id):
+            STALE_CALLBACKS.inc()
+            stale = True
+        else:
+            session['current_question'] += 1
+            stale = False
+    
+    if stale:
+        bot.answer_callback_query(call.id, "⌛ Этот вопрос уже пройден")
+        return
     
     # Проверяем ответ
     is_correct = correct_id == selected_id
-    
     if is_correct:
         session['score'] += 1
+    last = index + 1 >= len(session['questions'])
+    
+    # Следующий вопрос уже подготовлен: он уходит первым, учёт ответа — после
+    # (номер вопроса уже увеличен выше)
+    if not last:
+        send_quiz_question(call.message, user_id)
+    
+    if is_correct:
         bot.answer_callback_query(call.id, "✅ Правильно!", show_alert=False)
     else:
-        correct_concept = get_concept_by_id(correct_id)
-        if correct_concept:
-            bot.answer_callback_query(
-                call.id,
-                f"❌ Неверно! Правильный ответ: {correct_concept['term']}",
-                show_alert=True
-            )
+        bot.answer_callback_query(
+            call.id,
+            f"❌ Неверно! Правильный ответ: {session['questions'][index]['term']}",
+            show_alert=True
+        )
     
     # Сохраняем прогресс
-    save_user_progress(user_id, correct_id, is_correct)
+    save_user_progress(user_id, correct_id, is_correct, from_quiz=True)
     
-    # Переходим к следующему вопросу
-    session['current_question'] += 1
-    send_quiz_question(call.message, user_id)
+    if last:
+        finish_quiz(call.message, user_id)
 
 def finish_quiz(message, user_id):
     """Завершение викторины"""
@@ -414,8 +810,8 @@ def finish_quiz(message, user_id):
     total = len(session['questions'])
     percentage = score * 100 // total
     
-    # Сохраняем результат
-    save_quiz_result(user_id, score, total)
+    # Сохраняем результат и начисляем очки рейтинга
+    leaderboard.record_quiz(user_id, session.get('user_name'), score, total, session['category'])
     
     # Определяем сообщение по результату
     if percentage == 100:
@@ -451,6 +847,7 @@ def finish_quiz(message, user_id):
     bot.send_message(message.chat.id, "Продолжить?", reply_markup=keyboard)
 
 @bot.message_handler(func=lambda message: message.text == "📊 Моя статистика")
+@instrumented
 def show_user_stats(message):
     """Показ статистики пользователя"""
     user_id = message.from_user.id
@@ -478,12 +875,59 @@ def show_user_stats(message):
     if history:
         stats_text += "\n\n📈 **Последние викторины:**\n"
         for i, quiz in enumerate(history[:3], 1):
-            percentage = quiz['score'] * 100 // quiz['total_questions']
-            stats_text += f"{i}. {quiz['score']}/{quiz['total_questions']} ({percentage}%)\n"
+            percentage = quiz['score'] * 100 // max(quiz['total_questions'], 1)
+            stats_text += f"{i}. {quiz['score']}/{quiz['total_questions']} ({percentage}%)"
+            # Старые викторины хранятся итогом за день
+            if quiz['quizzes'] > 1:
+                stats_text += f" — итог за {quiz['completed_at']}, викторин: {quiz['quizzes']}"
+            stats_text += "\n"
     
-    bot.send_message(message.chat.id, stats_text, parse_mode='HTML')
+    stats_text += format_rank_line(user_id)
+    
+    keyboard = types.InlineKeyboardMarkup()
+    keyboard.add(types.InlineKeyboardButton("🏆 Рейтинг", callback_data="top_new"))
+    bot.send_message(message.chat.id, stats_text, reply_markup=keyboard, parse_mode='HTML')
+    
+    # Графики приходят следом отдельным фото, когда будут готовы
+    charts.send_progress_card(bot, message.chat.id, user_id)
+
+# Области рейтинга по кнопкам: callback -> (область, заголовок)
+LEADERBOARD_SCOPES = {
+    'all': (lambda: GLOBAL_SCOPE, "🏆 Общий рейтинг"),
+    'week': (week_scope, "📅 Рейтинг недели"),
+    'web': (lambda: category_scope('web'), "🌐 Рейтинг: веб-технологии"),
+    'python': (lambda: category_scope('python'), "🐍 Рейтинг: Python"),
+}
+
+def format_rank_line(user_id):
+    """Строка с местом пользователя в общем рейтинге"""
+    rank = leaderboard.rank(user_id)
+    if not rank:
+        return "\n🏆 Рейтинг: пройди викторину, чтобы попасть в рейтинг"
+    place, points, total = rank
+    return f"\n🏆 Рейтинг: {place} место из {total} ({points} очков)"
+
+def format_leaderboard(scope, user_id, key='all', limit=10):
+    """Текст таблицы рейтинга с местом текущего пользователя"""
+    title = LEADERBOARD_SCOPES[key][1]
+    rows = leaderboard.top(scope, limit)
+    
+    if not rows:
+        return f"{title}\n\nПока никто не прошёл викторину в этой категории."
+    
+    medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+    text = f"{title}\n\n"
+    for place, row_user_id, name, points in rows:
+        marker = " ← ты" if row_user_id == user_id else ""
+        text += f"{medals.get(place, f'{place}.')} {name or 'Участник'} — {points}{marker}\n"
+    
+    rank = leaderboard.rank(user_id, scope)
+    if rank and rank[0] > limit:
+        text += f"\n…\n{rank[0]}. Ты — {rank[1]}"
+    return text
 
 @bot.message_handler(func=lambda message: message.text == "🔍 Поиск")
+@instrumented
 def search_prompt(message):
     """Запрос поискового запроса"""
     msg = bot.send_message(
@@ -493,6 +937,7 @@ def search_prompt(message):
     )
     bot.register_next_step_handler(msg, process_search)
 
+@instrumented
 def process_search(message):
     """Обработка поискового запроса"""
     query = message.text.strip()
@@ -501,7 +946,7 @@ def process_search(message):
         bot.send_message(message.chat.id, "❌ Запрос слишком короткий (минимум 2 символа)")
         return
     
-    results = search_concepts(query)
+    results = cache.search_concepts(query)
     
     if not results:
         bot.send_message(message.chat.id, f"❌ По запросу '{query}' ничего не найдено")
@@ -525,6 +970,7 @@ def process_search(message):
     bot.send_message(message.chat.id, "🔙 Меню", reply_markup=get_main_keyboard())
 
 @bot.message_handler(func=lambda message: message.text == "📂 Категории")
+@instrumented
 def show_categories(message):
     """Показ категорий понятий"""
     categories = get_all_categories()
@@ -543,6 +989,7 @@ def show_categories(message):
     bot.send_message(message.chat.id, categories_text, reply_markup=keyboard, parse_mode='HTML')
 
 @bot.message_handler(func=lambda message: message.text == "ℹ️ О боте")
+@instrumented
 def about_bot(message):
     """Информация о боте"""
     total_concepts = get_concept_count()
@@ -595,6 +1042,7 @@ def about_bot(message):
 # =============================================================================
 
 @bot.message_handler(func=lambda message: message.text == "➕ Добавить понятие")
+@instrumented
 def add_concept_prompt(message):
     """Запрос на добавление понятия"""
     if message.from_user.id not in ADMIN_IDS:
@@ -609,6 +1057,7 @@ def add_concept_prompt(message):
     )
     bot.register_next_step_handler(msg, process_add_term)
 
+@instrumented
 def process_add_term(message):
     """Обработка ввода термина"""
     user_states[message.from_user.id] = {
@@ -623,6 +1072,7 @@ def process_add_term(message):
     )
     bot.register_next_step_handler(msg, process_add_definition)
 
+@instrumented
 def process_add_definition(message):
     """Обработка ввода определения"""
     user_states[message.from_user.id]['definition'] = message.text.strip()
@@ -634,6 +1084,7 @@ def process_add_definition(message):
     )
     bot.register_next_step_handler(msg, process_add_category)
 
+@instrumented
 def process_add_category(message):
     """Обработка ввода категории"""
     category = message.text.strip() if message.text.strip() else "General"
@@ -646,6 +1097,7 @@ def process_add_category(message):
     )
     bot.register_next_step_handler(msg, process_add_example)
 
+@instrumented
 def process_add_example(message):
     """Обработка ввода примера и сохранение"""
     example = message.text.strip() if message.text.strip().lower() != "пропустить" else ""
@@ -675,29 +1127,419 @@ def process_add_example(message):
     if message.from_user.id in user_states:
         del user_states[message.from_user.id]
 
-@bot.message_handler(func=lambda message: message.text == "📋 Все понятия")
+@bot.message_handler(func=lambda message: message.text in ("📋 Все понятия", "📝 Редактировать", "🗑️ Удалить понятие"))
+@instrumented
 def show_all_concepts(message):
-    """Показ всех понятий"""
+    """Каталог понятий с постраничным просмотром, фильтрами и правкой"""
+    if message.from_user.id not in ADMIN_IDS:
+        bot.send_message(message.chat.id, "❌ У вас нет прав администратора")
+        return
+    
+    # Кнопки правки и удаления ведут в тот же каталог: там у каждой строки ✏️ и 🗑
+    catalog_filters[message.from_user.id] = {'category': None, 'query': None, 'cursor': None}
+    send_catalog_page(message.chat.id, message.from_user.id)
+
+def load_catalog_page(user_id):
+    """Текущая страница каталога: один запрос по индексу (term, id)"""
+    state = catalog_filters.setdefault(user_id, {'category': None, 'query': None, 'cursor': None})
+    cursor = state['cursor']
+    after_id = cursor[1] if cursor and cursor[0] == 'after' else None
+    before_id = cursor[1] if cursor and cursor[0] == 'before' else None
+    
+    concepts, has_more = get_concepts_page(
+        after_id, before_id, state['category'], state['query'], CATALOG_PAGE_SIZE
+    )
+    # Страница опустела (понятия удалены) — возвращаемся к началу
+    if not concepts and cursor is not None:
+        state['cursor'] = None
+        return load_catalog_page(user_id)
+    
+    if before_id is not None:
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = after_id is not None, has_more
+    return concepts, has_prev, has_next
+
+def render_catalog_page(user_id):
+    """Текст и клавиатура страницы каталога"""
+    concepts, has_prev, has_next = load_catalog_page(user_id)
+    state = catalog_filters[user_id]
+    
+    text = "📋 Каталог понятий"
+    if state['category']:
+        text += f"\n📂 Категория: {state['category']}"
+    if state['query']:
+        text += f"\n🔍 Поиск: {state['query']}"
+    text += "\n\n"
+    
+    keyboard = types.InlineKeyboardMarkup()
+    if not concepts:
+        text += "❌ Ничего не найдено"
+    for concept in concepts:
+        text += f"• {concept['term']} — {concept['category']}\n"
+        keyboard.row(
+            types.InlineKeyboardButton(f"✏️ {concept['term'][:30]}", callback_data=f"adm_e_{concept['id']}"),
+            types.InlineKeyboardButton("🗑", callback_data=f"adm_d_{concept['id']}")
+        )
+    
+    navigation = []
+    if has_prev:
+        navigation.append(types.InlineKeyboardButton("◀️ Назад", callback_data=f"adm_p_{concepts[0]['id']}"))
+    if has_next and concepts:
+        navigation.append(types.InlineKeyboardButton("Вперёд ▶️", callback_data=f"adm_n_{concepts[-1]['id']}"))
+    if navigation:
+        keyboard.row(*navigation)
+    
+    filters = [
+        types.InlineKeyboardButton("📂 Категория", callback_data="adm_c"),
+        types.InlineKeyboardButton("🔍 Поиск", callback_data="adm_s")
+    ]
+    if state['category'] or state['query']:
+        filters.append(types.InlineKeyboardButton("✖️ Сбросить", callback_data="adm_x"))
+    keyboard.row(*filters)
+    return text, keyboard
+
+def send_catalog_page(chat_id, user_id):
+    """Страница каталога новым сообщением"""
+    text, keyboard = render_catalog_page(user_id)
+    bot.send_message(chat_id, text, reply_markup=keyboard)
+
+def edit_catalog_page(call, text=None, keyboard=None):
+    """Страница каталога (или другой экран каталога) на месте прежнего сообщения"""
+    if text is None:
+        text, keyboard = render_catalog_page(call.from_user.id)
+    try:
+        bot.edit_message_text(
+            text, call.message.chat.id, call.message.message_id, reply_markup=keyboard
+        )
+    except telebot.apihelper.ApiTelegramException as e:
+        if 'message is not modified' not in str(e):
+            raise
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith('adm_'))
+@instrumented
+def handle_catalog(call):
+    """Навигация, фильтры, правка и удаление в каталоге"""
+    user_id = call.from_user.id
+    if user_id not in ADMIN_IDS:
+        bot.answer_callback_query(call.id, "❌ У вас нет прав администратора")
+        return
+    
+    action, _, argument = call.data[len('adm_'):].partition('_')
+    state = catalog_filters.setdefault(user_id, {'category': None, 'query': None, 'cursor': None})
+    
+    if action == 'n':
+        state['cursor'] = ('after', int(argument))
+    elif action == 'p':
+        state['cursor'] = ('before', int(argument))
+    elif action == 'r':
+        pass
+    elif action == 'x':
+        state.update(category=None, query=None, cursor=None)
+    elif action == 'c':
+        categories = get_all_categories()
+        keyboard = types.InlineKeyboardMarkup(row_width=2)
+        keyboard.add(*[
+            types.InlineKeyboardButton(cat, callback_data=f"adm_cs_{i}")
+            for i, cat in enumerate(categories)
+        ])
+        keyboard.add(types.InlineKeyboardButton("🎲 Все категории", callback_data="adm_cs_all"))
+        bot.answer_callback_query(call.id)
+        edit_catalog_page(call, "📂 Выберите категорию:", keyboard)
+        return
+    elif action == 'cs':
+        categories = get_all_categories()
+        if argument.isdigit() and int(argument) < len(categories):
+            state['category'] = categories[int(argument)]
+        else:
+            state['category'] = None
+        state['cursor'] = None
+    elif action == 's':
+        bot.answer_callback_query(call.id)
+        msg = bot.send_message(call.message.chat.id, "🔍 Введите часть термина или определения:")
+        bot.register_next_step_handler(msg, process_catalog_search)
+        return
+    elif action in ('d', 'e'):
+        concept = get_concept_by_id(int(argument))
+        if not concept:
+            bot.answer_callback_query(call.id, "❌ Понятие уже удалено")
+            edit_catalog_page(call)
+            return
+        bot.answer_callback_query(call.id)
+        if action == 'e':
+            start_concept_edit(call.message.chat.id, user_id, concept)
+            return
+        keyboard = types.InlineKeyboardMarkup()
+        keyboard.row(
+            types.InlineKeyboardButton("✅ Удалить", callback_data=f"adm_dy_{concept['id']}"),
+            types.InlineKeyboardButton("↩️ Отмена", callback_data="adm_r")
+        )
+        edit_catalog_page(call, f"🗑 Удалить понятие {concept['term']}?", keyboard)
+        return
+    elif action == 'dy':
+        deleted = delete_concept(int(argument))
+        bot.answer_callback_query(call.id, "✅ Понятие удалено" if deleted else "❌ Понятие уже удалено")
+        edit_catalog_page(call)
+        return
+    
+    bot.answer_callback_query(call.id)
+    edit_catalog_page(call)
+
+@instrumented
+def process_catalog_search(message):
+    """Фильтр каталога по тексту"""
+    query = (message.text or '').strip()
+    state = catalog_filters.setdefault(message.from_user.id, {'category': None, 'query': None, 'cursor': None})
+    state['query'] = query or None
+    state['cursor'] = None
+    send_catalog_page(message.chat.id, message.from_user.id)
+
+def start_concept_edit(chat_id, user_id, concept):
+    """Начало правки понятия: поля по очереди, '-' оставляет прежнее значение"""
+    user_states[user_id] = {'state': 'edit_concept', 'concept': concept}
+    msg = bot.send_message(
+        chat_id,
+        f"✏️ Правка понятия {concept['term']}\n"
+        f"(отправьте '-', чтобы оставить значение)\n\n"
+        f"Термин сейчас: {concept['term']}\nВведите новый термин:",
+        reply_markup=types.ReplyKeyboardRemove()
+    )
+    bot.register_next_step_handler(msg, process_edit_field, 'term')
+
+EDIT_FIELDS = [
+    ('term', "Термин"),
+    ('definition', "Определение"),
+    ('category', "Категория"),
+    ('example', "Пример"),
+]
+
+@instrumented
+def process_edit_field(message, field):
+    """Ввод очередного поля правки"""
+    state = user_states.get(message.from_user.id)
+    if not state or state.get('state') != 'edit_concept':
+        return
+    
+    value = (message.text or '').strip()
+    if value and value != '-':
+        state[field] = value
+    
+    names = [name for name, _ in EDIT_FIELDS]
+    index = names.index(field) + 1
+    if index < len(EDIT_FIELDS):
+        next_field, label = EDIT_FIELDS[index]
+        current = state['concept'][next_field] or '—'
+        msg = bot.send_message(
+            message.chat.id,
+            f"{label} сейчас: {current}\nВведите новое значение или '-':"
+        )
+        bot.register_next_step_handler(msg, process_edit_field, next_field)
+        return
+    
+    concept = state['concept']
+    values = {name: state.get(name, concept[name]) or '' for name in names}
+    success = update_concept(
+        concept['id'], values['term'], values['definition'],
+        values['category'] or "General", values['example']
+    )
+    del user_states[message.from_user.id]
+    
+    if success:
+        text = f"✅ Понятие '{values['term'].upper()}' обновлено!"
+    else:
+        text = f"❌ Не удалось сохранить: понятие удалено или термин '{values['term'].upper()}' уже занят"
+    bot.send_message(message.chat.id, text, reply_markup=get_admin_keyboard())
+    send_catalog_page(message.chat.id, message.from_user.id)
+
+@bot.message_handler(commands=['hardest'])
+@bot.message_handler(func=lambda message: message.text == "🔥 Сложные понятия")
+@instrumented
+def show_hardest_concepts(message):
+    """Понятия с наибольшей долей ошибок в викторинах"""
     if message.from_user.id not in ADMIN_IDS:
         bot.send_message(message.chat.id, "❌ У вас нет прав администратора")
         return
     
-    concepts = get_all_concepts()
+    concepts = get_hardest_concepts(limit=15)
     
     if not concepts:
-        bot.send_message(message.chat.id, "❌ В базе нет понятий")
+        bot.send_message(message.chat.id, "❌ Пока недостаточно ответов в викторинах")
+        return
+    
+    text = "🔥 Сложные понятия (доля ошибок в викторинах):\n\n"
+    for i, concept in enumerate(concepts, 1):
+        text += (f"{i}. {concept['term']} — {concept['error_rate'] * 100:.0f}% "
+                 f"({concept['errors']}/{concept['attempts']}), {concept['category']}\n")
+    
+    bot.send_message(message.chat.id, text, reply_markup=get_admin_keyboard())
+
+@bot.message_handler(commands=['sqltrace'])
+@instrumented
+def sql_trace_command(message):
+    """Управление трассировкой SQL: /sqltrace on|off|explain|reset"""
+    if message.from_user.id not in ADMIN_IDS:
+        bot.send_message(message.chat.id, "❌ У вас нет прав администратора")
+        return
+
+    args = message.text.split()[1:]
+    action = args[0].lower() if args else ''
+
+    if action == 'on':
+        sqltrace.enable(True)
+    elif action == 'off':
+        sqltrace.enable(False)
+        sqltrace.explain = False
+    elif action == 'explain':
+        sqltrace.enable(True)
+        sqltrace.explain = True
+    elif action == 'reset':
+        sqltrace.reset()
+
+    bot.send_message(
+        message.chat.id,
+        f"🔬 Трассировка SQL: {'включена' if sqltrace.enabled else 'выключена'}\n"
+        f"EXPLAIN QUERY PLAN: {'включён' if sqltrace.explain else 'выключен'}\n"
+        f"Порог медленного запроса: {sqltrace.slow_threshold * 1000:.0f} мс\n\n"
+        "Использование: /sqltrace on|off|explain|reset, /sqltop [N]"
+    )
+
+@bot.message_handler(commands=['sqltop'])
+@instrumented
+def sql_top_command(message):
+    """Топ-N запросов по суммарному времени: /sqltop [N]"""
+    if message.from_user.id not in ADMIN_IDS:
+        bot.send_message(message.chat.id, "❌ У вас нет прав администратора")
+        return
+
+    args = message.text.split()[1:]
+    limit = int(args[0]) if args and args[0].isdigit() else 10
+
+    report = sqltrace.format_report(limit)
+    # Ограничение Telegram — 4096 символов на сообщение
+    for start in range(0, len(report), 4000):
+        bot.send_message(message.chat.id, report[start:start + 4000])
+
+@bot.message_handler(commands=['cachestats'])
+@instrumented
+def cache_stats_command(message):
+    """Статистика кэша поиска"""
+    if message.from_user.id not in ADMIN_IDS:
+        bot.send_message(message.chat.id, "❌ У вас нет прав администратора")
+        return
+    
+    stats = cache.search_cache.stats()
+    lines = [f"🗄 Кэш поиска (версия каталога {database.catalog_version})", ""]
+    lines += [f"{name}: {value}" for name, value in stats.items()]
+    bot.send_message(message.chat.id, "\n".join(lines))
+
+@bot.message_handler(commands=['broadcast'])
+@instrumented
+def broadcast_command(message):
+    """Состояние рассылок; /broadcast now — запустить понятие дня сейчас"""
+    if message.from_user.id not in ADMIN_IDS:
+        bot.send_message(message.chat.id, "❌ У вас нет прав администратора")
+        return
+    
+    args = message.text.split()[1:]
+    if args and args[0] == 'now':
+        bot.send_message(message.chat.id, "📣 Рассылка понятия дня запущена")
+        threading.Thread(target=broadcaster.run_daily, name='broadcast-now', daemon=True).start()
+        return
+    
+    lines = [
+        f"📣 Получателей: {database.get_user_count(reachable=True)} из {database.get_user_count()}",
+        ""
+    ]
+    for item in database.get_recent_broadcasts():
+        lines.append(
+            f"{item['day']} [{item['status']}] отправлено {item['sent']}, "
+            f"заблокировали {item['blocked']}, ошибок {item['failed']}"
+        )
+    bot.send_message(message.chat.id, "\n".join(lines))
+
+@bot.message_handler(commands=['analytics'])
+@instrumented
+def analytics_command(message):
+    """Отчёт аналитики; /analytics refresh — собрать заново, не дожидаясь срока кэша"""
+    if message.from_user.id not in ADMIN_IDS:
+        bot.send_message(message.chat.id, "❌ У вас нет прав администратора")
         return
     
-    text = f"📋 **Все понятия ({len(concepts)}):**\n\n"
-    for i, concept in enumerate(concepts[:20], 1):
-        text += f"{i}. **{concept['term']}** - {concept['category']}\n"
+    refresh = message.text.split()[1:2] == ['refresh']
+    bot.send_message(message.chat.id, "⏳ Собираю отчёт...")
+    
+    def build():
+        # NumPy загружается только при первом отчёте
+        import analytics
+        try:
+            text = analytics.format_report(analytics.get_report(refresh))
+        except Exception as e:
+            logs.log_error('analytics_failed', e)
+            text = "❌ Не удалось собрать отчёт"
+        for start in range(0, len(text), 4000):
+            bot.send_message(message.chat.id, text[start:start + 4000])
+    
+    threading.Thread(target=build, name='analytics', daemon=True).start()
+
+@bot.message_handler(commands=['backup'])
+@instrumented
+def backup_command(message):
+    """Список снимков базы; /backup now — снимок сейчас"""
+    if message.from_user.id not in ADMIN_IDS:
+        bot.send_message(message.chat.id, "❌ У вас нет прав администратора")
+        return
     
-    if len(concepts) > 20:
-        text += f"\n... и ещё {len(concepts) - 20} понятий"
+    args = message.text.split()[1:]
+    if args and args[0] == 'now':
+        bot.send_message(message.chat.id, "💾 Резервное копирование запущено")
+        
+        def run():
+            result = backups.run()
+            if result is None:
+                bot.send_message(message.chat.id, "❌ Снимок не создан (копирование уже идёт или ошибка)")
+            else:
+                bot.send_message(message.chat.id, f"✅ {result['path']}: {result['bytes'] // 1024} КБ "
+                                                  f"за {result['seconds']} с")
+        
+        threading.Thread(target=run, name='backup-now', daemon=True).start()
+        return
     
-    bot.send_message(message.chat.id, text, parse_mode='HTML'), reply_markup=get_admin_keyboard())
+    items = backup.list_backups()
+    lines = [f"💾 Снимков: {len(items)}", ""]
+    lines += [f"{item['created']}  {item['bytes'] // 1024} КБ  {item['path']}" for item in items]
+    lines += ["", "Восстановление: python backup.py restore [файл]"]
+    bot.send_message(message.chat.id, "\n".join(lines))
+
+@bot.message_handler(commands=['maintenance'])
+@instrumented
+def maintenance_command(message):
+    """Размер базы и итог обслуживания; /maintenance run — проход сейчас"""
+    if message.from_user.id not in ADMIN_IDS:
+        bot.send_message(message.chat.id, "❌ У вас нет прав администратора")
+        return
+    
+    args = message.text.split()[1:]
+    if args and args[0] == 'run':
+        bot.send_message(message.chat.id, "🧹 Обслуживание базы запущено")
+        threading.Thread(target=maintainer.run, name='maintenance-now', daemon=True).start()
+        return
+    
+    storage = database.get_storage_stats()
+    lines = [
+        f"🧹 База: {storage['page_count'] * storage['page_size'] // 1024} КБ, "
+        f"свободно {storage['freelist_count'] * storage['page_size'] // 1024} КБ",
+        "auto_vacuum: " + ("пошаговый" if storage['auto_vacuum'] == 2
+                           else "выключен (python maintenance.py vacuum)"),
+        ""
+    ]
+    if maintainer.last_report is None:
+        lines.append("Обслуживание ещё не проводилось")
+    else:
+        lines += [f"{task}: {value}" for task, value in maintainer.last_report.items()]
+    bot.send_message(message.chat.id, "\n".join(lines))
 
 @bot.message_handler(func=lambda message: message.text == "🔙 Главное меню" or message.text == "🔙 В меню")
+@instrumented
 def show_main_menu(message):
     """Возврат в главное меню"""
     bot.send_message(
@@ -711,6 +1553,7 @@ def show_main_menu(message):
 # =============================================================================
 
 @bot.callback_query_handler(func=lambda call: call.data == "next_concept")
+@instrumented
 def handle_next_concept(call):
     """Обработка кнопки следующего понятия"""
     concept = get_random_concept()
@@ -718,7 +1561,26 @@ def handle_next_concept(call):
         show_concept_message(call.message.chat.id, concept)
         save_user_progress(call.from_user.id, concept['id'], True)
 
+@bot.callback_query_handler(func=lambda call: call.data.startswith('rel_'))
+@instrumented
+def handle_related_concept(call):
+    """Переход к похожему понятию с карточки"""
+    concept = get_concept_by_id(int(call.data.replace('rel_', '')))
+    if not concept:
+        bot.answer_callback_query(call.id, "❌ Понятие уже удалено")
+        return
+    show_concept_message(call.message.chat.id, concept)
+    save_user_progress(call.from_user.id, concept['id'], True)
+
+@bot.callback_query_handler(func=lambda call: call.data == "daily_off")
+@instrumented
+def handle_daily_off(call):
+    """Отписка от понятия дня (снова подписывает /start)"""
+    database.set_user_subscribed(call.from_user.id, False)
+    bot.answer_callback_query(call.id, "🔕 Понятие дня отключено. Включить снова — команда /start")
+
 @bot.callback_query_handler(func=lambda call: call.data == "main_menu")
+@instrumented
 def handle_main_menu(call):
     """Обработка кнопки главного меню"""
     bot.send_message(
@@ -727,7 +1589,38 @@ def handle_main_menu(call):
         reply_markup=get_main_keyboard()
     )
 
+@bot.callback_query_handler(func=lambda call: call.data.startswith('top_'))
+@instrumented
+def handle_leaderboard(call):
+    """Переключение рейтинга"""
+    key = call.data.replace('top_', '')
+    bot.answer_callback_query(call.id)
+    
+    # Кнопка со экрана статистики открывает рейтинг новым сообщением
+    if key == 'new':
+        text = format_leaderboard(GLOBAL_SCOPE, call.from_user.id)
+        bot.send_message(call.message.chat.id, text,
+                         reply_markup=get_leaderboard_keyboard(), parse_mode='HTML')
+        return
+    
+    if key not in LEADERBOARD_SCOPES:
+        return
+    
+    # Переключение внутри рейтинга редактирует сообщение на месте
+    scope = LEADERBOARD_SCOPES[key][0]()
+    text = format_leaderboard(scope, call.from_user.id, key)
+    try:
+        bot.edit_message_text(
+            text, call.message.chat.id, call.message.message_id,
+            reply_markup=get_leaderboard_keyboard(), parse_mode='HTML'
+        )
+    except telebot.apihelper.ApiTelegramException as e:
+        # Повторное нажатие на ту же кнопку: текст не изменился
+        if 'message is not modified' not in str(e):
+            raise
+
 @bot.callback_query_handler(func=lambda call: call.data.startswith('cat_'))
+@instrumented
 def handle_category_select(call):
     """Обработка выбора категории"""
     category = call.data.replace('cat_', '')
@@ -742,6 +1635,7 @@ def handle_category_select(call):
     save_user_progress(call.from_user.id, concept['id'], True)
 
 @bot.callback_query_handler(func=lambda call: call.data.startswith('quiz_'))
+@instrumented
 def handle_quiz_category(call):
     """Обработка выбора категории викторины"""
     category = call.data.replace('quiz_', '')
@@ -757,113 +1651,65 @@ def handle_quiz_category(call):
     
     # Получаем понятия для викторины
     if categories:
-        all_concepts = get_concepts_by_categories(categories)
+        all_concepts = cache.concepts_by_categories(categories)
     else:
-        all_concepts = get_all_concepts()
+        all_concepts = cache.all_concepts()
     
     if len(all_concepts) < 4:
         bot.answer_callback_query(call.id, "❌ Недостаточно понятий для викторины")
         return
     
-    questions = random.sample(all_concepts, min(5, len(all_concepts)))
+    questions = select_quiz_questions(user_id, all_concepts, category)
     
     user_sessions[user_id] = {
         'questions': questions,
         'current_question': 0,
         'score': 0,
-        'category': category
+        'category': category,
+        'user_name': call.from_user.first_name
     }
     
     bot.answer_callback_query(call.id)
     send_quiz_question(call.message, user_id)
 
+# =============================================================================
+# INLINE-РЕЖИМ
+# =============================================================================
+
+@bot.inline_handler(func=lambda query: True)
+@instrumented
+def handle_inline_query(query):
+    """Подсказки понятий по началу термина: @бот dec…"""
+    offset = int(query.offset) if query.offset.isdigit() else 0
+    concepts = prefix_index.search(query.query, INLINE_RESULTS_LIMIT, offset)
+    # Тексты страницы — одним запросом, а не по одному на понятие
+    database.load_concept_texts(concepts)
+    
+    results = []
+    for concept in concepts:
+        text = f"📖 {concept['term']}\n\n{concept['definition']}\n\n🏷️ Категория: {concept['category']}"
+        if concept['example']:
+            text += f"\n\n💡 Пример:\n{concept['example']}"
+        results.append(types.InlineQueryResultArticle(
+            id=str(concept['id']),
+            title=concept['term'],
+            description=concept['definition'][:100],
+            input_message_content=types.InputTextMessageContent(text)
+        ))
+    
+    # Следующая страница запрашивается клиентом при прокрутке
+    next_offset = str(offset + len(results)) if len(results) == INLINE_RESULTS_LIMIT else ''
+    bot.answer_inline_query(
+        query.id, results, cache_time=INLINE_CACHE_TIME, next_offset=next_offset
+    )
+
 # =============================================================================
 # ЗАПУСК БОТА
 # =============================================================================
 
-if __name__ == "__main__":
-    # Инициализация базы данных
-    init_database()
-    
-    # Добавление начальных понятий (если база пустая)
-    if get_concept_count() == 0:
-        initial_concepts = [
-            # ========== ВЕБ-ТЕХНОЛОГИИ ==========
-            ("HTML", "Язык гипертекстовой разметки для создания структуры веб-страниц", "Frontend", "<h1>Заголовок</h1>"),
-            ("CSS", "Каскадные таблицы стилей для оформления веб-страниц", "Frontend", "color: red;"),
-            ("JavaScript", "Язык программирования для интерактивности на веб-страницах", "Frontend", "console.log('Hello');"),
-            ("HTTP", "Протокол передачи гипертекста для обмена данными в вебе", "Backend", "GET /index.html"),
-            ("URL", "Универсальный локатор ресурса - адрес веб-страницы", "General", "https://example.com"),
-            ("DOM", "Объектная модель документа - представление HTML в виде дерева", "Frontend", "document.getElementById()"),
-            ("API", "Интерфейс программирования приложений для взаимодействия сервисов", "Backend", "REST API"),
-            ("JSON", "Текстовый формат обмена данными на основе JavaScript", "Backend", '{"name": "John"}'),
-            ("SQL", "Язык структурированных запросов для работы с базами данных", "Backend", "SELECT * FROM users"),
-            ("Git", "Система контроля версий для отслеживания изменений в коде", "Tools", "git commit -m 'msg'"),
-            ("Responsive Design", "Адаптивный дизайн для разных размеров экранов", "Frontend", "@media (max-width: 768px)"),
-            ("Bootstrap", "Популярный CSS-фреймворк для быстрой разработки", "Frontend", "class='container'"),
-            ("React", "JavaScript-библиотека для создания пользовательских интерфейсов", "Frontend", "<Component />"),
-            ("Node.js", "Среда выполнения JavaScript на стороне сервера", "Backend", "require('express')"),
-            ("Database", "Организованная коллекция структурированной информации", "Backend", "MySQL, PostgreSQL"),
-            ("Server", "Компьютер или программа, предоставляющая услуги клиентам", "Backend", "Web Server"),
-            ("Client", "Программа или устройство, запрашивающее услуги у сервера", "General", "Web Browser"),
-            ("Framework", "Каркас для разработки приложений с готовыми компонентами", "General", "Django, Laravel"),
-            ("Library", "Библиотека готового кода для повторного использования", "General", "jQuery, Lodash"),
-            ("Deployment", "Процесс размещения приложения на сервере для доступа пользователей", "Tools", "CI/CD"),
-            
-            # ========== PYTHON BASICS ==========
-            ("Python", "Высокоуровневый язык программирования общего назначения с простым синтаксисом", "Python Basics", "print('Hello, World!')"),
-            ("Переменная", "Именованная область памяти для хранения данных в программе", "Python Basics", "x = 10"),
-            ("Список (List)", "Упорядоченная изменяемая коллекция элементов в Python", "Python Basics", "my_list = [1, 2, 3]"),
-            ("Кортеж (Tuple)", "Упорядоченная неизменяемая коллекция элементов в Python", "Python Basics", "my_tuple = (1, 2, 3)"),
-            ("Словарь (Dict)", "Коллекция пар ключ-значение для хранения данных", "Python Basics", "my_dict = {'name': 'John'}"),
-            ("Множество (Set)", "Неупорядоченная коллекция уникальных элементов", "Python Basics", "my_set = {1, 2, 3}"),
-            ("Функция", "Именованный блок кода, который можно вызывать многократно", "Python Basics", "def func(): pass"),
-            ("Класс", "Шаблон для создания объектов с атрибутами и методами", "Python Basics", "class MyClass:"),
-            ("Модуль", "Файл с кодом Python, который можно импортировать в другие программы", "Python Basics", "import math"),
-            ("Пакет (Package)", "Каталог с модулями Python и файлом __init__.py", "Python Basics", "import package.module"),
-            ("Исключение", "Объект, представляющий ошибку во время выполнения программы", "Python Basics", "try: ... except:"),
-            ("Декоратор", "Функция, которая модифицирует поведение другой функции", "Python Basics", "@decorator"),
-            ("Генератор", "Функция, которая возвращает итератор с помощью yield", "Python Basics", "yield value"),
-            ("Лямбда-функция", "Анонимная функция, определённая в одном выражении", "Python Basics", "lambda x: x + 1"),
-            ("Метод", "Функция, определённая внутри класса и связанная с объектом", "Python Basics", "obj.method()"),
-            ("Атрибут", "Переменная, принадлежащая объекту или классу", "Python Basics", "obj.attribute"),
-            ("Итератор", "Объект, который позволяет перебирать элементы коллекции", "Python Basics", "iter(), next()"),
-            ("Контекстный менеджер", "Объект для управления ресурсами с помощью with", "Python Basics", "with open('file') as f:"),
-            ("PEP 8", "Соглашение о стиле кода для Python программ", "Python Basics", "import this"),
-            ("Virtual Environment", "Изолированная среда для установки пакетов Python", "Python Basics", "python -m venv env"),
-            
-            # ========== PYTHON LIBRARIES ==========
-            ("NumPy", "Библиотека для научных вычислений и работы с многомерными массивами", "Python Libraries", "import numpy as np"),
-            ("Pandas", "Библиотека для анализа и обработки табличных данных", "Python Libraries", "import pandas as pd"),
-            ("Matplotlib", "Библиотека для построения графиков и визуализации данных", "Python Libraries", "import matplotlib.pyplot as plt"),
-            ("Requests", "Библиотека для отправки HTTP-запросов к API и веб-сервисам", "Python Libraries", "import requests"),
-            ("BeautifulSoup", "Библиотека для парсинга HTML и XML документов", "Python Libraries", "from bs4 import BeautifulSoup"),
-            ("Flask", "Лёгкий веб-фреймворк для создания веб-приложений на Python", "Python Libraries", "from flask import Flask"),
-            ("Django", "Полнофункциональный веб-фреймворк для разработки на Python", "Python Libraries", "django-admin startproject"),
-            ("TensorFlow", "Библиотека машинного обучения от Google для нейросетей", "Python Libraries", "import tensorflow as tf"),
-            ("PyTorch", "Библиотека глубокого обучения с динамическими графами", "Python Libraries", "import torch"),
-            ("Scikit-learn", "Библиотека машинного обучения для классических алгоритмов", "Python Libraries", "from sklearn import model"),
-            ("OpenCV", "Библиотека компьютерного зрения для обработки изображений", "Python Libraries", "import cv2"),
-            ("Pillow", "Библиотека для работы с изображениями в Python", "Python Libraries", "from PIL import Image"),
-            ("SQLAlchemy", "Библиотека для работы с базами данных и ORM", "Python Libraries", "from sqlalchemy import create_engine"),
-            ("PyTest", "Фреймворк для написания и запуска тестов в Python", "Python Libraries", "pytest test_file.py"),
-            ("Logging", "Встроенный модуль для ведения логов в приложениях", "Python Libraries", "import logging"),
-            ("Datetime", "Встроенный модуль для работы с датой и временем", "Python Libraries", "from datetime import datetime"),
-            ("OS", "Встроенный модуль для взаимодействия с операционной системой", "Python Libraries", "import os"),
-            ("Re (Regex)", "Встроенный модуль для работы с регулярными выражениями", "Python Libraries", "import re"),
-            ("Random", "Встроенный модуль для генерации случайных чисел", "Python Libraries", "import random"),
-        ]
-        
-        for term, definition, category, example in initial_concepts:
-            add_concept(term, definition, category, example)
-        
-        print(f"✓ Добавлено {len(initial_concepts)} начальных понятий")
-    
-    print("🤖 WebTechHelperBot 2.0 запущен...")
-    print(f"📚 Всего понятий в базе: {get_concept_count()}")
-  # Добавляем Flask для Render
-    from flask import Flask
-    import os
+def create_web_app():
+    """Flask-приложение со служебными эндпоинтами (импорт Flask отложен до запуска)"""
+    from flask import Flask, Response, jsonify, request, abort
     
     app = Flask(__name__)
     
@@ -872,22 +1718,75 @@ if __name__ == "__main__":
         return "WebTechHelperBot is running! 🤖"
     
     @app.route('/health')
-    def health():
-        return "OK", 200
+    def health_check():
+        ok, report = health.liveness()
+        return jsonify(status='ok' if ok else 'fail', **report), 200 if ok else 503
+    
+    @app.route('/ready')
+    def ready_check():
+        ok, report = health.readiness(ping)
+        return jsonify(status='ok' if ok else 'fail', **report), 200 if ok else 503
+    
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+    
+    @app.route('/analytics')
+    def analytics_endpoint():
+        # Без токена в config эндпоинта нет
+        if not ANALYTICS_TOKEN:
+            abort(404)
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {ANALYTICS_TOKEN}'):
+            abort(401)
+        import analytics
+        return jsonify(analytics.get_report(request.args.get('refresh') == '1'))
+    
+    return app
+
+def run_bot():
+    """Получение обновлений (long polling)"""
+    bot.infinity_polling()
+
+def warm_database():
+    """Прогрев страничного кэша SQLite и частых запросов"""
+    get_concept_count()
+    get_all_categories()
+
+startup.add_warmup('database', warm_database)
+startup.add_warmup('prefix_index', prefix_index.rebuild)
+
+def main():
+    """Запуск: база -> опрос Telegram -> веб-сервер, с замером этапов"""
+    with startup.phase('logging'):
+        logs.setup_logging()
+    
+    # Новая установка получает готовый снимок базы вместо поштучного заполнения
+    with startup.phase('database'):
+        source = seed.ensure_database()
+    
+    # Опрос запускается как можно раньше: время до первого ответа важнее всего
+    with startup.phase('polling'):
+        bot_thread = threading.Thread(target=run_bot, name='polling', daemon=True)
+        bot_thread.start()
+        health.watch_thread(bot_thread)
+    
+    with startup.phase('web'):
+        app = create_web_app()
+    
+    startup.warm_up_in_background()
+    broadcaster.start()
+    maintainer.start()
+    backups.start()
+    start_related_index()
     
-    # Запускаем бота в отдельном потоке
-    import threading
-    
-    def run_bot():
-        bot.infinity_polling()
-    
-    bot_thread = threading.Thread(target=run_bot, daemon=True)
-    bot_thread.start()
+    print("🤖 WebTechHelperBot 2.0 запущен...")
+    logs.log_event('bot_started', database=source)
+    startup.report()
     
-    # Запускаем Flask сервер
-   # Render задаёт PORT через переменную окружения
-port = int(os.environ.get('PORT', 5000))
-print(f"🌐 Flask server running on port {port}")
-app.run(host='0.0.0.0', port=port, debug=False)
-
+    # Render задаёт PORT через переменную окружения
+    port = int(os.environ.get('PORT', 5000))
+    print(f"🌐 Flask server running on port {port}")
+    app.run(host='0.0.0.0', port=port, debug=False)
 
+if __name__ == "__main__":
+    main()
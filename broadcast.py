@@ -0,0 +1,168 @@
+# broadcast.py
+# Рассылка «понятие дня»: порции получателей из базы, темп в пределах лимита
+# Telegram, контрольные точки для продолжения после перезапуска
+#
+# Telegram допускает около 30 сообщений в секунду на бота. Рассылка берёт
+# BROADCAST_RATE из них, остальное остаётся обработчикам пользователей.
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from telebot import types
+from telebot.apihelper import ApiTelegramException
+
+import database
+import logs
+import metrics
+from config import (
+    BROADCAST_ENABLED, BROADCAST_TIME, BROADCAST_RATE, BROADCAST_BATCH, BROADCAST_SENDERS
+)
+
+DAILY = 'daily_concept'
+
+SENT = metrics.counter(
+    'webtech_broadcast_messages_total', 'Сообщения рассылки по результату', ['result'])
+RATE_LIMITED = metrics.counter(
+    'webtech_broadcast_retry_after_total', 'Ответы 429 от Telegram во время рассылки')
+
+class Pacer:
+    """Равномерный темп: не больше rate отправок в секунду на все потоки"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def pause(self, seconds):
+        """Пауза для всех после 429 Too Many Requests"""
+        with self.lock:
+            self.next_slot = max(self.next_slot, time.monotonic() + seconds)
+
+def format_daily_concept(concept):
+    """Текст и клавиатура понятия дня"""
+    text = f"🌅 Понятие дня: {concept['term']}\n\n{concept['definition']}"
+    if concept.get('example'):
+        text += f"\n\n💡 Пример:\n{concept['example']}"
+    keyboard = types.InlineKeyboardMarkup()
+    keyboard.add(
+        types.InlineKeyboardButton("📚 Ещё понятие", callback_data="next_concept"),
+        types.InlineKeyboardButton("🔕 Отписаться", callback_data="daily_off")
+    )
+    return text, keyboard
+
+class Broadcaster:
+    """Рассылка понятия дня по расписанию BROADCAST_TIME"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.pacer = Pacer(BROADCAST_RATE)
+        self.running = threading.Lock()
+        self.stopping = False
+
+    def start(self):
+        """Поток расписания (продолжает прерванную рассылку сразу после запуска)"""
+        if BROADCAST_ENABLED:
+            threading.Thread(target=self._schedule, name='broadcast', daemon=True).start()
+
+    def _schedule(self):
+        hour, minute = map(int, BROADCAST_TIME.split(':'))
+        while not self.stopping:
+            now = datetime.now()
+            if (now.hour, now.minute) >= (hour, minute):
+                existing = database.get_broadcast(DAILY, now.date().isoformat())
+                if existing is None or existing['status'] != 'done':
+                    try:
+                        self.run_daily()
+                    except Exception as e:
+                        logs.log_error('broadcast_error', e)
+            time.sleep(30)
+
+    def run_daily(self, day=None):
+        """Рассылка за день: новая или продолжение прерванной. None, если уже идёт"""
+        if not self.running.acquire(blocking=False):
+            return None
+        try:
+            day = (day or date.today()).isoformat()
+            existing = database.get_broadcast(DAILY, day)
+            concept = database.get_concept_by_id(existing['concept_id']) if existing else None
+            concept = concept or database.get_random_concept()
+            if concept is None:
+                return None
+            broadcast = database.get_or_create_broadcast(DAILY, day, concept['id'])
+            if broadcast['status'] == 'done':
+                return broadcast
+            self._deliver(broadcast, concept)
+            return database.get_broadcast(DAILY, day)
+        finally:
+            self.running.release()
+
+    def _deliver(self, broadcast, concept):
+        """Отправка порциями; после каждой порции — контрольная точка"""
+        text, keyboard = format_daily_concept(concept)
+        last_user_id = broadcast['last_user_id']
+        logs.log_event('broadcast_started', broadcast_id=broadcast['id'],
+                       resume_after=last_user_id, concept_id=concept['id'])
+
+        with ThreadPoolExecutor(BROADCAST_SENDERS, thread_name_prefix='broadcast') as pool:
+            # Следующая порция читается, пока отправляется текущая
+            batch = database.get_broadcast_recipients(last_user_id, BROADCAST_BATCH)
+            if not batch:
+                database.save_broadcast_progress(broadcast['id'], last_user_id, 0, 0, 0, done=True)
+            while batch and not self.stopping:
+                results = pool.map(lambda user: self._send(user, text, keyboard), batch)
+                upcoming = database.get_broadcast_recipients(batch[-1]['user_id'], BROADCAST_BATCH)
+                results = list(results)
+
+                blocked = [user['user_id'] for user, result in zip(batch, results) if result == 'blocked']
+                if blocked:
+                    database.mark_users_blocked(blocked)
+                database.save_broadcast_progress(
+                    broadcast['id'], batch[-1]['user_id'],
+                    results.count('sent'), results.count('failed'), len(blocked),
+                    done=not upcoming
+                )
+                batch = upcoming
+
+        logs.log_event('broadcast_finished' if not self.stopping else 'broadcast_paused',
+                       broadcast_id=broadcast['id'])
+
+    def _send(self, user, text, keyboard):
+        """Одно сообщение: 'sent', 'blocked' или 'failed'; 429 повторяется после паузы"""
+        for _ in range(5):
+            self.pacer.wait()
+            try:
+                self.bot.send_message(user['chat_id'], text, reply_markup=keyboard)
+                SENT.labels('sent').inc()
+                return 'sent'
+            except ApiTelegramException as e:
+                if e.error_code == 429:
+                    retry_after = (e.result_json.get('parameters') or {}).get('retry_after', 5)
+                    RATE_LIMITED.inc()
+                    self.pacer.pause(retry_after)
+                    continue
+                # 403: бот заблокирован или аккаунт удалён; 400: чат не найден
+                if e.error_code == 403 or (e.error_code == 400 and 'chat not found' in e.description):
+                    SENT.labels('blocked').inc()
+                    return 'blocked'
+                SENT.labels('failed').inc()
+                logs.log_error('broadcast_send_failed', e, user_id=user['user_id'])
+                return 'failed'
+            except Exception as e:
+                SENT.labels('failed').inc()
+                logs.log_error('broadcast_send_failed', e, user_id=user['user_id'])
+                return 'failed'
+        SENT.labels('failed').inc()
+        return 'failed'
+
+    def stop(self):
+        self.stopping = True
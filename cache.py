@@ -0,0 +1,186 @@
+# cache.py
+# Ограниченный LRU-кэш со сроком жизни записей и объединением одинаковых запросов
+#
+# Записи помечаются версией каталога (database.catalog_version): после
+# add/update/delete_concept старые результаты перестают совпадать по версии,
+# поэтому срок жизни нужен только для редких запросов, а не для свежести.
+
+import threading
+import time
+from collections import OrderedDict
+
+import database
+import metrics
+from config import SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL
+
+CACHE_REQUESTS = metrics.counter(
+    'webtech_cache_requests_total', 'Обращения к кэшам по результату', ['cache', 'result'])
+CACHE_EVICTIONS = metrics.counter(
+    'webtech_cache_evictions_total', 'Записи, вытесненные из кэша по размеру', ['cache'])
+CACHE_SIZE = metrics.gauge('webtech_cache_size', 'Записей в кэше', ['cache'])
+
+class _Call:
+    """Выполняющаяся загрузка, которую ждут остальные потоки с тем же ключом"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class LRUCache:
+    """Кэш на OrderedDict: последние использованные записи в конце"""
+
+    def __init__(self, name, maxsize, ttl=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.coalesced = 0
+        CACHE_SIZE.labels(name).set_function(lambda: len(self._data))
+
+    def _count(self, result):
+        CACHE_REQUESTS.labels(self.name, result).inc()
+
+    def _lookup(self, key, version):
+        """Запись из кэша или None (под блокировкой)"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, entry_version, stored_at = entry
+        if entry_version != version or (self.ttl and time.monotonic() - stored_at > self.ttl):
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def get(self, key, loader, version=None):
+        """Значение по ключу; при промахе loader() выполняется один раз,
+        даже если тот же ключ одновременно запросили несколько потоков"""
+        with self._lock:
+            entry = self._lookup(key, version)
+            if entry is not None:
+                self.hits += 1
+                self._count('hit')
+                return entry[0]
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+                self.misses += 1
+                self._count('miss')
+            else:
+                self.coalesced += 1
+                self._count('coalesced')
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = loader()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                if call.error is None:
+                    self._store(key, call.result, version)
+            call.done.set()
+        return call.result
+
+    def _store(self, key, value, version):
+        self._data[key] = (value, version, time.monotonic())
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+            CACHE_EVICTIONS.labels(self.name).inc()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def discard(self, key, value=None):
+        """Удаление записи; с value — только если в кэше всё ещё это значение"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (value is None or entry[0] is value):
+                del self._data[key]
+
+    def stats(self):
+        """Счётчики попаданий, промахов и вытеснений"""
+        with self._lock:
+            requests = self.hits + self.misses + self.coalesced
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'hit_rate': round((self.hits + self.coalesced) / requests, 3) if requests else None,
+            }
+
+class RecentKeys:
+    """Ограниченное множество недавно встреченных ключей (старые вытесняются)"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, key):
+        """True, если ключ новый; False, если он уже встречался"""
+        with self._lock:
+            if key in self._keys:
+                self._keys.move_to_end(key)
+                return False
+            self._keys[key] = None
+            if len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+            return True
+
+    def __len__(self):
+        return len(self._keys)
+
+# =============================================================================
+# ПОИСК ПОНЯТИЙ
+# =============================================================================
+
+search_cache = LRUCache('search', SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+
+def normalize_query(query):
+    """Ключ поиска: лишние пробелы убираются, латиница приводится к нижнему
+    регистру (LIKE в SQLite не различает регистр только для ASCII)"""
+    query = ' '.join(query.split())
+    return query.lower() if query.isascii() else query
+
+def search_concepts(query):
+    """search_concepts через кэш; результат общий для всех вызовов — не изменять"""
+    key = normalize_query(query)
+    return search_cache.get(
+        key, lambda: database.search_concepts(key), database.catalog_version)
+
+# Старые результаты сразу освобождают место, не дожидаясь вытеснения
+database.add_catalog_listener(lambda version: search_cache.clear())
+
+# =============================================================================
+# ВСЕ ПОНЯТИЯ
+# =============================================================================
+
+# Один список на версию каталога (неверные варианты в викторине)
+concepts_cache = LRUCache('all_concepts', 1)
+
+def all_concepts():
+    """get_all_concepts через кэш; список общий для всех вызовов — не изменять"""
+    return concepts_cache.get('all', database.get_all_concepts, database.catalog_version)
+
+def concepts_by_categories(categories):
+    """Понятия категорий из общего списка: сессии викторин ссылаются на одни и те же записи"""
+    wanted = set(categories)
+    return [concept for concept in all_concepts() if concept['category'] in wanted]
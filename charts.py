@@ -0,0 +1,167 @@
+# charts.py
+# Карточка прогресса пользователя: точность по викторинам и изученное по категориям
+#
+# Рисование (matplotlib) идёт в отдельных процессах, обработчики только ждут
+# готовую картинку, а загрузку в Telegram выполняет пул потоков бота.
+# Картинка кэшируется по версии статистики пользователя, а после первой
+# отправки хранится только file_id Telegram — повторный показ неизменной
+# карточки не рисует и не загружает её заново.
+
+import io
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import cache
+import database
+import logs
+import metrics
+from config import CHART_WORKERS, CHART_CACHE_SIZE, CHART_CACHE_TTL, CHART_HISTORY
+
+RENDER_SECONDS = metrics.histogram(
+    'webtech_chart_render_seconds', 'Время рисования карточки прогресса (с ожиданием в очереди)')
+CARDS_SENT = metrics.counter(
+    'webtech_chart_cards_total', 'Отправленные карточки прогресса по источнику', ['source'])
+
+card_cache = cache.LRUCache('progress_card', CHART_CACHE_SIZE, CHART_CACHE_TTL)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    """Пул процессов создаётся при первой карточке (spawn: без копии потоков бота)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                CHART_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+def shutdown():
+    """Остановка пула: процесс-обработчик кластера при выходе ждёт свои
+    дочерние процессы, и пул без остановки не дал бы ему завершиться"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+def _drop_pool(pool):
+    """Сломанный пул (упал процесс) заменяется новым при следующей карточке"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+def render_progress_card(data):
+    """PNG карточки по данным get_user_chart_data (выполняется в процессе пула)"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    figure, (accuracy, learned) = plt.subplots(2, 1, figsize=(7, 7), dpi=100)
+    figure.suptitle('Прогресс обучения', fontsize=14, fontweight='bold')
+
+    quizzes = data['quizzes']
+    if quizzes:
+        points = [q['score'] * 100 / max(q['total_questions'], 1) for q in quizzes]
+        numbers = range(1, len(points) + 1)
+        accuracy.plot(numbers, points, marker='o', color='#2e86de')
+        # Скользящее среднее по трём викторинам сглаживает случайные провалы
+        window = [sum(points[max(0, i - 2):i + 1]) / len(points[max(0, i - 2):i + 1])
+                  for i in range(len(points))]
+        accuracy.plot(numbers, window, linestyle='--', color='#8395a7', label='среднее по 3')
+        accuracy.legend(loc='lower right')
+        accuracy.set_xticks(list(numbers))
+    else:
+        accuracy.text(0.5, 0.5, 'Викторин пока нет', ha='center', va='center',
+                      transform=accuracy.transAxes)
+    accuracy.set_ylim(0, 105)
+    accuracy.set_ylabel('Правильных, %')
+    accuracy.set_title('Точность в последних викторинах')
+    accuracy.grid(alpha=0.3)
+
+    categories = data['categories']
+    names = [c['category'] for c in categories]
+    learned.barh(names, [c['total'] for c in categories], color='#dfe6e9', label='всего')
+    learned.barh(names, [c['learned'] for c in categories], color='#10ac84', label='изучено')
+    for index, c in enumerate(categories):
+        learned.text(c['total'], index, f" {c['learned']}/{c['total']}", va='center', fontsize=9)
+    learned.invert_yaxis()
+    learned.set_title('Изучено по категориям')
+    learned.legend(loc='lower right')
+
+    figure.tight_layout()
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png')
+    plt.close(figure)
+    return buffer.getvalue()
+
+class _Card:
+    """Карточка в кэше: сначала задача рисования, после отправки — file_id"""
+
+    def __init__(self, future):
+        self.future = future
+        self.file_id = None
+        # Одновременные запросы одной карточки: загружает первый, остальные
+        # отправляют полученный им file_id
+        self.upload_lock = threading.Lock()
+
+def _render(user_id):
+    data = database.get_user_chart_data(user_id, CHART_HISTORY)
+    started = time.perf_counter()
+    pool = _get_pool()
+    try:
+        future = pool.submit(render_progress_card, data)
+    except BrokenProcessPool:
+        _drop_pool(pool)
+        pool = _get_pool()
+        future = pool.submit(render_progress_card, data)
+    future.pool = pool
+    future.add_done_callback(lambda _: RENDER_SECONDS.observe(time.perf_counter() - started))
+    return _Card(future)
+
+def send_progress_card(bot, chat_id, user_id):
+    """Отправка карточки без ожидания в потоке обработчика: готовая — сразу
+    по file_id, новая — когда процесс пула её нарисует"""
+    version = database.get_user_stats_version(user_id)
+    card = card_cache.get(user_id, lambda: _render(user_id), version)
+
+    future = card.future
+    if card.file_id or future is None:
+        CARDS_SENT.labels('file_id').inc()
+        bot.send_photo(chat_id, card.file_id)
+        return
+
+    def deliver(future):
+        try:
+            with card.upload_lock:
+                if not card.file_id:
+                    message = bot.send_photo(chat_id, ('progress.png', future.result()))
+                    CARDS_SENT.labels('upload').inc()
+                    # Дальше карточка живёт на серверах Telegram, байты больше не нужны
+                    card.file_id = message.photo[-1].file_id
+                    card.future = None
+                    return
+            CARDS_SENT.labels('file_id').inc()
+            bot.send_photo(chat_id, card.file_id)
+        except Exception as e:
+            logs.log_error('progress_card_failed', e, user_id=user_id)
+
+    def rendered(future):
+        # Неудачная карточка не остаётся в кэше: следующий запрос рисует заново
+        if future.exception() is not None:
+            card_cache.discard(user_id, card)
+            if isinstance(future.exception(), BrokenProcessPool):
+                _drop_pool(future.pool)
+        # Обратный вызов идёт в потоке управления пулом процессов: загрузка
+        # отсюда задержала бы результаты всех остальных карточек
+        if bot.threaded:
+            bot.worker_pool.put(deliver, future)
+        else:
+            deliver(future)
+
+    future.add_done_callback(rendered)
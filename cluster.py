@@ -0,0 +1,269 @@
+# cluster.py
+# Многопроцессный режим: один приёмник обновлений и N процессов-обработчиков
+#
+# Приёмник (long polling или вебхук Flask) раскладывает обновления по
+# очередям обработчиков по user_id, поэтому сессия викторины и пошаговые
+# диалоги пользователя всегда живут в одном процессе. Упавший обработчик
+# перезапускается, его очередь при этом сохраняется.
+#
+# Запуск:
+#   python cluster.py --workers 4
+#   TELEGRAM_API_URL=http://127.0.0.1:8081/bot{0}/{1} python cluster.py  (с telegram_stub.py)
+
+import argparse
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+
+from telebot import apihelper, types
+
+import bot as bot_module
+import charts
+import health
+import logs
+import metrics
+import seed
+import startup
+from config import (
+    BOT_TOKEN, LOG_FILE, CLUSTER_WORKERS, CLUSTER_QUEUE_SIZE, CLUSTER_BATCH_SIZE,
+    WEBHOOK_URL, WEBHOOK_SECRET
+)
+
+ROUTED = metrics.counter(
+    'webtech_cluster_routed_total', 'Обновления, переданные обработчикам', ['worker'])
+RESTARTS = metrics.counter(
+    'webtech_cluster_restarts_total', 'Перезапуски упавших обработчиков', ['worker'])
+
+# Через сколько секунд после старта падение считается «быстрым» (растёт пауза)
+_FAST_CRASH_SECONDS = 10
+_MAX_RESTART_DELAY = 30
+
+def update_user_id(update):
+    """Отправитель обновления (сырой JSON от Telegram) или None"""
+    for kind, payload in update.items():
+        if isinstance(payload, dict):
+            user = payload.get('from') or payload.get('user')
+            if user:
+                return user['id']
+    return None
+
+# =============================================================================
+# ОБРАБОТЧИК
+# =============================================================================
+
+def worker_log_file(index):
+    """Отдельный журнал на процесс: ротация одного файла из нескольких процессов небезопасна"""
+    base, ext = os.path.splitext(LOG_FILE)
+    return f'{base}.worker{index}{ext}'
+
+def worker_main(index, updates):
+    """Процесс-обработчик: обновления из своей очереди -> обработчики bot.py"""
+    logs.setup_logging(worker_log_file(index))
+    startup.warm_up_in_background()
+    logs.log_event('worker_started', worker=index, pid=os.getpid())
+
+    while True:
+        batch = [updates.get()]
+        while len(batch) < CLUSTER_BATCH_SIZE:
+            try:
+                batch.append(updates.get_nowait())
+            except queue.Empty:
+                break
+
+        stop = None in batch
+        batch = [update for update in batch if update is not None]
+
+        # Изменения других процессов сверяются в process_new_updates
+        if batch:
+            bot_module.bot.process_new_updates([types.Update.de_json(u) for u in batch])
+        if stop:
+            break
+
+    # Пул потоков telebot дорабатывает принятые обновления
+    bot_module.bot.worker_pool.close()
+    charts.shutdown()
+    logs.log_event('worker_stopped', worker=index)
+    logs.shutdown_logging()
+
+# =============================================================================
+# ПРИЁМНИК И НАДЗОР
+# =============================================================================
+
+class Cluster:
+    """Процессы-обработчики, их очереди и перезапуск"""
+
+    def __init__(self, size):
+        self.context = multiprocessing.get_context('spawn')
+        self.size = size
+        self.queues = [self.context.Queue(maxsize=CLUSTER_QUEUE_SIZE) for _ in range(size)]
+        self.processes = [None] * size
+        self.started_at = [0.0] * size
+        self.delays = [1] * size
+        self.stopping = False
+
+    def _spawn(self, index):
+        # Не демон: демоническому процессу нельзя запускать дочерние (пул charts.py).
+        # Останавливает обработчики stop()
+        process = self.context.Process(
+            target=worker_main, args=(index, self.queues[index]),
+            name=f'worker-{index}', daemon=False)
+        process.start()
+        self.processes[index] = process
+        self.started_at[index] = time.monotonic()
+
+    def start(self):
+        for index in range(self.size):
+            self._spawn(index)
+        threading.Thread(target=self.supervise, name='supervisor', daemon=True).start()
+
+    def dispatch(self, update):
+        """Передача обновления обработчику его пользователя (блокирует, если очередь полна)"""
+        user_id = update_user_id(update)
+        key = user_id if user_id is not None else update['update_id']
+        index = key % self.size
+        self.queues[index].put(update)
+        ROUTED.labels(index).inc()
+
+    def supervise(self):
+        """Перезапуск упавших обработчиков с растущей паузой при частых падениях"""
+        restart_at = [None] * self.size
+        while not self.stopping:
+            time.sleep(1)
+            now = time.monotonic()
+            for index, process in enumerate(self.processes):
+                if self.stopping or process.is_alive():
+                    continue
+                if restart_at[index] is None:
+                    lifetime = now - self.started_at[index]
+                    if lifetime < _FAST_CRASH_SECONDS:
+                        self.delays[index] = min(self.delays[index] * 2, _MAX_RESTART_DELAY)
+                    else:
+                        self.delays[index] = 1
+                    restart_at[index] = now + self.delays[index]
+                    logs.log_event('worker_exited', worker=index, exitcode=process.exitcode,
+                                   lifetime_seconds=round(lifetime, 1),
+                                   restart_in=self.delays[index])
+                if now >= restart_at[index]:
+                    restart_at[index] = None
+                    RESTARTS.labels(index).inc()
+                    self._spawn(index)
+
+    def alive(self):
+        return sum(1 for process in self.processes if process and process.is_alive())
+
+    def backlog(self):
+        return sum(q.qsize() for q in self.queues)
+
+    def stop(self, timeout=10):
+        """Остановка: обработчики дочитывают свои очереди, не успевшие — завершаются"""
+        self.stopping = True
+        for q in self.queues:
+            try:
+                q.put(None, timeout=timeout)
+            except queue.Full:
+                pass
+        deadline = time.monotonic() + timeout
+        for process in self.processes:
+            if process:
+                process.join(max(0, deadline - time.monotonic()))
+        for process in self.processes:
+            if process and process.is_alive():
+                process.terminate()
+                process.join()
+
+def poll(cluster):
+    """Long polling в приёмнике: только получение и раздача, без обработки"""
+    offset = None
+    while True:
+        try:
+            updates = apihelper.get_updates(BOT_TOKEN, offset, 100, long_polling_timeout=20)
+        except Exception as e:
+            logs.log_error('poll_error', e)
+            time.sleep(3)
+            continue
+        for update in updates:
+            cluster.dispatch(update)
+            offset = update['update_id'] + 1
+
+def create_front_app(cluster):
+    """Flask: /health, /ready, /metrics и (в режиме вебхука) приём обновлений"""
+    from flask import request, abort
+
+    app = bot_module.create_web_app()
+
+    @app.route('/webhook', methods=['POST'])
+    def webhook():
+        if WEBHOOK_SECRET and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != WEBHOOK_SECRET:
+            abort(403)
+        update = request.get_json(silent=True)
+        if not update or 'update_id' not in update:
+            abort(400)
+        cluster.dispatch(update)
+        health.mark_update()
+        return ''
+
+    return app
+
+def main():
+    """Запуск: база -> обработчики -> приём обновлений -> веб-сервер"""
+    parser = argparse.ArgumentParser(description="WebTechHelperBot в нескольких процессах")
+    parser.add_argument('--workers', type=int, default=CLUSTER_WORKERS or os.cpu_count() or 1)
+    parser.add_argument('--webhook', default=WEBHOOK_URL,
+                        help="Публичный адрес /webhook (по умолчанию long polling)")
+    args = parser.parse_args()
+
+    with startup.phase('logging'):
+        logs.setup_logging()
+
+    with startup.phase('database'):
+        source = seed.ensure_database()
+
+    cluster = Cluster(args.workers)
+    with startup.phase('workers'):
+        cluster.start()
+
+    # В приёмнике обновления не обрабатываются, эти показатели — по очередям обработчиков
+    health.add_probe('queue_backlog', cluster.backlog)
+    health.add_probe('sessions', lambda: None)
+    health.add_probe('workers_down', lambda: cluster.size - cluster.alive())
+    metrics.gauge('webtech_cluster_workers_alive', 'Живые процессы-обработчики',
+                  function=cluster.alive)
+
+    with startup.phase('receiver'):
+        if args.webhook:
+            bot_module.bot.set_webhook(args.webhook, secret_token=WEBHOOK_SECRET)
+        else:
+            bot_module.bot.delete_webhook()
+            poller = threading.Thread(target=poll, args=(cluster,), name='polling', daemon=True)
+            poller.start()
+            health.watch_thread(poller)
+
+    with startup.phase('web'):
+        app = create_front_app(cluster)
+
+    # Рассылка, обслуживание и копии базы идут из приёмника: обработчики заняты входящими обновлениями
+    bot_module.broadcaster.start()
+    bot_module.maintainer.start()
+    bot_module.backups.start()
+    bot_module.start_related_index()
+
+    print(f"🤖 WebTechHelperBot запущен: {args.workers} обработчиков, "
+          f"{'вебхук' if args.webhook else 'long polling'}")
+    logs.log_event('cluster_started', workers=args.workers, database=source,
+                   mode='webhook' if args.webhook else 'polling')
+    startup.report()
+
+    # SIGTERM (остановка контейнера) — через finally: обработчики не демоны
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    port = int(os.environ.get('PORT', 5000))
+    try:
+        app.run(host='0.0.0.0', port=port, debug=False)
+    finally:
+        cluster.stop()
+
+if __name__ == "__main__":
+    main()
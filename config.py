@@ -4,12 +4,125 @@ BOT_TOKEN = "8736664621:AAEkPnL7V1RMzefxXsIyTt7fDoyw13wPoYQ"
 
 # Название базы данных
 DATABASE_NAME = "webtech_concepts.db"
+SQLITE_WAL = True           # Журнал WAL: читатели не блокируются записью
+SQLITE_BUSY_TIMEOUT = 5.0   # Секунд ожидания блокировки другим процессом
 
 # Администраторы бота (могут добавлять новые понятия)
 ADMIN_IDS = [1012571174]  
 
 # Количество понятий для изучения за раз
 QUESTIONS_PER_SESSION = 5
+# Сколько последних update_id помнить для отсева повторных доставок
+UPDATE_DEDUP_SIZE = 10000
+# Ограничение частоты действий одного пользователя:
+# действие -> (токенов в секунду, сколько можно сделать подряд)
+RATE_LIMITS = {
+    'study': (1.0, 5),    # Изучение понятий и категории
+    'quiz': (2.0, 6),     # Запуск викторины
+    'answer': (3.0, 10),  # Ответы на вопросы (повторные и устаревшие нажатия не учитываются)
+    'search': (0.5, 3),   # Поиск
+    'inline': (5.0, 15),  # Inline-подсказки (запрос на каждое нажатие клавиши)
+    'admin': (3.0, 10),   # Админ-функции
+}
+# Рассылка «понятие дня» подписанным пользователям
+BROADCAST_ENABLED = True
+BROADCAST_TIME = "10:00"  # Местное время начала рассылки
+BROADCAST_RATE = 25       # Сообщений в секунду (лимит Telegram ~30, остальное — обработчикам)
+BROADCAST_BATCH = 100     # Получателей в порции; после порции сохраняется позиция
+BROADCAST_SENDERS = 8     # Потоков отправки (темп задаёт BROADCAST_RATE)
+# Карточка прогресса (графики в /stats и «Моя статистика»)
+CHART_WORKERS = 2         # Процессов для рисования графиков
+CHART_CACHE_SIZE = 1000   # Карточек (file_id) в кэше
+CHART_CACHE_TTL = 86400   # Срок жизни карточки в кэше (секунд)
+CHART_HISTORY = 30        # Сколько последних викторин на графике точности
+# Обслуживание базы: свёртка старых викторин, сроки хранения, очистка файла
+MAINTENANCE_ENABLED = True
+MAINTENANCE_INTERVAL = 6 * 3600  # Секунд между проходами
+MAINTENANCE_BUDGET = 30          # Секунд на проход; недоделанное продолжится в следующем
+MAINTENANCE_BATCH = 500          # Строк за шаг (одна короткая транзакция)
+MAINTENANCE_PAUSE = 0.05         # Пауза между шагами, чтобы запись обработчиков не ждала
+MAINTENANCE_VACUUM_PAGES = 200   # Свободных страниц, возвращаемых файлу за шаг
+MAINTENANCE_ANALYSIS_LIMIT = 400 # Строк индекса на таблицу для ANALYZE (PRAGMA analysis_limit)
+QUIZ_RAW_RETENTION_DAYS = 90     # Викторины старше сворачиваются в дневные итоги
+QUIZ_DAILY_RETENTION_DAYS = 730  # Дневные итоги старше удаляются (None — хранить всегда)
+BLOCKED_USER_RETENTION_DAYS = 365  # Прогресс заблокировавших бота дольше удаляется (None — хранить)
+LEADERBOARD_WEEK_RETENTION = 4   # Недель, за которые хранится недельный рейтинг (None — всегда)
+# Резервные копии базы (python backup.py list | restore)
+BACKUP_ENABLED = True
+BACKUP_DIR = "backups"       # Каталог сжатых снимков
+BACKUP_INTERVAL = 6 * 3600   # Секунд между снимками
+BACKUP_KEEP = 8              # Сколько последних снимков хранить
+BACKUP_PAGES = 256           # Страниц за шаг копирования (1 МБ при странице 4 КБ)
+BACKUP_STEP_PAUSE = 0.02     # Пауза между шагами, чтобы запись обработчиков не ждала
+BACKUP_MAX_RESTARTS = 20     # Перезапусков пошаговой копии до копирования одним шагом
+# Аналитика для администратора (/analytics и GET /analytics)
+ANALYTICS_TOKEN = None        # Токен эндпоинта (Authorization: Bearer ...); None — эндпоинт выключен
+ANALYTICS_TTL = 900           # Секунд, сколько отчёт живёт в кэше
+ANALYTICS_CHUNK = 50000       # Строк за один запрос при чтении таблиц
+ANALYTICS_DAYS = 30           # Дней в графике активных пользователей
+ANALYTICS_COHORT_WEEKS = 8    # Недельных когорт в таблице удержания
+ANALYTICS_MIN_ATTEMPTS = 5    # Ответов в категории, чтобы учитывать точность пользователя
+ANALYTICS_MIN_USERS = 5       # Пользователей понятия для оценки кривой обучения
+ANALYTICS_TOP = 10            # Понятий в списке самых быстро осваиваемых
+# Похожие понятия (кнопки «🔗» на карточке понятия)
+RELATED_TOP = 5               # Соседей, хранимых для каждого понятия
+RELATED_BUTTONS = 3           # Кнопок похожих понятий на карточке
+RELATED_TERM_WEIGHT = 3       # Во сколько раз слова термина весомее слов определения
+RELATED_MAX_DF = 0.1          # Слова из большей доли понятий не учитываются
+RELATED_QUERY_TERMS = 8       # Самых весомых слов понятия, по которым ищутся соседи
+RELATED_MAX_PAIRS = 500000    # Пар (слово, понятие) на один блок расчёта (память)
+RELATED_FULL_REBUILD_SHARE = 0.2  # Доля изменённых понятий, после которой индекс собирается заново
+RELATED_CHECK_INTERVAL = 60   # Секунд между проверками версии каталога
+# Понятий на одной странице каталога администратора
+CATALOG_PAGE_SIZE = 10
+# Подбор вопросов викторины: насколько сильнее выбираются понятия,
+# в которых пользователь (и все пользователи) чаще ошибаются
+QUIZ_USER_WEAKNESS_WEIGHT = 3.0
+QUIZ_GLOBAL_DIFFICULTY_WEIGHT = 1.0
+# Секунд, на которые кэшируются веса общей сложности понятий (она меняется медленно)
+QUIZ_DIFFICULTY_TTL = 300
+# Потоков, готовящих следующий вопрос викторины, пока пользователь отвечает на текущий
+QUIZ_PREFETCH_WORKERS = 2
 # Дополнительные настройки безопасности
 ALLOW_PUBLIC_ADD = False  # Запретить обычным пользователям добавлять понятия
-LOG_FILE = "bot.log"      # Файл для логирования событий
\ No newline at end of file
+LOG_FILE = "bot.log"      # Файл для логирования событий
+LOG_LEVEL = "INFO"        # Уровень структурированного журнала
+LOG_MAX_BYTES = 10 * 1024 * 1024  # Размер файла журнала до ротации
+LOG_BACKUP_COUNT = 5      # Сколько старых файлов журнала хранить
+LOG_QUEUE_SIZE = 10000    # Очередь записей; при переполнении записи отбрасываются
+# Доля записываемых событий (1.0 — все); для частых событий можно уменьшить
+LOG_SAMPLE_RATES = {
+    'concept_view': 0.1,
+    'update': 1.0,
+    'handler': 1.0,
+}
+
+# Кэш результатов поиска (сбрасывается при любом изменении каталога)
+SEARCH_CACHE_SIZE = 256   # Сколько разных запросов хранить
+SEARCH_CACHE_TTL = 600    # Срок жизни записи (секунд)
+
+# Inline-режим (@бот запрос): результатов на страницу и кэширование ответа клиентом
+INLINE_RESULTS_LIMIT = 20
+INLINE_CACHE_TIME = 300   # Секунд, сколько Telegram может кэшировать ответ
+
+# Многопроцессный режим (python cluster.py): обработчики и приём обновлений
+CLUSTER_WORKERS = None      # Число процессов-обработчиков (None — по числу ядер)
+CLUSTER_QUEUE_SIZE = 1000   # Очередь обновлений на обработчик; при заполнении приём ждёт
+CLUSTER_BATCH_SIZE = 50     # Сколько обновлений обработчик забирает за раз
+WEBHOOK_URL = None          # Публичный адрес вебхука (None — long polling)
+WEBHOOK_SECRET = None       # Заголовок X-Telegram-Bot-Api-Secret-Token
+
+# Снимок базы с начальными понятиями (собирается при сборке образа: python seed.py build)
+SEED_SNAPSHOT = "seed.db"
+
+# Профилирование SQL (по умолчанию выключено, включается командой /sqltrace)
+SQL_TRACE = False         # Трассировка всех запросов с замером времени
+SLOW_QUERY_MS = 50        # Порог медленного запроса (мс) для записи в LOG_FILE
+SQL_EXPLAIN = False       # EXPLAIN QUERY PLAN для новых запросов, поиск полных просмотров
+
+# Пороги проверок /health и /ready (None или 0 — не проверять)
+HEALTH_MAX_POLL_AGE = 90      # Секунд без ответа getUpdates до признания опроса зависшим
+HEALTH_MAX_UPDATE_AGE = None  # Секунд без входящих обновлений (для тихих ботов не нужен)
+HEALTH_MAX_DB_MS = 500        # Допустимая задержка запроса к базе (мс)
+HEALTH_MAX_QUEUE = 100        # Допустимая очередь необработанных обновлений
+HEALTH_MAX_SESSIONS = 50000   # Допустимое число сессий в памяти
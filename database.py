@@ -2,20 +2,60 @@
 # Модуль для работы с базой данных SQLite
 
 import sqlite3
+import sys
+import time
+from collections.abc import Mapping
 from datetime import datetime
-from config import DATABASE_NAME
+from config import DATABASE_NAME, SQLITE_BUSY_TIMEOUT, SQLITE_WAL
+import metrics
+import sqltrace
+
+# Время выполнения и ошибки публичных функций модуля
+DB_CALL_SECONDS = metrics.histogram(
+    'webtech_db_call_seconds', 'Время выполнения функций database.py', ['function'])
+DB_CALL_ERRORS = metrics.counter(
+    'webtech_db_call_errors_total', 'Исключения в функциях database.py', ['function'])
+timed = metrics.instrument(DB_CALL_SECONDS, DB_CALL_ERRORS)
+
+# Версия каталога понятий: растёт при каждом изменении concepts.
+# Хранится в таблице meta, здесь — её копия для этого процесса.
+catalog_version = 0
+_catalog_listeners = []
 
 def get_connection():
     """Получение соединения с базой данных"""
-    conn = sqlite3.connect(DATABASE_NAME)
+    if sqltrace.enabled:
+        conn = sqltrace.connect(DATABASE_NAME, timeout=SQLITE_BUSY_TIMEOUT)
+    else:
+        conn = sqlite3.connect(DATABASE_NAME, timeout=SQLITE_BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row
     return conn
 
+@timed
+def ping():
+    """Проверка доступности базы, возвращает время запроса в секундах"""
+    started = time.perf_counter()
+    conn = get_connection()
+    try:
+        conn.execute('SELECT 1 FROM concepts LIMIT 1').fetchone()
+    finally:
+        conn.close()
+    return time.perf_counter() - started
+
+@timed
 def init_database():
     """Инициализация базы данных и создание таблиц"""
     conn = get_connection()
     cursor = conn.cursor()
     
+    # Освобождённые страницы возвращаются файлу по шагам (maintenance.py).
+    # Действует только для новой базы; старую переводит python maintenance.py vacuum
+    cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    
+    # WAL: чтение не ждёт записи, несколько процессов работают с одной базой
+    if SQLITE_WAL:
+        cursor.execute('PRAGMA journal_mode=WAL')
+    
     # Таблица понятий
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS concepts (
@@ -29,6 +69,27 @@ def init_database():
         )
     ''')
     
+    # Постраничный просмотр каталога по (term, id), в том числе внутри категории
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_concepts_category_term
+        ON concepts(category, term, id)
+    ''')
+    
+    # Похожие понятия: заранее посчитанные соседи (related.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS related_concepts (
+            concept_id INTEGER NOT NULL,
+            rank INTEGER NOT NULL,
+            related_id INTEGER NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (concept_id, rank)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_related_concepts_related
+        ON related_concepts(related_id)
+    ''')
+    
     # Таблица прогресса пользователей
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS user_progress (
@@ -42,6 +103,22 @@ def init_database():
             FOREIGN KEY (concept_id) REFERENCES concepts(id)
         )
     ''')
+    # Ответы в викторинах отдельно от просмотров (для подбора слабых понятий)
+    _add_column(cursor, 'user_progress', 'quiz_attempts', 'INTEGER DEFAULT 0')
+    _add_column(cursor, 'user_progress', 'quiz_errors', 'INTEGER DEFAULT 0')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_user_progress_user
+        ON user_progress(user_id, concept_id)
+    ''')
+    
+    # Сложность понятий по всем пользователям (обновляется при каждом ответе)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS concept_difficulty (
+            concept_id INTEGER PRIMARY KEY,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            errors INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
     
     # Таблица викторин
     cursor.execute('''
@@ -53,11 +130,325 @@ def init_database():
             completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
+    _add_column(cursor, 'quiz_results', 'category', 'TEXT')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_quiz_results_user
+        ON quiz_results(user_id, completed_at)
+    ''')
+    
+    # Дневные итоги викторин: сюда сворачиваются старые строки quiz_results
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS quiz_daily (
+            user_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            category TEXT NOT NULL DEFAULT '',
+            quizzes INTEGER NOT NULL DEFAULT 0,
+            score INTEGER NOT NULL DEFAULT 0,
+            total_questions INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day, category)
+        )
+    ''')
+    
+    # Рейтинг: очки пользователя в каждой области (all, week:..., cat:...)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS leaderboard (
+            scope TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            user_name TEXT,
+            points INTEGER NOT NULL DEFAULT 0,
+            quizzes INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (scope, user_id)
+        )
+    ''')
+    # Версия рейтинга последнего изменения строки: другие процессы дочитывают
+    # только изменённое после известной им версии
+    _add_column(cursor, 'leaderboard', 'version', 'INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_leaderboard_version
+        ON leaderboard(version)
+    ''')
+    
+    # Служебные значения (версия каталога и т. п.)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO meta (key, value)
+        VALUES ('catalog_version', 0), ('leaderboard_version', 0), ('backup_running', 0)
+    ''')
+    
+    # Пользователи бота (для рассылок): заполняются по /start
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            chat_id INTEGER NOT NULL,
+            first_name TEXT,
+            username TEXT,
+            subscribed INTEGER NOT NULL DEFAULT 1,
+            blocked_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Рассылки: одна строка на рассылку дня с позицией для продолжения
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            day TEXT NOT NULL,
+            concept_id INTEGER,
+            status TEXT NOT NULL DEFAULT 'running',
+            last_user_id INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            blocked INTEGER NOT NULL DEFAULT 0,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP,
+            UNIQUE (kind, day)
+        )
+    ''')
+    
+    # Однократное заполнение пользователей из уже накопленного прогресса
+    # (в личных чатах chat_id совпадает с user_id)
+    cursor.execute('SELECT 1 FROM users LIMIT 1')
+    if cursor.fetchone() is None:
+        cursor.execute('''
+            INSERT OR IGNORE INTO users (user_id, chat_id)
+            SELECT DISTINCT user_id, user_id FROM user_progress
+        ''')
+    
+    # Однократное заполнение общего рейтинга из уже накопленных результатов
+    cursor.execute('SELECT 1 FROM leaderboard LIMIT 1')
+    if cursor.fetchone() is None:
+        cursor.execute('''
+            INSERT INTO leaderboard (scope, user_id, points, quizzes)
+            SELECT 'all', user_id, SUM(score), SUM(quizzes) FROM (
+                SELECT user_id, score, 1 AS quizzes FROM quiz_results
+                UNION ALL
+                SELECT user_id, score, quizzes FROM quiz_daily
+            )
+            GROUP BY user_id
+        ''')
     
     conn.commit()
     conn.close()
+    _catalog_changed(get_catalog_version())
     print("✓ База данных инициализирована")
 
+def _add_column(cursor, table, column, definition):
+    """Добавление столбца в существующую таблицу (миграция старых баз)"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column not in [row['name'] for row in cursor.fetchall()]:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+# =============================================================================
+# ВЕРСИИ ДАННЫХ
+# =============================================================================
+
+def add_catalog_listener(listener):
+    """Подписка на изменения каталога: listener(версия) после каждой записи"""
+    _catalog_listeners.append(listener)
+
+def get_versions():
+    """Все счётчики версий из таблицы meta: {'catalog_version': ..., ...}"""
+    conn = get_connection()
+    try:
+        rows = conn.execute('SELECT key, value FROM meta').fetchall()
+    finally:
+        conn.close()
+    return {row['key']: row['value'] for row in rows}
+
+def set_meta(key, value):
+    """Запись служебного значения (флаги, видимые всем процессам)"""
+    conn = get_connection()
+    try:
+        conn.execute('''
+            INSERT INTO meta (key, value) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        ''', (key, value))
+        conn.commit()
+    finally:
+        conn.close()
+
+def advance_versions(previous):
+    """После замены базы снимком: версии каталога и рейтинга выше бывших до
+    замены (previous — get_versions() до неё), рейтинг перечитывается целиком"""
+    conn = get_connection()
+    try:
+        versions = {}
+        for key in ('catalog_version', 'leaderboard_version'):
+            row = conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+            versions[key] = max(previous.get(key, 0), row['value'] if row else 0) + 1
+        # Строки снимка помечены старыми версиями: догонять по ним нечего
+        versions['leaderboard_reset'] = versions['leaderboard_version']
+        conn.executemany('''
+            INSERT INTO meta (key, value) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        ''', versions.items())
+        conn.commit()
+    finally:
+        conn.close()
+    return versions
+
+def get_catalog_version():
+    """Текущая версия каталога из базы"""
+    return get_versions().get('catalog_version', 0)
+
+def sync_catalog_version(version):
+    """Учёт изменений каталога, сделанных другими процессами"""
+    if version != catalog_version:
+        _catalog_changed(version)
+
+def _bump_version(cursor, key):
+    """Увеличение версии в той же транзакции, что и изменение данных"""
+    cursor.execute('''
+        UPDATE meta SET value = value + 1 WHERE key = ?
+        RETURNING value
+    ''', (key,))
+    return cursor.fetchone()['value']
+
+def _catalog_changed(version):
+    """Обновление копии версии и уведомление подписчиков (после COMMIT)"""
+    global catalog_version
+    catalog_version = version
+    for listener in list(_catalog_listeners):
+        listener(version)
+
+# =============================================================================
+# ПОНЯТИЯ
+# =============================================================================
+
+# Столбцы понятия в порядке полей Concept; время — секунды от 1970-01-01 (UTC)
+CONCEPT_COLUMNS = ('id, term, definition, category, example, '
+                   "CAST(strftime('%s', created_at) AS INTEGER), "
+                   "CAST(strftime('%s', updated_at) AS INTEGER)")
+
+# Столбцы записи каталога без длинных текстов: определение и пример
+# загружаются при первом обращении (load_concept_texts)
+CATALOG_COLUMNS = ('id, term, category, '
+                   "CAST(strftime('%s', created_at) AS INTEGER), "
+                   "CAST(strftime('%s', updated_at) AS INTEGER)")
+
+# Текст ещё не загружен (Ellipsis — одиночка, pickle сохраняет его как есть)
+_LAZY = ...
+
+def _format_time(seconds):
+    """Секунды -> 'ГГГГ-ММ-ДД ЧЧ:ММ:СС', как CURRENT_TIMESTAMP"""
+    return None if seconds is None else time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(seconds))
+
+class Concept(Mapping):
+    """Понятие каталога: неизменяемая запись со __slots__ вместо dict.
+    Читается как словарь (concept['term'], .get, dict(concept)). Категория
+    интернирована, время хранится числом и переводится в строку при обращении.
+    В записях полного каталога определение и пример загружаются при обращении"""
+
+    __slots__ = ('id', 'term', '_definition', 'category', '_example', '_created', '_updated')
+    FIELDS = ('id', 'term', 'definition', 'category', 'example', 'created_at', 'updated_at')
+    _KEYS = frozenset(FIELDS)
+
+    def __init__(self, id, term, definition, category, example, created=None, updated=None):
+        # Поля заполняются дескрипторами слотов в обход запрета __setattr__.
+        # Одна строка категории на процесс, а не копия в каждой записи
+        _set_id(self, id)
+        _set_term(self, term)
+        _set_definition(self, definition)
+        _set_category(self, sys.intern(category) if category else category)
+        _set_example(self, example)
+        _set_created(self, created)
+        _set_updated(self, updated)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Concept неизменяем')
+
+    __delattr__ = __setattr__
+
+    @property
+    def definition(self):
+        if self._definition is _LAZY:
+            load_concept_texts([self])
+        return self._definition
+
+    @property
+    def example(self):
+        if self._example is _LAZY:
+            load_concept_texts([self])
+        return self._example
+
+    @property
+    def created_at(self):
+        return _format_time(self._created)
+
+    @property
+    def updated_at(self):
+        return _format_time(self._updated)
+
+    def __getitem__(self, key):
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def __reduce__(self):
+        return Concept, tuple(getattr(self, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f'Concept(id={self.id!r}, term={self.term!r})'
+
+(_set_id, _set_term, _set_definition, _set_category, _set_example,
+ _set_created, _set_updated) = (getattr(Concept, name).__set__ for name in Concept.__slots__)
+
+def _concept_row(cursor, row):
+    return Concept(*row)
+
+def _catalog_row(cursor, row):
+    concept_id, term, category, created, updated = row
+    return Concept(concept_id, term, _LAZY, category, _LAZY, created, updated)
+
+def _concept_cursor(conn, lazy=False):
+    """Курсор, строки которого — записи Concept (запрос выбирает CONCEPT_COLUMNS,
+    с lazy — CATALOG_COLUMNS)"""
+    cursor = conn.cursor()
+    cursor.row_factory = _catalog_row if lazy else _concept_row
+    return cursor
+
+@timed
+def load_concept_texts(concepts, chunk=500):
+    """Загрузка определений и примеров записей каталога, где их ещё нет
+    (несколько записей — одним запросом на chunk)"""
+    lazy = {concept.id: concept for concept in concepts if concept._definition is _LAZY}
+    if not lazy:
+        return
+    ids = list(lazy)
+    conn = get_connection()
+    try:
+        for start in range(0, len(ids), chunk):
+            part = ids[start:start + chunk]
+            rows = conn.execute(f'''
+                SELECT id, definition, example FROM concepts
+                WHERE id IN ({','.join('?' * len(part))})
+            ''', part).fetchall()
+            for concept_id, definition, example in rows:
+                _set_definition(lazy[concept_id], definition)
+                _set_example(lazy[concept_id], example)
+    finally:
+        conn.close()
+    # Понятие удалено после загрузки каталога
+    for concept in lazy.values():
+        if concept._definition is _LAZY:
+            _set_definition(concept, '')
+            _set_example(concept, '')
+
+@timed
 def add_concept(term, definition, category="General", example=""):
     """Добавление нового понятия в базу"""
     conn = get_connection()
@@ -68,19 +459,40 @@ def add_concept(term, definition, category="General", example=""):
             INSERT INTO concepts (term, definition, category, example)
             VALUES (?, ?, ?, ?)
         ''', (term.upper(), definition, category, example))
+        version = _bump_version(cursor, 'catalog_version')
         conn.commit()
-        return True
     except sqlite3.IntegrityError:
         return False
     finally:
         conn.close()
+    _catalog_changed(version)
+    return True
 
+@timed
+def add_concepts(concepts):
+    """Добавление нескольких понятий одной транзакцией (существующие пропускаются)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.executemany('''
+        INSERT OR IGNORE INTO concepts (term, definition, category, example)
+        VALUES (?, ?, ?, ?)
+    ''', [(term.upper(), definition, category, example)
+          for term, definition, category, example in concepts])
+    added = cursor.rowcount
+    version = _bump_version(cursor, 'catalog_version') if added else None
+    conn.commit()
+    conn.close()
+    if version is not None:
+        _catalog_changed(version)
+    return added
+
+@timed
 def get_random_concept(exclude_ids=None, categories=None):
     """Получение случайного понятия"""
     conn = get_connection()
-    cursor = conn.cursor()
+    cursor = _concept_cursor(conn)
     
-    query = 'SELECT * FROM concepts'
+    query = f'SELECT {CONCEPT_COLUMNS} FROM concepts'
     params = []
     conditions = []
     
@@ -102,36 +514,40 @@ def get_random_concept(exclude_ids=None, categories=None):
     cursor.execute(query, params)
     result = cursor.fetchone()
     conn.close()
-    return dict(result) if result else None
+    return result
 
+@timed
 def get_all_concepts():
-    """Получение всех понятий"""
+    """Получение всех понятий (определение и пример — при обращении)"""
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM concepts ORDER BY term')
+    cursor = _concept_cursor(conn, lazy=True)
+    cursor.execute(f'SELECT {CATALOG_COLUMNS} FROM concepts ORDER BY term')
     results = cursor.fetchall()
     conn.close()
-    return [dict(row) for row in results]
+    return results
 
+@timed
 def get_concepts_by_category(category):
     """Получение понятий по категории"""
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM concepts WHERE category = ? ORDER BY term', (category,))
+    cursor = _concept_cursor(conn)
+    cursor.execute(f'SELECT {CONCEPT_COLUMNS} FROM concepts WHERE category = ? ORDER BY term', (category,))
     results = cursor.fetchall()
     conn.close()
-    return [dict(row) for row in results]
+    return results
 
+@timed
 def get_concepts_by_categories(categories):
     """Получение понятий по нескольким категориям"""
     conn = get_connection()
-    cursor = conn.cursor()
+    cursor = _concept_cursor(conn)
     placeholders = ','.join('?' * len(categories))
-    cursor.execute(f'SELECT * FROM concepts WHERE category IN ({placeholders}) ORDER BY term', categories)
+    cursor.execute(f'SELECT {CONCEPT_COLUMNS} FROM concepts WHERE category IN ({placeholders}) ORDER BY term', categories)
     results = cursor.fetchall()
     conn.close()
-    return [dict(row) for row in results]
+    return results
 
+@timed
 def get_all_categories():
     """Получение всех категорий"""
     conn = get_connection()
@@ -141,43 +557,98 @@ def get_all_categories():
     conn.close()
     return [row['category'] for row in results]
 
+@timed
 def delete_concept(concept_id):
     """Удаление понятия по ID"""
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('DELETE FROM concepts WHERE id = ?', (concept_id,))
-    conn.commit()
     affected = cursor.rowcount
+    version = _bump_version(cursor, 'catalog_version') if affected else None
+    conn.commit()
     conn.close()
+    if version is not None:
+        _catalog_changed(version)
     return affected > 0
 
+@timed
 def update_concept(concept_id, term, definition, category, example):
-    """Обновление понятия"""
+    """Обновление понятия (False — нет такого понятия или термин уже занят)"""
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute('''
-        UPDATE concepts 
-        SET term = ?, definition = ?, category = ?, example = ?, updated_at = CURRENT_TIMESTAMP
-        WHERE id = ?
-    ''', (term.upper(), definition, category, example, concept_id))
-    conn.commit()
-    affected = cursor.rowcount
+    try:
+        cursor.execute('''
+            UPDATE concepts 
+            SET term = ?, definition = ?, category = ?, example = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (term.upper(), definition, category, example, concept_id))
+        if cursor.rowcount == 0:
+            return False
+        version = _bump_version(cursor, 'catalog_version')
+        conn.commit()
+    except sqlite3.IntegrityError:
+        return False
+    finally:
+        conn.close()
+    _catalog_changed(version)
+    return True
+
+@timed
+def get_concepts_page(after_id=None, before_id=None, category=None, query=None, limit=10):
+    """Страница каталога по ключу (term, id): следующая после after_id или
+    предыдущая перед before_id. Возвращает (понятия, есть_ли_ещё_в_этом_направлении)"""
+    conditions = []
+    params = []
+    
+    if category:
+        conditions.append('category = ?')
+        params.append(category)
+    
+    if query:
+        conditions.append('(term LIKE ? OR definition LIKE ?)')
+        params.extend([f'%{query}%', f'%{query}%'])
+    
+    backward = before_id is not None
+    anchor = before_id if backward else after_id
+    if anchor is not None:
+        sign = '<' if backward else '>'
+        conditions.append(f'(term, id) {sign} (SELECT term, id FROM concepts WHERE id = ?)')
+        params.append(anchor)
+    
+    sql = f'SELECT {CONCEPT_COLUMNS} FROM concepts'
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += ' ORDER BY term DESC, id DESC' if backward else ' ORDER BY term, id'
+    sql += ' LIMIT ?'
+    params.append(limit + 1)
+    
+    conn = get_connection()
+    cursor = _concept_cursor(conn)
+    cursor.execute(sql, params)
+    results = cursor.fetchall()
     conn.close()
-    return affected > 0
+    
+    has_more = len(results) > limit
+    results = results[:limit]
+    if backward:
+        results.reverse()
+    return results, has_more
 
+@timed
 def search_concepts(query):
     """Поиск понятий по запросу"""
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM concepts 
+    cursor = _concept_cursor(conn)
+    cursor.execute(f'''
+        SELECT {CONCEPT_COLUMNS} FROM concepts 
         WHERE term LIKE ? OR definition LIKE ?
         ORDER BY term
     ''', (f'%{query}%', f'%{query}%'))
     results = cursor.fetchall()
     conn.close()
-    return [dict(row) for row in results]
+    return results
 
+@timed
 def get_concept_count(category=None):
     """Получение общего количества понятий"""
     conn = get_connection()
@@ -192,10 +663,14 @@ def get_concept_count(category=None):
     conn.close()
     return result['count'] if result else 0
 
-def save_user_progress(user_id, concept_id, is_correct):
-    """Сохранение прогресса пользователя"""
+@timed
+def save_user_progress(user_id, concept_id, is_correct, from_quiz=False):
+    """Сохранение прогресса пользователя (from_quiz — ответ в викторине,
+    учитывается и в статистике сложности понятия)"""
     conn = get_connection()
     cursor = conn.cursor()
+    quiz_attempt = 1 if from_quiz else 0
+    quiz_error = 1 if from_quiz and not is_correct else 0
     
     cursor.execute('''
         SELECT * FROM user_progress 
@@ -210,20 +685,76 @@ def save_user_progress(user_id, concept_id, is_correct):
             SET times_shown = times_shown + 1,
                 times_correct = times_correct + ?,
                 is_learned = ?,
+                quiz_attempts = quiz_attempts + ?,
+                quiz_errors = quiz_errors + ?,
                 last_reviewed = CURRENT_TIMESTAMP
             WHERE user_id = ? AND concept_id = ?
         ''', (1 if is_correct else 0, 
               is_correct and (existing['times_correct'] + 1) >= 3,
+              quiz_attempt, quiz_error,
               user_id, concept_id))
     else:
         cursor.execute('''
-            INSERT INTO user_progress (user_id, concept_id, is_learned, times_shown, times_correct)
-            VALUES (?, ?, ?, 1, ?)
-        ''', (user_id, concept_id, is_correct and 3 >= 3, 1 if is_correct else 0))
+            INSERT INTO user_progress (user_id, concept_id, is_learned, times_shown, times_correct,
+                                       quiz_attempts, quiz_errors)
+            VALUES (?, ?, ?, 1, ?, ?, ?)
+        ''', (user_id, concept_id, is_correct and 3 >= 3, 1 if is_correct else 0,
+              quiz_attempt, quiz_error))
+    
+    if from_quiz:
+        cursor.execute('''
+            INSERT INTO concept_difficulty (concept_id, attempts, errors)
+            VALUES (?, 1, ?)
+            ON CONFLICT(concept_id) DO UPDATE SET
+                attempts = attempts + 1,
+                errors = errors + excluded.errors
+        ''', (concept_id, quiz_error))
     
     conn.commit()
     conn.close()
 
+@timed
+def get_concept_difficulty():
+    """Сложность всех понятий: {concept_id: (попыток, ошибок)}"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT concept_id, attempts, errors FROM concept_difficulty')
+    results = cursor.fetchall()
+    conn.close()
+    return {row['concept_id']: (row['attempts'], row['errors']) for row in results}
+
+@timed
+def get_user_quiz_errors(user_id):
+    """Ответы пользователя в викторинах: {concept_id: (попыток, ошибок)}"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT concept_id, quiz_attempts, quiz_errors FROM user_progress
+        WHERE user_id = ? AND quiz_attempts > 0
+    ''', (user_id,))
+    results = cursor.fetchall()
+    conn.close()
+    return {row['concept_id']: (row['quiz_attempts'], row['quiz_errors']) for row in results}
+
+@timed
+def get_hardest_concepts(limit=10, min_attempts=5):
+    """Понятия с наибольшей долей ошибок в викторинах"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT c.id, c.term, c.category, d.attempts, d.errors,
+               CAST(d.errors AS REAL) / d.attempts AS error_rate
+        FROM concept_difficulty d
+        JOIN concepts c ON c.id = d.concept_id
+        WHERE d.attempts >= ?
+        ORDER BY error_rate DESC, d.attempts DESC
+        LIMIT ?
+    ''', (min_attempts, limit))
+    results = cursor.fetchall()
+    conn.close()
+    return [dict(row) for row in results]
+
+@timed
 def get_user_stats(user_id):
     """Получение статистики пользователя"""
     conn = get_connection()
@@ -247,36 +778,571 @@ def get_user_stats(user_id):
         'learned_count': result['learned_count'] or 0
     }
 
-def save_quiz_result(user_id, score, total):
-    """Сохранение результата викторины"""
+@timed
+def save_quiz_result(user_id, score, total, category=None, user_name=None, scopes=()):
+    """Сохранение результата викторины и начисление очков в областях рейтинга.
+    Возвращает новую версию рейтинга"""
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('''
-        INSERT INTO quiz_results (user_id, score, total_questions)
-        VALUES (?, ?, ?)
-    ''', (user_id, score, total))
+        INSERT INTO quiz_results (user_id, score, total_questions, category)
+        VALUES (?, ?, ?, ?)
+    ''', (user_id, score, total, category))
+    version = _bump_version(cursor, 'leaderboard_version')
+    for scope in scopes:
+        cursor.execute('''
+            INSERT INTO leaderboard (scope, user_id, user_name, points, quizzes, version)
+            VALUES (?, ?, ?, ?, 1, ?)
+            ON CONFLICT(scope, user_id) DO UPDATE SET
+                points = points + excluded.points,
+                quizzes = quizzes + 1,
+                user_name = COALESCE(excluded.user_name, user_name),
+                updated_at = CURRENT_TIMESTAMP,
+                version = excluded.version
+        ''', (scope, user_id, user_name, score, version))
     conn.commit()
     conn.close()
+    return version
 
-def get_user_quiz_history(user_id, limit=5):
-    """Получение истории викторин пользователя"""
+@timed
+def get_leaderboard_rows(scope):
+    """Все участники области рейтинга"""
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('''
-        SELECT * FROM quiz_results 
-        WHERE user_id = ? 
-        ORDER BY completed_at DESC 
+        SELECT user_id, user_name, points FROM leaderboard
+        WHERE scope = ?
+    ''', (scope,))
+    results = cursor.fetchall()
+    conn.close()
+    return [dict(row) for row in results]
+
+@timed
+def get_leaderboard_changes(after_version, scopes):
+    """Строки областей scopes, изменённые после версии рейтинга after_version"""
+    if not scopes:
+        return []
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT scope, user_id, user_name, points FROM leaderboard
+        WHERE version > ? AND scope IN ({','.join('?' * len(scopes))})
+    ''', (after_version, *scopes))
+    results = cursor.fetchall()
+    conn.close()
+    return [dict(row) for row in results]
+
+# Результаты викторин: последние — поштучно, старые — свёрнутыми по дням
+_QUIZ_HISTORY = '''
+    SELECT user_id, score, total_questions, category, completed_at, 1 AS quizzes
+    FROM quiz_results
+    WHERE user_id = ?
+    UNION ALL
+    SELECT user_id, score, total_questions, NULLIF(category, ''), day, quizzes
+    FROM quiz_daily
+    WHERE user_id = ?
+'''
+
+@timed
+def get_user_quiz_history(user_id, limit=5):
+    """Получение истории викторин пользователя (старые — дневными итогами,
+    quizzes — сколько викторин в строке)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        {_QUIZ_HISTORY}
+        ORDER BY completed_at DESC
         LIMIT ?
-    ''', (user_id, limit))
+    ''', (user_id, user_id, limit))
     results = cursor.fetchall()
     conn.close()
     return [dict(row) for row in results]
 
+@timed
+def get_user_stats_version(user_id):
+    """Отпечаток данных карточки прогресса: меняется, когда понятие изучено,
+    пройдена викторина или изменился каталог"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT
+            (SELECT COALESCE(SUM(is_learned), 0) FROM user_progress WHERE user_id = ?) AS learned,
+            (SELECT COALESCE(MAX(id), 0) FROM quiz_results WHERE user_id = ?) AS last_quiz
+    ''', (user_id, user_id))
+    result = cursor.fetchone()
+    conn.close()
+    return (result['learned'], result['last_quiz'], catalog_version)
+
+@timed
+def get_user_chart_data(user_id, history=30):
+    """Данные карточки прогресса: последние викторины и изученное по категориям"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        {_QUIZ_HISTORY}
+        ORDER BY completed_at DESC
+        LIMIT ?
+    ''', (user_id, user_id, history))
+    quizzes = [dict(row) for row in reversed(cursor.fetchall())]
+    cursor.execute('''
+        SELECT c.category,
+               COUNT(*) AS total,
+               COALESCE(SUM(up.is_learned), 0) AS learned
+        FROM concepts c
+        LEFT JOIN user_progress up ON up.concept_id = c.id AND up.user_id = ?
+        GROUP BY c.category
+        ORDER BY c.category
+    ''', (user_id,))
+    categories = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return {'quizzes': quizzes, 'categories': categories}
+
+@timed
 def get_concept_by_id(concept_id):
     """Получение понятия по ID"""
     conn = get_connection()
+    cursor = _concept_cursor(conn)
+    cursor.execute(f'SELECT {CONCEPT_COLUMNS} FROM concepts WHERE id = ?', (concept_id,))
+    result = cursor.fetchone()
+    conn.close()
+    return result
+
+# =============================================================================
+# ПОЛЬЗОВАТЕЛИ И РАССЫЛКИ
+# =============================================================================
+
+@timed
+def register_user(user_id, chat_id, first_name=None, username=None):
+    """Запись пользователя (/start); вернувшийся после блокировки или отписки снова получает рассылки"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO users (user_id, chat_id, first_name, username)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+            chat_id = excluded.chat_id,
+            first_name = excluded.first_name,
+            username = excluded.username,
+            blocked_at = NULL,
+            subscribed = 1,
+            last_seen = CURRENT_TIMESTAMP
+    ''', (user_id, chat_id, first_name, username))
+    conn.commit()
+    conn.close()
+
+@timed
+def set_user_subscribed(user_id, subscribed):
+    """Подписка на понятие дня"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('UPDATE users SET subscribed = ? WHERE user_id = ?', (int(subscribed), user_id))
+    conn.commit()
+    affected = cursor.rowcount
+    conn.close()
+    return affected > 0
+
+@timed
+def mark_users_blocked(user_ids):
+    """Пользователи, заблокировавшие бота: следующие рассылки их пропускают"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.executemany(
+        'UPDATE users SET blocked_at = CURRENT_TIMESTAMP WHERE user_id = ?',
+        [(user_id,) for user_id in user_ids]
+    )
+    conn.commit()
+    conn.close()
+
+@timed
+def get_broadcast_recipients(after_user_id=0, limit=100):
+    """Следующая порция получателей по ключу user_id (без OFFSET)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT user_id, chat_id FROM users
+        WHERE user_id > ? AND subscribed = 1 AND blocked_at IS NULL
+        ORDER BY user_id
+        LIMIT ?
+    ''', (after_user_id, limit))
+    results = cursor.fetchall()
+    conn.close()
+    return [dict(row) for row in results]
+
+@timed
+def get_user_count(reachable=False):
+    """Число пользователей (reachable — подписанных и не заблокировавших бота)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    if reachable:
+        cursor.execute('SELECT COUNT(*) AS count FROM users WHERE subscribed = 1 AND blocked_at IS NULL')
+    else:
+        cursor.execute('SELECT COUNT(*) AS count FROM users')
+    result = cursor.fetchone()
+    conn.close()
+    return result['count']
+
+@timed
+def get_or_create_broadcast(kind, day, concept_id):
+    """Рассылка дня: существующая (для продолжения) или новая"""
+    conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM concepts WHERE id = ?', (concept_id,))
+    cursor.execute('''
+        INSERT OR IGNORE INTO broadcasts (kind, day, concept_id) VALUES (?, ?, ?)
+    ''', (kind, day, concept_id))
+    conn.commit()
+    cursor.execute('SELECT * FROM broadcasts WHERE kind = ? AND day = ?', (kind, day))
     result = cursor.fetchone()
     conn.close()
-    return dict(result) if result else None
\ No newline at end of file
+    return dict(result)
+
+@timed
+def get_broadcast(kind, day):
+    """Рассылка дня или None"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM broadcasts WHERE kind = ? AND day = ?', (kind, day))
+    result = cursor.fetchone()
+    conn.close()
+    return dict(result) if result else None
+
+@timed
+def save_broadcast_progress(broadcast_id, last_user_id, sent, failed, blocked, done=False):
+    """Контрольная точка рассылки: все получатели до last_user_id обработаны"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE broadcasts SET
+            last_user_id = ?, sent = sent + ?, failed = failed + ?, blocked = blocked + ?,
+            status = CASE WHEN ? THEN 'done' ELSE status END,
+            finished_at = CASE WHEN ? THEN CURRENT_TIMESTAMP ELSE finished_at END
+        WHERE id = ?
+    ''', (last_user_id, sent, failed, blocked, done, done, broadcast_id))
+    conn.commit()
+    conn.close()
+
+@timed
+def get_recent_broadcasts(limit=5):
+    """Последние рассылки для отчёта администратору"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM broadcasts ORDER BY id DESC LIMIT ?', (limit,))
+    results = cursor.fetchall()
+    conn.close()
+    return [dict(row) for row in results]
+
+# =============================================================================
+# АНАЛИТИКА
+# =============================================================================
+# Порции для analytics.py: только числа, кортежами (без sqlite3.Row), по ключу
+# строки без OFFSET. Первый столбец — ключ для следующей порции. День — номер
+# дня от 1970-01-01 (UTC).
+
+def _fetch_tuples(query, params):
+    conn = get_connection()
+    conn.row_factory = None
+    try:
+        return conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
+
+@timed
+def get_quiz_results_chunk(after_id=0, limit=50000):
+    """(id, user_id, день, score, total_questions) поштучных результатов викторин"""
+    return _fetch_tuples('''
+        SELECT id, user_id, CAST(strftime('%s', completed_at) AS INTEGER) / 86400,
+               COALESCE(score, 0), COALESCE(total_questions, 0)
+        FROM quiz_results
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+    ''', (after_id, limit))
+
+@timed
+def get_quiz_daily_chunk(after_rowid=0, limit=50000):
+    """(rowid, user_id, день, score, total_questions, quizzes) дневных итогов викторин"""
+    return _fetch_tuples('''
+        SELECT rowid, user_id, CAST(strftime('%s', day) AS INTEGER) / 86400,
+               score, total_questions, quizzes
+        FROM quiz_daily
+        WHERE rowid > ?
+        ORDER BY rowid
+        LIMIT ?
+    ''', (after_rowid, limit))
+
+@timed
+def get_progress_chunk(after_id=0, limit=50000):
+    """(id, user_id, concept_id, день последнего показа или -1, quiz_attempts,
+    quiz_errors, is_learned) строк прогресса"""
+    return _fetch_tuples('''
+        SELECT id, user_id, concept_id,
+               COALESCE(CAST(strftime('%s', last_reviewed) AS INTEGER) / 86400, -1),
+               COALESCE(quiz_attempts, 0), COALESCE(quiz_errors, 0), COALESCE(is_learned, 0)
+        FROM user_progress
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+    ''', (after_id, limit))
+
+@timed
+def get_concept_categories():
+    """{id: категория} всех понятий"""
+    return dict(_fetch_tuples('SELECT id, category FROM concepts', ()))
+
+# =============================================================================
+# ПОХОЖИЕ ПОНЯТИЯ
+# =============================================================================
+
+@timed
+def get_related_concepts(concept_id, limit=3):
+    """Заранее посчитанные похожие понятия: [{'id', 'term'}] по убыванию сходства"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT c.id, c.term FROM related_concepts r
+        JOIN concepts c ON c.id = r.related_id
+        WHERE r.concept_id = ?
+        ORDER BY r.rank
+        LIMIT ?
+    ''', (concept_id, limit))
+    results = cursor.fetchall()
+    conn.close()
+    return [dict(row) for row in results]
+
+@timed
+def get_concepts_for_index():
+    """(текущее время, [(id, term, definition, example, updated)]) для related.py;
+    время — unix time по часам базы, как и updated"""
+    rows = _fetch_tuples('''
+        SELECT id, term, definition, COALESCE(example, ''),
+               CAST(strftime('%s', COALESCE(updated_at, created_at)) AS INTEGER)
+        FROM concepts
+        ORDER BY id
+    ''', ())
+    now = _fetch_tuples("SELECT CAST(strftime('%s', 'now') AS INTEGER)", ())[0][0]
+    return now, rows
+
+@timed
+def get_related_summary():
+    """{concept_id: (соседей, наименьшее сходство)} по сохранённым спискам"""
+    rows = _fetch_tuples('''
+        SELECT concept_id, COUNT(*), MIN(score) FROM related_concepts
+        GROUP BY concept_id
+    ''', ())
+    return {concept_id: (count, score) for concept_id, count, score in rows}
+
+@timed
+def get_related_referencing(concept_ids):
+    """Понятия, в списках соседей которых есть любое из concept_ids"""
+    concept_ids = list(concept_ids)
+    found = set()
+    # Порциями: число параметров запроса ограничено
+    for start in range(0, len(concept_ids), 500):
+        part = concept_ids[start:start + 500]
+        rows = _fetch_tuples(f'''
+            SELECT DISTINCT concept_id FROM related_concepts
+            WHERE related_id IN ({','.join('?' * len(part))})
+        ''', part)
+        found.update(row[0] for row in rows)
+    return found
+
+@timed
+def save_related(neighbours, removed=(), version=None, built_at=None, batch=2000):
+    """Замена списков соседей: neighbours — {concept_id: [(related_id, score)]},
+    removed — понятия, чьи списки просто удаляются. Порциями по batch понятий;
+    версия и время сборки записываются с последней порцией"""
+    items = list(neighbours.items()) + [(concept_id, []) for concept_id in removed]
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        for start in range(0, max(len(items), 1), batch):
+            part = items[start:start + batch]
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.executemany('DELETE FROM related_concepts WHERE concept_id = ?',
+                               [(concept_id,) for concept_id, _ in part])
+            cursor.executemany('''
+                INSERT INTO related_concepts (concept_id, rank, related_id, score)
+                VALUES (?, ?, ?, ?)
+            ''', [(concept_id, rank, related_id, score)
+                  for concept_id, related in part
+                  for rank, (related_id, score) in enumerate(related)])
+            if start + batch >= len(items) and version is not None:
+                cursor.executemany('''
+                    INSERT INTO meta (key, value) VALUES (?, ?)
+                    ON CONFLICT(key) DO UPDATE SET value = excluded.value
+                ''', [('related_version', version), ('related_built_at', built_at)])
+            conn.commit()
+    finally:
+        conn.close()
+
+# =============================================================================
+# ОБСЛУЖИВАНИЕ
+# =============================================================================
+# Каждая функция делает один короткий шаг: кандидаты выбираются без блокировки
+# записи, изменение — одной небольшой транзакцией. Возвращается число строк
+# (страниц), 0 — работы больше нет.
+
+@timed
+def rollup_quiz_results(days, limit=500):
+    """Свёртка результатов викторин старше days дней в дневные итоги quiz_daily"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        # Граница — начало дня: день попадает в итоги целиком
+        cursor.execute("SELECT date('now', ?) AS cutoff", (f'-{days} days',))
+        cutoff = cursor.fetchone()['cutoff']
+        cursor.execute('''
+            SELECT MAX(id) AS last_id FROM (
+                SELECT id FROM quiz_results
+                WHERE completed_at < ?
+                ORDER BY id
+                LIMIT ?
+            )
+        ''', (cutoff, limit))
+        last_id = cursor.fetchone()['last_id']
+        if last_id is None:
+            return 0
+        
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('''
+            INSERT INTO quiz_daily (user_id, day, category, quizzes, score, total_questions)
+            SELECT user_id, date(completed_at), COALESCE(category, ''), COUNT(*),
+                   COALESCE(SUM(score), 0), COALESCE(SUM(total_questions), 0)
+            FROM quiz_results
+            WHERE completed_at < ? AND id <= ?
+            GROUP BY user_id, date(completed_at), COALESCE(category, '')
+            ON CONFLICT (user_id, day, category) DO UPDATE SET
+                quizzes = quizzes + excluded.quizzes,
+                score = score + excluded.score,
+                total_questions = total_questions + excluded.total_questions
+        ''', (cutoff, last_id))
+        cursor.execute('DELETE FROM quiz_results WHERE completed_at < ? AND id <= ?', (cutoff, last_id))
+        rolled = cursor.rowcount
+        conn.commit()
+        return rolled
+    finally:
+        conn.close()
+
+@timed
+def prune_quiz_daily(days, limit=500):
+    """Удаление дневных итогов старше days дней"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''
+            SELECT rowid FROM quiz_daily
+            WHERE day < date('now', ?)
+            LIMIT ?
+        ''', (f'-{days} days', limit))
+        return _delete_rows(conn, 'quiz_daily', 'rowid', [row[0] for row in cursor.fetchall()])
+    finally:
+        conn.close()
+
+@timed
+def prune_leaderboard_weeks(before_scope, limit=500):
+    """Удаление недельного рейтинга за недели раньше before_scope ('week:...')"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''
+            SELECT rowid FROM leaderboard
+            WHERE scope >= 'week:' AND scope < ?
+            LIMIT ?
+        ''', (before_scope, limit))
+        return _delete_rows(conn, 'leaderboard', 'rowid', [row[0] for row in cursor.fetchall()])
+    finally:
+        conn.close()
+
+@timed
+def prune_user_progress(days, limit=500):
+    """Удаление прогресса и общей сложности по удалённым понятиям и прогресса
+    пользователей, заблокировавших бота больше days дней назад (None — хранится)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''
+            SELECT up.id FROM user_progress up
+            LEFT JOIN concepts c ON c.id = up.concept_id
+            WHERE c.id IS NULL
+            LIMIT ?
+        ''', (limit,))
+        ids = [row['id'] for row in cursor.fetchall()]
+        if days is not None and len(ids) < limit:
+            cursor.execute('''
+                SELECT up.id FROM users u
+                JOIN user_progress up ON up.user_id = u.user_id
+                WHERE u.blocked_at < datetime('now', ?)
+                LIMIT ?
+            ''', (f'-{days} days', limit - len(ids)))
+            ids += [row['id'] for row in cursor.fetchall()]
+        deleted = _delete_rows(conn, 'user_progress', 'id', list(dict.fromkeys(ids)))
+        if deleted < limit:
+            cursor.execute('''
+                SELECT d.concept_id FROM concept_difficulty d
+                LEFT JOIN concepts c ON c.id = d.concept_id
+                WHERE c.id IS NULL
+                LIMIT ?
+            ''', (limit - deleted,))
+            deleted += _delete_rows(conn, 'concept_difficulty', 'concept_id',
+                                    [row['concept_id'] for row in cursor.fetchall()])
+        return deleted
+    finally:
+        conn.close()
+
+def _delete_rows(conn, table, key, ids):
+    """Удаление выбранных строк одной короткой транзакцией"""
+    if not ids:
+        return 0
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    cursor.executemany(f'DELETE FROM {table} WHERE {key} = ?', [(value,) for value in ids])
+    conn.commit()
+    return len(ids)
+
+@timed
+def incremental_vacuum(pages):
+    """Возврат файлу до pages свободных страниц (только при auto_vacuum=INCREMENTAL)"""
+    conn = get_connection()
+    try:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            return 0
+        before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if before:
+            # Каждая строка результата — одна освобождённая страница, читать до конца
+            conn.execute(f'PRAGMA incremental_vacuum({int(pages)})').fetchall()
+        return before - conn.execute('PRAGMA freelist_count').fetchone()[0]
+    finally:
+        conn.close()
+
+@timed
+def analyze_table(table, analysis_limit=400):
+    """Обновление статистики планировщика для одной таблицы по выборке строк индексов"""
+    conn = get_connection()
+    try:
+        conn.execute(f'PRAGMA analysis_limit = {int(analysis_limit)}')
+        conn.execute(f'ANALYZE {table}')
+        conn.commit()
+    finally:
+        conn.close()
+
+@timed
+def get_storage_stats():
+    """Размер файла базы в страницах и режим auto_vacuum"""
+    conn = get_connection()
+    try:
+        return {
+            'page_size': conn.execute('PRAGMA page_size').fetchone()[0],
+            'page_count': conn.execute('PRAGMA page_count').fetchone()[0],
+            'freelist_count': conn.execute('PRAGMA freelist_count').fetchone()[0],
+            'auto_vacuum': conn.execute('PRAGMA auto_vacuum').fetchone()[0],
+        }
+    finally:
+        conn.close()
+
+def vacuum():
+    """Полный VACUUM с переводом на auto_vacuum=INCREMENTAL (держит базу всё время работы)"""
+    conn = get_connection()
+    try:
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
\ No newline at end of file
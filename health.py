@@ -0,0 +1,106 @@
+# health.py
+# Проверки живости (/health) и готовности (/ready) сервиса
+
+import threading
+import time
+
+from config import (
+    HEALTH_MAX_POLL_AGE, HEALTH_MAX_UPDATE_AGE, HEALTH_MAX_DB_MS,
+    HEALTH_MAX_QUEUE, HEALTH_MAX_SESSIONS
+)
+
+_started = time.monotonic()
+_last_update = None
+_last_poll = None
+
+# Поток получения обновлений и источники показателей (задаются при запуске)
+_worker = None
+_probes = {}
+_lock = threading.Lock()
+
+def mark_update():
+    """Отметка об обработанном обновлении"""
+    global _last_update
+    _last_update = time.monotonic()
+
+def mark_poll():
+    """Отметка об успешном запросе getUpdates (поток опроса жив и не завис)"""
+    global _last_poll
+    _last_poll = time.monotonic()
+
+def watch_thread(thread):
+    """Поток, чья живость определяет /health (infinity_polling или вебхук)"""
+    global _worker
+    _worker = thread
+
+def add_probe(name, function):
+    """Показатель для /ready, например размер очереди или число сессий"""
+    with _lock:
+        _probes[name] = function
+
+def _age(moment, now):
+    return round(now - moment, 3) if moment is not None else None
+
+def liveness():
+    """Жив ли поток получения обновлений: (ok, отчёт)"""
+    now = time.monotonic()
+    report = {
+        'uptime_seconds': round(now - _started, 1),
+        'worker_alive': _worker.is_alive() if _worker is not None else None,
+        'seconds_since_poll': _age(_last_poll, now),
+        'seconds_since_update': _age(_last_update, now),
+    }
+    problems = []
+
+    if _worker is not None and not _worker.is_alive():
+        problems.append('worker thread is dead')
+
+    # Опрос считается зависшим, если getUpdates давно не возвращался.
+    # Пока первый опрос не завершился, отсчёт идёт от запуска.
+    if _worker is not None and HEALTH_MAX_POLL_AGE:
+        since_poll = now - (_last_poll if _last_poll is not None else _started)
+        if since_poll > HEALTH_MAX_POLL_AGE:
+            problems.append(f'no getUpdates response for {since_poll:.0f}s')
+
+    if HEALTH_MAX_UPDATE_AGE and _last_update is not None:
+        if now - _last_update > HEALTH_MAX_UPDATE_AGE:
+            problems.append(f'no updates for {now - _last_update:.0f}s')
+
+    report['problems'] = problems
+    return not problems, report
+
+def readiness(db_ping):
+    """Готовность принимать трафик: живость + база + очереди (ok, отчёт)"""
+    _, report = liveness()
+    problems = report['problems']
+
+    try:
+        latency_ms = db_ping() * 1000
+        report['db_latency_ms'] = round(latency_ms, 3)
+        if HEALTH_MAX_DB_MS and latency_ms > HEALTH_MAX_DB_MS:
+            problems.append(f'db latency {latency_ms:.0f}ms > {HEALTH_MAX_DB_MS}ms')
+    except Exception as e:
+        report['db_latency_ms'] = None
+        problems.append(f'db unavailable: {type(e).__name__}: {e}')
+
+    with _lock:
+        probes = list(_probes.items())
+    for name, function in probes:
+        try:
+            report[name] = function()
+        except Exception as e:
+            report[name] = None
+            problems.append(f'{name} probe failed: {e}')
+
+    limits = {'queue_backlog': HEALTH_MAX_QUEUE, 'sessions': HEALTH_MAX_SESSIONS}
+    for name, limit in limits.items():
+        value = report.get(name)
+        if limit and value is not None and value > limit:
+            problems.append(f'{name} {value} > {limit}')
+
+    # Многопроцессный режим: упавший обработчик перезапускается, но пока
+    # его нет, обновления его пользователей копятся в очереди
+    if report.get('workers_down'):
+        problems.append(f"{report['workers_down']} worker process(es) down")
+
+    return not problems, report
@@ -0,0 +1,165 @@
+# leaderboard.py
+# Рейтинг участников викторин: общий, недельный и по категориям
+#
+# Очки хранятся в таблице leaderboard (обновляется в save_quiz_result),
+# а для быстрых запросов «топ-N» и «моё место» каждая область рейтинга
+# держится в памяти как отсортированный список — поиск места за O(log n).
+
+import heapq
+import threading
+from bisect import bisect_left, insort
+from datetime import date
+
+import database
+
+GLOBAL_SCOPE = 'all'
+
+def week_scope(day=None):
+    """Область недельного рейтинга, например 'week:2026-W42'"""
+    year, week, _ = (day or date.today()).isocalendar()
+    return f'week:{year}-W{week:02d}'
+
+def category_scope(category):
+    """Область рейтинга по категории викторины"""
+    return f'cat:{category}'
+
+def quiz_scopes(category, day=None):
+    """Все области, в которые засчитывается результат викторины"""
+    scopes = [GLOBAL_SCOPE, week_scope(day)]
+    if category:
+        scopes.append(category_scope(category))
+    return scopes
+
+class Ranking:
+    """Одна область рейтинга: ключи (-очки, user_id) по возрастанию"""
+
+    def __init__(self, rows=()):
+        self.points = {}
+        self.names = {}
+        self.keys = []
+        for row in rows:
+            self.points[row['user_id']] = row['points']
+            self.names[row['user_id']] = row['user_name']
+            self.keys.append((-row['points'], row['user_id']))
+        self.keys.sort()
+
+    def add(self, user_id, delta, user_name=None):
+        """Начисление очков с сохранением порядка"""
+        self.set(user_id, self.points.get(user_id, 0) + delta, user_name)
+
+    def set(self, user_id, points, user_name=None):
+        """Новое значение очков пользователя с сохранением порядка"""
+        old = self.points.get(user_id)
+        if old is not None:
+            index = bisect_left(self.keys, (-old, user_id))
+            del self.keys[index]
+        self.points[user_id] = points
+        if user_name:
+            self.names[user_id] = user_name
+        insort(self.keys, (-points, user_id))
+
+    def update(self, rows):
+        """Новые значения очков для многих пользователей (строки из базы):
+        изменённые ключи сливаются с остальными за один проход, O(n + k log k)"""
+        if len(rows) == 1:
+            row = rows[0]
+            self.set(row['user_id'], row['points'], row['user_name'])
+            return
+        changed = {}
+        for row in rows:
+            changed[row['user_id']] = row['points']
+            if row['user_name']:
+                self.names[row['user_id']] = row['user_name']
+        kept = [key for key in self.keys if key[1] not in changed]
+        self.points.update(changed)
+        fresh = sorted((-points, user_id) for user_id, points in changed.items())
+        self.keys = list(heapq.merge(kept, fresh))
+
+    def rank(self, user_id):
+        """Место пользователя (1 — лучший) или None; при равенстве очков место общее"""
+        points = self.points.get(user_id)
+        if points is None:
+            return None
+        return bisect_left(self.keys, (-points,)) + 1
+
+    def top(self, limit=10):
+        """Первые limit участников: [(место, user_id, имя, очки)]"""
+        result = []
+        for negative, user_id in self.keys[:limit]:
+            result.append((self.rank(user_id), user_id, self.names.get(user_id), -negative))
+        return result
+
+    def __len__(self):
+        return len(self.keys)
+
+class Leaderboard:
+    """Набор областей рейтинга, загружаемых из базы при первом обращении"""
+
+    def __init__(self):
+        self._rankings = {}
+        self._lock = threading.Lock()
+        # Последняя известная версия рейтинга в базе (None — база только у нас)
+        self._version = None
+
+    def _ranking(self, scope):
+        ranking = self._rankings.get(scope)
+        if ranking is None:
+            if scope.startswith('week:'):
+                # Прошлые недели больше не нужны в памяти
+                for stale in [s for s in self._rankings if s.startswith('week:')]:
+                    del self._rankings[stale]
+            ranking = self._rankings[scope] = Ranking(database.get_leaderboard_rows(scope))
+        return ranking
+
+    def record_quiz(self, user_id, user_name, score, total, category=None):
+        """Сохранение результата викторины и обновление всех её областей"""
+        scopes = quiz_scopes(category)
+        with self._lock:
+            version = database.save_quiz_result(user_id, score, total, category, user_name, scopes)
+            if self._version is not None and version != self._version + 1:
+                # Между нашими записями рейтинг менял другой процесс: дочитываем
+                # изменения (вместе с нашей записью)
+                self._replay(self._version)
+            else:
+                for scope in scopes:
+                    ranking = self._rankings.get(scope)
+                    if ranking is not None:
+                        ranking.add(user_id, score, user_name)
+            if self._version is not None:
+                self._version = version
+
+    def _replay(self, after_version):
+        """Изменённые после after_version строки загруженных областей"""
+        changes = {}
+        for row in database.get_leaderboard_changes(after_version, list(self._rankings)):
+            changes.setdefault(row['scope'], []).append(row)
+        for scope, rows in changes.items():
+            self._rankings[scope].update(rows)
+
+    def sync(self, version, reset=0):
+        """Сверка с версией рейтинга в базе (несколько процессов): чужие
+        изменения дочитываются в загруженные области. После восстановления
+        снимка (reset — версия восстановления) области перечитываются целиком"""
+        with self._lock:
+            if version == self._version:
+                return
+            if self._version is None or version < self._version or reset > self._version:
+                self._rankings.clear()
+            else:
+                self._replay(self._version)
+            self._version = version
+
+    def top(self, scope=GLOBAL_SCOPE, limit=10):
+        with self._lock:
+            return self._ranking(scope).top(limit)
+
+    def rank(self, user_id, scope=GLOBAL_SCOPE):
+        """(место, очки, всего участников) или None, если пользователь не участвовал"""
+        with self._lock:
+            ranking = self._ranking(scope)
+            place = ranking.rank(user_id)
+            if place is None:
+                return None
+            return place, ranking.points[user_id], len(ranking)
+
+leaderboard = Leaderboard()
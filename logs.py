@@ -0,0 +1,116 @@
+# logs.py
+# Структурированное JSON-логирование через очередь (запись в файл — в отдельном потоке)
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import time
+
+import metrics
+from config import LOG_FILE, LOG_LEVEL, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_QUEUE_SIZE, LOG_SAMPLE_RATES
+
+logger = logging.getLogger('webtech')
+
+DROPPED = metrics.counter(
+    'webtech_log_dropped_total', 'Записи журнала, отброшенные из-за переполнения очереди')
+metrics.gauge('webtech_log_queue_depth', 'Записи журнала в очереди на запись',
+              function=lambda: _queue.qsize() if _queue is not None else 0)
+
+_queue = None
+_listener = None
+
+_traceback_formatter = logging.Formatter()
+
+# Стандартные атрибуты LogRecord, которые не нужно дублировать в JSON
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+class JsonFormatter(logging.Formatter):
+    """Одна строка JSON на запись"""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created))
+                  + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith('_'):
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который не блокирует поток при переполненной очереди"""
+
+    def prepare(self, record):
+        # Форматирование JSON остаётся потоку записи; здесь только то,
+        # что нельзя отложить: подстановка аргументов и текст трассировки
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED.inc()
+
+def setup_logging(filename=LOG_FILE):
+    """Настройка конвейера: логгер -> очередь -> поток записи -> файл с ротацией"""
+    global _queue, _listener
+    if _listener is not None:
+        return
+
+    _queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        filename, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    file_handler.setFormatter(JsonFormatter())
+
+    _listener = logging.handlers.QueueListener(_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+
+    logger.handlers.clear()
+    logger.addHandler(DroppingQueueHandler(_queue))
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+    atexit.register(shutdown_logging)
+
+def shutdown_logging():
+    """Дописать очередь и остановить поток записи"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def log_event(event, level=logging.INFO, **fields):
+    """Структурированное событие; частые события прореживаются по LOG_SAMPLE_RATES"""
+    if not logger.isEnabledFor(level):
+        return
+    rate = LOG_SAMPLE_RATES.get(event, 1.0)
+    if rate < 1.0:
+        if random.random() >= rate:
+            return
+        fields['sample_rate'] = rate
+    fields['event'] = event
+    logger.log(level, event, extra=fields)
+
+def log_error(event, error, **fields):
+    """Ошибка с трассировкой стека (не прореживается)"""
+    fields['event'] = event
+    fields['error'] = f"{type(error).__name__}: {error}"
+    logger.error(event, exc_info=error, extra=fields)
@@ -0,0 +1,130 @@
+# maintenance.py
+# Обслуживание базы: свёртка старых викторин в дневные итоги, удаление данных
+# за пределами сроков хранения, возврат свободных страниц и статистика планировщика
+#
+# Работа идёт короткими шагами (порция строк — одна транзакция) с паузой между
+# ними, весь проход ограничен MAINTENANCE_BUDGET секундами. Блокировка записи
+# не держится дольше одного шага, обработчики её почти не ждут.
+#
+# Разовый перевод базы, созданной до auto_vacuum, на пошаговую очистку:
+#   python maintenance.py vacuum
+
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+import database
+import logs
+import metrics
+from leaderboard import week_scope
+from config import (
+    MAINTENANCE_ENABLED, MAINTENANCE_INTERVAL, MAINTENANCE_BUDGET, MAINTENANCE_BATCH,
+    MAINTENANCE_PAUSE, MAINTENANCE_VACUUM_PAGES, MAINTENANCE_ANALYSIS_LIMIT,
+    QUIZ_RAW_RETENTION_DAYS, QUIZ_DAILY_RETENTION_DAYS, BLOCKED_USER_RETENTION_DAYS,
+    LEADERBOARD_WEEK_RETENTION
+)
+
+# Таблицы, для которых обновляется статистика планировщика
+ANALYZE_TABLES = ('quiz_results', 'quiz_daily', 'user_progress', 'users', 'concepts', 'leaderboard')
+
+PROCESSED = metrics.counter(
+    'webtech_maintenance_items_total', 'Строки (страницы), обработанные обслуживанием', ['task'])
+STEP_SECONDS = metrics.histogram(
+    'webtech_maintenance_step_seconds', 'Длительность одного шага обслуживания', ['task'])
+
+class Maintenance:
+    """Периодический проход обслуживания в фоновом потоке"""
+
+    def __init__(self):
+        self.running = threading.Lock()
+        self.stopping = False
+        self.last_report = None
+
+    def start(self):
+        """Поток расписания: первый проход вскоре после запуска"""
+        if MAINTENANCE_ENABLED:
+            threading.Thread(target=self._schedule, name='maintenance', daemon=True).start()
+
+    def _schedule(self):
+        next_run = time.monotonic() + 60
+        while not self.stopping:
+            if time.monotonic() >= next_run:
+                try:
+                    self.run()
+                except Exception as e:
+                    logs.log_error('maintenance_error', e)
+                next_run = time.monotonic() + MAINTENANCE_INTERVAL
+            time.sleep(30)
+
+    def _tasks(self):
+        """Задачи прохода по порядку: (имя, шаг); шаг возвращает 0, когда работы нет"""
+        tasks = [('rollup', lambda: database.rollup_quiz_results(QUIZ_RAW_RETENTION_DAYS, MAINTENANCE_BATCH))]
+        if QUIZ_DAILY_RETENTION_DAYS:
+            tasks.append(('prune_daily', lambda: database.prune_quiz_daily(QUIZ_DAILY_RETENTION_DAYS, MAINTENANCE_BATCH)))
+        tasks.append(('prune_progress', lambda: database.prune_user_progress(BLOCKED_USER_RETENTION_DAYS, MAINTENANCE_BATCH)))
+        if LEADERBOARD_WEEK_RETENTION:
+            # Рейтинг показывает только текущую неделю
+            oldest = week_scope(date.today() - timedelta(weeks=LEADERBOARD_WEEK_RETENTION))
+            tasks.append(('prune_weeks', lambda: database.prune_leaderboard_weeks(oldest, MAINTENANCE_BATCH)))
+        # Очистка файла — после удалений, иначе освобождённые ими страницы ждут следующего прохода
+        tasks.append(('vacuum', lambda: database.incremental_vacuum(MAINTENANCE_VACUUM_PAGES)))
+
+        tables = iter(ANALYZE_TABLES)
+        def analyze():
+            table = next(tables, None)
+            if table is None:
+                return 0
+            database.analyze_table(table, MAINTENANCE_ANALYSIS_LIMIT)
+            return 1
+        tasks.append(('analyze', analyze))
+        return tasks
+
+    def run(self, budget=MAINTENANCE_BUDGET):
+        """Один проход: {задача: обработано}. None, если проход уже идёт"""
+        if not self.running.acquire(blocking=False):
+            return None
+        try:
+            started = time.monotonic()
+            deadline = started + budget
+            report = {}
+            complete = True
+            for task, step in self._tasks():
+                report[task] = 0
+                while True:
+                    if self.stopping or time.monotonic() >= deadline:
+                        complete = False
+                        break
+                    step_started = time.perf_counter()
+                    done = step()
+                    STEP_SECONDS.labels(task).observe(time.perf_counter() - step_started)
+                    if not done:
+                        break
+                    report[task] += done
+                    PROCESSED.labels(task).inc(done)
+                    time.sleep(MAINTENANCE_PAUSE)
+                if not complete:
+                    break
+
+            logs.log_event('maintenance_finished', complete=complete,
+                           seconds=round(time.monotonic() - started, 2), **report)
+            self.last_report = dict(report, complete=complete)
+            return self.last_report
+        finally:
+            self.running.release()
+
+    def stop(self):
+        self.stopping = True
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == 'vacuum':
+        before = database.get_storage_stats()
+        database.vacuum()
+        after = database.get_storage_stats()
+        print(f"✓ VACUUM: {before['page_count']} -> {after['page_count']} страниц, "
+              f"auto_vacuum={after['auto_vacuum']}")
+    elif len(sys.argv) >= 2 and sys.argv[1] == 'run':
+        database.init_database()
+        print(Maintenance().run(budget=float(sys.argv[2]) if len(sys.argv) > 2 else MAINTENANCE_BUDGET))
+    else:
+        print("Использование: python maintenance.py vacuum | run [секунд]")
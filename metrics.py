@@ -0,0 +1,252 @@
+# metrics.py
+# Лёгкие метрики в текстовом формате Prometheus (только стандартная библиотека)
+
+import functools
+import threading
+import time
+from bisect import bisect_left
+
+# Границы корзин гистограмм по умолчанию (секунды)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Все зарегистрированные метрики в порядке создания
+_registry = []
+_registry_lock = threading.Lock()
+
+def _escape(value):
+    """Экранирование значения метки"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=None):
+    """Форматирование набора меток {a="1",b="2"}"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    """Форматирование числа для Prometheus"""
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+class _Metric:
+    """Базовый класс метрики с набором меток"""
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """Дочерняя метрика для конкретных значений меток"""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _default(self):
+        """Метрика без меток"""
+        return self.labels()
+
+    def collect(self):
+        """Строки текстового формата для этой метрики"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for values, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+class _CounterChild:
+    __slots__ = ('_value', '_lock')
+
+    def __init__(self, lock):
+        self._value = 0.0
+        self._lock = lock
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def render(self, name, labelnames, values):
+        return [f'{name}{_format_labels(labelnames, values)} {_format_value(self._value)}']
+
+class Counter(_Metric):
+    """Монотонно растущий счётчик"""
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild(self._lock)
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+class _GaugeChild:
+    __slots__ = ('_value', '_lock', '_function')
+
+    def __init__(self, lock):
+        self._value = 0.0
+        self._lock = lock
+        self._function = None
+
+    def set(self, value):
+        self._value = float(value)
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        """Значение вычисляется при каждом сборе метрик"""
+        self._function = function
+
+    def value(self):
+        if self._function is not None:
+            try:
+                return float(self._function())
+            except Exception:
+                return float('nan')
+        return self._value
+
+    def render(self, name, labelnames, values):
+        return [f'{name}{_format_labels(labelnames, values)} {_format_value(self.value())}']
+
+class Gauge(_Metric):
+    """Произвольное значение, которое может расти и убывать"""
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild(self._lock)
+
+    def set(self, value):
+        self._default().set(value)
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def dec(self, amount=1):
+        self._default().dec(amount)
+
+    def set_function(self, function):
+        self._default().set_function(function)
+
+class _HistogramChild:
+    __slots__ = ('_bounds', '_counts', '_sum', '_lock')
+
+    def __init__(self, bounds, lock):
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)
+        self._sum = 0.0
+        self._lock = lock
+
+    def observe(self, value):
+        index = bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def render(self, name, labelnames, values):
+        lines = []
+        with self._lock:
+            counts = list(self._counts)
+            total_sum = self._sum
+        cumulative = 0
+        for bound, count in zip(self._bounds + (float('inf'),), counts):
+            cumulative += count
+            le = 'le="' + _format_value(float(bound)) + '"'
+            lines.append(f'{name}_bucket{_format_labels(labelnames, values, le)} {cumulative}')
+        labels = _format_labels(labelnames, values)
+        lines.append(f'{name}_sum{labels} {_format_value(total_sum)}')
+        lines.append(f'{name}_count{labels} {cumulative}')
+        return lines
+
+class Histogram(_Metric):
+    """Распределение значений по корзинам"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets, self._lock)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+# =============================================================================
+# РЕГИСТРАЦИЯ
+# =============================================================================
+
+def _register(metric):
+    with _registry_lock:
+        for existing in _registry:
+            if existing.name == metric.name:
+                return existing
+        _registry.append(metric)
+    return metric
+
+def counter(name, documentation, labelnames=()):
+    """Создание (или получение существующего) счётчика"""
+    return _register(Counter(name, documentation, labelnames))
+
+def gauge(name, documentation, labelnames=(), function=None):
+    """Создание (или получение существующего) показателя"""
+    metric = _register(Gauge(name, documentation, labelnames))
+    if function is not None:
+        metric.set_function(function)
+    return metric
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    """Создание (или получение существующей) гистограммы"""
+    return _register(Histogram(name, documentation, labelnames, buckets))
+
+def render():
+    """Все метрики в текстовом формате Prometheus"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.collect())
+    return '\n'.join(lines) + '\n'
+
+# =============================================================================
+# ИНСТРУМЕНТАЦИЯ
+# =============================================================================
+
+def instrument(latency, errors=None):
+    """Декоратор: время выполнения функции в гистограмму latency,
+    исключения — в счётчик errors (метка — имя функции)"""
+    def decorator(func):
+        observe = latency.labels(func.__name__).observe
+        failed = errors.labels(func.__name__) if errors is not None else None
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                if failed is not None:
+                    failed.inc()
+                raise
+            finally:
+                observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+START_TIME = gauge('webtech_process_start_time_seconds', 'Время запуска процесса (unix time)')
+START_TIME.set(time.time())
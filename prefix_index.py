@@ -0,0 +1,106 @@
+# prefix_index.py
+# Индекс префиксов терминов для inline-режима: отсортированный список + bisect
+#
+# Каждое слово термина даёт ключ (нормализованный хвост термина с этого слова),
+# поэтому "api" находит и "API", и "REST API". Поиск — O(log n + k) без SQL.
+
+import threading
+from bisect import bisect_left
+
+import database
+
+_PUNCTUATION = '([{"\'«-'
+
+def normalize(text):
+    """Ключ поиска: без учёта регистра (латиница и кириллица), ё = е"""
+    return ' '.join(text.casefold().replace('ё', 'е').split())
+
+class PrefixIndex:
+    """Неизменяемый снимок каталога; при изменениях собирается заново и подменяется"""
+
+    def __init__(self, concepts=()):
+        self.concepts = {}
+        entries = []
+        for concept in concepts:
+            self.concepts[concept['id']] = concept
+            words = normalize(concept['term']).split(' ')
+            for i in range(len(words)):
+                # "(dict)" ищется по "dict"
+                key = ' '.join(words[i:]) if i == 0 else ' '.join(words[i:]).lstrip(_PUNCTUATION)
+                if key:
+                    entries.append((key, i, concept['id']))
+        # Совпадения с начала термина (i = 0) идут раньше совпадений по слову
+        entries.sort()
+        self.keys = [key for key, _, _ in entries]
+        self.entries = entries
+
+    def search(self, prefix, limit=20, offset=0):
+        """Понятия, у которых термин или слово термина начинается с prefix"""
+        prefix = normalize(prefix)
+        start = bisect_left(self.keys, prefix)
+        found = []
+        seen = set()
+        for index in range(start, len(self.keys)):
+            if not self.keys[index].startswith(prefix):
+                break
+            _, position, concept_id = self.entries[index]
+            # Пустой запрос — весь каталог по алфавиту, без повторов по словам
+            if concept_id in seen or (not prefix and position):
+                continue
+            seen.add(concept_id)
+            if len(seen) > offset:
+                found.append(self.concepts[concept_id])
+                if len(found) >= limit:
+                    break
+        return found
+
+    def __len__(self):
+        return len(self.concepts)
+
+_index = PrefixIndex()
+_version = None
+_lock = threading.Lock()
+# Фоновая пересборка после изменения каталога (не больше одной одновременно)
+_builder = None
+_builder_lock = threading.Lock()
+
+def rebuild(version=None):
+    """Сборка индекса из таблицы concepts; до подмены поиск идёт по старому индексу"""
+    global _index, _version
+    with _lock:
+        if version is None:
+            version = database.catalog_version
+        # Записи Concept неизменяемы — индекс хранит их без копирования
+        index = PrefixIndex(database.get_all_concepts())
+        _index, _version = index, version
+
+def search(prefix, limit=20, offset=0):
+    """Поиск по текущему индексу (собирается при первом обращении)"""
+    if _version is None:
+        rebuild()
+    return _index.search(prefix, limit, offset)
+
+def _rebuild_in_background():
+    """Пересборка до текущей версии каталога; изменения во время сборки
+    объединяются в одну следующую сборку"""
+    global _builder
+    while True:
+        rebuild(database.catalog_version)
+        with _builder_lock:
+            if _version == database.catalog_version:
+                _builder = None
+                return
+
+def _on_catalog_change(version):
+    # Пока индекс ни разу не понадобился, собирать его незачем; обработчик
+    # администратора не ждёт сборки, inline-поиск идёт по старому индексу
+    global _builder
+    if _version is None or version == _version:
+        return
+    with _builder_lock:
+        if _builder is None:
+            _builder = threading.Thread(
+                target=_rebuild_in_background, name='prefix-index', daemon=True)
+            _builder.start()
+
+database.add_catalog_listener(_on_catalog_change)
@@ -0,0 +1,79 @@
+# ratelimit.py
+# Ограничение частоты действий пользователя: «ведро с токенами» на пару (действие, пользователь)
+#
+# Ведро пополняется со скоростью rate токенов в секунду до burst. Полное ведро
+# ничем не отличается от отсутствующего, поэтому такие вёдра периодически
+# удаляются — память занимают только недавно активные пользователи.
+
+import threading
+import time
+
+import metrics
+
+LIMITED = metrics.counter(
+    'webtech_rate_limited_total', 'Действия, отклонённые ограничением частоты', ['action'])
+BUCKETS = metrics.gauge('webtech_rate_limit_buckets', 'Активные вёдра ограничения частоты')
+
+# Как часто искать простаивающие вёдра (секунд)
+_SWEEP_INTERVAL = 60
+
+class Bucket:
+    __slots__ = ('tokens', 'stamp', 'warned')
+
+    def __init__(self, tokens, stamp):
+        self.tokens = tokens
+        self.stamp = stamp
+        self.warned = False
+
+class RateLimiter:
+    """Набор политик {действие: (токенов в секунду, размер ведра)}"""
+
+    def __init__(self, policies):
+        self.policies = dict(policies)
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._next_sweep = time.monotonic() + _SWEEP_INTERVAL
+        BUCKETS.set_function(lambda: len(self._buckets))
+
+    def check(self, action, user_id):
+        """Разрешено ли действие: (разрешено, первый_отказ).
+        Первый отказ подряд можно сопроводить сообщением, остальные — молча отбросить"""
+        policy = self.policies.get(action)
+        if policy is None:
+            return True, False
+        rate, burst = policy
+        now = time.monotonic()
+
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            key = (action, user_id)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = Bucket(burst, now)
+            else:
+                bucket.tokens = min(burst, bucket.tokens + (now - bucket.stamp) * rate)
+                bucket.stamp = now
+
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                bucket.warned = False
+                return True, False
+
+            first = not bucket.warned
+            bucket.warned = True
+        LIMITED.labels(action).inc()
+        return False, first
+
+    def _sweep(self, now):
+        """Удаление вёдер, которые уже успели наполниться (под блокировкой)"""
+        idle = [
+            key for key, bucket in self._buckets.items()
+            if bucket.tokens + (now - bucket.stamp) * self.policies[key[0]][0] >= self.policies[key[0]][1]
+        ]
+        for key in idle:
+            del self._buckets[key]
+        self._next_sweep = now + _SWEEP_INTERVAL
+
+    def __len__(self):
+        return len(self._buckets)
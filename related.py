@@ -0,0 +1,232 @@
+# related.py
+# Похожие понятия: TF-IDF по термину, определению и примеру и заранее
+# посчитанные RELATED_TOP ближайших соседей каждого понятия в таблице
+# related_concepts. Карточка читает соседей по первичному ключу — сходство
+# во время запроса не считается.
+#
+# Векторы разреженные (CSR на массивах NumPy), сходство считается через
+# обратный индекс блоками строк по самым весомым словам каждого понятия.
+# После изменений каталога пересчитываются только затронутые понятия:
+# изменённые, ссылавшиеся на изменённые или удалённые и те, в чей список
+# изменённое понятие теперь попадает.
+
+import re
+import time
+from array import array
+from collections import Counter
+
+import numpy as np
+
+import database
+import logs
+import metrics
+from prefix_index import normalize
+from config import (
+    RELATED_TOP, RELATED_TERM_WEIGHT, RELATED_MAX_DF, RELATED_QUERY_TERMS, RELATED_MAX_PAIRS,
+    RELATED_FULL_REBUILD_SHARE, RELATED_CHECK_INTERVAL
+)
+
+BUILD_SECONDS = metrics.histogram(
+    'webtech_related_build_seconds', 'Пересчёт похожих понятий', ['mode'])
+RECOMPUTED = metrics.counter(
+    'webtech_related_recomputed_total', 'Понятия, для которых пересчитаны соседи')
+
+_WORD = re.compile(r'\w{2,}')
+
+def tokenize(text):
+    """Слова от двух букв без учёта регистра (ё = е)"""
+    return _WORD.findall(normalize(text))
+
+class Vectors:
+    """TF-IDF векторы понятий с единичной длиной: строки (CSR), слова запроса и обратные индексы"""
+
+    def __init__(self, concepts):
+        self.ids = np.array([c[0] for c in concepts], dtype=np.int64)
+        vocabulary = {}
+        # Массивы array вместо списков: миллионы чисел без объектов Python
+        indptr = array('q', [0])
+        indices = array('q')
+        counts = array('q')
+        for _, term, definition, example, _ in concepts:
+            # Слова термина весят больше: «CSS Grid» ближе к «CSS», чем к тексту про сетки
+            tokens = tokenize(term) * RELATED_TERM_WEIGHT + tokenize(definition) + tokenize(example)
+            bag = Counter(vocabulary.setdefault(token, len(vocabulary)) for token in tokens)
+            indices.extend(bag.keys())
+            counts.extend(bag.values())
+            indptr.append(len(indices))
+
+        n = len(concepts)
+        indices = np.array(indices, dtype=np.int64)
+        tf = np.array(counts, dtype=np.float64)
+        rows = np.repeat(np.arange(n), np.diff(np.frombuffer(indptr, dtype=np.int64)))
+        df = np.bincount(indices, minlength=len(vocabulary))
+
+        # Слишком частые слова почти ничего не различают, а обходить их дороже всего
+        keep = df[indices] <= max(RELATED_MAX_DF * n, 2)
+        indices, tf, rows = indices[keep], tf[keep], rows[keep]
+        data = (1 + np.log(tf)) * (np.log((1 + n) / (1 + df[indices])) + 1)
+        norms = np.sqrt(np.bincount(rows, weights=data * data, minlength=n))
+        data /= norms[rows]
+
+        self.n = n
+        self.indices = indices
+        self.data = data
+        self.indptr = _pointers(rows, n)
+        self.postings = _postings(rows, indices, data, len(vocabulary))
+
+        # Запрос — только RELATED_QUERY_TERMS самых весомых (редких) слов строки:
+        # списки понятий у них короткие, а на сходство они влияют сильнее всего
+        order = np.lexsort((-data, rows))
+        rank = np.arange(rows.size) - self.indptr[rows[order]]
+        top = order[rank < RELATED_QUERY_TERMS]
+        top.sort()
+        self.query = (_pointers(rows[top], n), indices[top], data[top])
+        self.query_postings = _postings(rows[top], indices[top], data[top], len(vocabulary))
+
+    def similar(self, targets, reverse=False):
+        """Ненулевое сходство строк targets с остальными понятиями:
+        (номер в targets, строка понятия, сходство). Сходство считается по словам
+        запроса той строки, что ищет соседей; reverse — оценки, которые targets
+        получают от остальных понятий"""
+        if reverse:
+            rows_of, postings = (self.indptr, self.indices, self.data), self.query_postings
+        else:
+            rows_of, postings = self.query, self.postings
+        indptr, indices, data = rows_of
+        posting_rows, posting_data, colptr = postings
+
+        lengths = indptr[targets + 1] - indptr[targets]
+        entries = _ranges(indptr[targets], lengths)
+        owners = np.repeat(np.arange(targets.size), lengths)
+        terms = indices[entries]
+        posting_lengths = colptr[terms + 1] - colptr[terms]
+        found = _ranges(colptr[terms], posting_lengths)
+
+        # Вклады всех общих слов суммируются по парам (target, понятие). Вклад
+        # (не больше 1) в младших битах ключа: сортируется один массив int64
+        keys = np.repeat(owners, posting_lengths) * self.n + posting_rows[found]
+        weights = np.repeat(data[entries], posting_lengths) * posting_data[found]
+        shift = 63 - (targets.size * self.n).bit_length()
+        scale = (1 << shift) - 1
+        packed = np.sort((keys << shift) | (weights * scale).astype(np.int64))
+        keys = packed >> shift
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if keys.size else keys
+        scores = np.add.reduceat((packed & scale).astype(np.float64), starts) / scale if keys.size else np.empty(0)
+        owners, rows = keys[starts] // self.n, keys[starts] % self.n
+        other = rows != targets[owners]
+        return owners[other], rows[other], scores[other]
+
+    def work(self, targets, reverse=False):
+        """Число пар (слово, понятие), которые придётся обойти для каждой строки"""
+        indptr, indices, _ = (self.indptr, self.indices, self.data) if reverse else self.query
+        colptr = (self.query_postings if reverse else self.postings)[2]
+        lengths = indptr[targets + 1] - indptr[targets]
+        terms = indices[_ranges(indptr[targets], lengths)]
+        per_entry = colptr[terms + 1] - colptr[terms]
+        return np.bincount(np.repeat(np.arange(targets.size), lengths),
+                           weights=per_entry, minlength=targets.size)
+
+def _pointers(rows, n):
+    """Начала строк в массивах, упорядоченных по строке"""
+    return np.r_[0, np.cumsum(np.bincount(rows, minlength=n))]
+
+def _postings(rows, indices, data, words):
+    """Обратный индекс: для каждого слова — понятия и веса"""
+    order = np.argsort(indices, kind='stable')
+    return rows[order], data[order], _pointers(indices, words)
+
+def _ranges(starts, lengths):
+    """Сцепленные диапазоны [start, start + length) одним массивом"""
+    offsets = np.repeat(starts - np.r_[0, np.cumsum(lengths)[:-1]], lengths)
+    return offsets + np.arange(int(lengths.sum()))
+
+def _blocks(vectors, targets, reverse=False):
+    """Строки порциями, в каждой не больше RELATED_MAX_PAIRS пар для обхода"""
+    if targets.size == 0:
+        return
+    block_of = (np.cumsum(vectors.work(targets, reverse)) // RELATED_MAX_PAIRS).astype(np.int64)
+    bounds = np.flatnonzero(np.r_[True, block_of[1:] != block_of[:-1], True])
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        yield targets[start:end]
+
+def nearest(vectors, targets, k=RELATED_TOP):
+    """{concept_id: [(related_id, сходство)]} — k ближайших для строк targets"""
+    result = {int(vectors.ids[row]): [] for row in targets}
+    for block in _blocks(vectors, targets):
+        owners, rows, scores = vectors.similar(block)
+        # По каждой строке — первые k по убыванию сходства (сходство не больше 1,
+        # один ключ сортировки вместо lexsort)
+        order = np.argsort(owners * 4.0 - scores)
+        owners, rows, scores = owners[order], rows[order], scores[order]
+        starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]]) if owners.size else owners
+        rank = np.arange(owners.size) - np.repeat(starts, np.diff(np.r_[starts, owners.size]))
+        top = rank < k
+        for owner, row, score in zip(owners[top], rows[top], scores[top]):
+            result[int(vectors.ids[block[owner]])].append((int(vectors.ids[row]), round(float(score), 4)))
+    return result
+
+def _affected(vectors, changed, summary, k):
+    """Строки, в чей список из k соседей изменённые понятия теперь попадают"""
+    if changed.size == 0:
+        return np.empty(0, dtype=np.int64)
+    # Порог строки — сходство её k-го соседа; у неполного списка порог 0
+    threshold = np.array([lowest if count >= k else 0.0
+                          for count, lowest in (summary.get(int(concept_id), (0, 0.0))
+                                                for concept_id in vectors.ids)])
+    found = []
+    for block in _blocks(vectors, changed, reverse=True):
+        _, rows, scores = vectors.similar(block, reverse=True)
+        found.append(rows[scores > threshold[rows]])
+    return np.unique(np.concatenate(found))
+
+def refresh(full=False):
+    """Пересчёт после изменений каталога: None, если индекс уже актуален,
+    иначе {'mode', 'recomputed', 'removed', 'seconds'}"""
+    versions = database.get_versions()
+    version = versions.get('catalog_version', 0)
+    built_at = versions.get('related_built_at', 0)
+    if not full and built_at and versions.get('related_version') == version:
+        return None
+
+    started = time.perf_counter()
+    now, concepts = database.get_concepts_for_index()
+    vectors = Vectors(concepts)
+    summary = database.get_related_summary()
+    current = set(vectors.ids.tolist())
+    removed = [concept_id for concept_id in summary if concept_id not in current]
+    changed = np.flatnonzero(np.array([c[4] >= built_at for c in concepts], dtype=bool))
+
+    # Непересчитанные строки остаются с прежними весами слов (IDF); при большой
+    # доле изменений расхождение заметно, и индекс собирается заново
+    full = (full or not built_at
+            or changed.size + len(removed) > RELATED_FULL_REBUILD_SHARE * max(vectors.n, 1))
+    if full:
+        targets = np.arange(vectors.n)
+    else:
+        position = {int(concept_id): row for row, concept_id in enumerate(vectors.ids)}
+        referencing = database.get_related_referencing(removed + vectors.ids[changed].tolist())
+        targets = np.union1d(
+            np.union1d(changed, [position[c] for c in referencing if c in position]),
+            _affected(vectors, changed, summary, RELATED_TOP)
+        ).astype(np.int64)
+
+    neighbours = nearest(vectors, targets)
+    database.save_related(neighbours, removed, version, now)
+
+    duration = time.perf_counter() - started
+    mode = 'full' if full else 'incremental'
+    BUILD_SECONDS.labels(mode).observe(duration)
+    RECOMPUTED.inc(len(neighbours))
+    result = {'mode': mode, 'recomputed': len(neighbours), 'removed': len(removed),
+              'seconds': round(duration, 3)}
+    logs.log_event('related_refreshed', **result)
+    return result
+
+def run_forever():
+    """Проверка версии каталога каждые RELATED_CHECK_INTERVAL секунд (фоновый поток)"""
+    while True:
+        try:
+            refresh()
+        except Exception as e:
+            logs.log_error('related_refresh_failed', e)
+        time.sleep(RELATED_CHECK_INTERVAL)
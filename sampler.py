@@ -0,0 +1,65 @@
+# sampler.py
+# Взвешенный случайный выбор по накопленным весам (бинарный поиск, O(log n) на выбор)
+
+import random
+from bisect import bisect_right
+from itertools import accumulate
+
+class WeightedSampler:
+    """Выбор элемента с вероятностью, пропорциональной его весу"""
+
+    def __init__(self, items, weights):
+        self.items = list(items)
+        self.cumulative = list(accumulate(weights))
+        self.total = self.cumulative[-1] if self.cumulative else 0
+
+    def pick_index(self, rng=random):
+        """Номер элемента, O(log n)"""
+        index = bisect_right(self.cumulative, rng.random() * self.total)
+        return min(index, len(self.items) - 1)
+
+    def pick(self, rng=random):
+        """Один элемент, O(log n)"""
+        return self.items[self.pick_index(rng)]
+
+    def weight(self, index):
+        return self.cumulative[index] - (self.cumulative[index - 1] if index else 0)
+
+    def _corrected(self, corrections, rng):
+        """Выбор номера с весами weight(i) + corrections[i] в два этапа: с долей
+        положительных добавок — из них, иначе из основы; отрицательная добавка —
+        отбором (итоговый вес должен оставаться больше нуля)"""
+        positive = [(index, delta) for index, delta in corrections.items() if delta > 0]
+        extra = WeightedSampler([index for index, _ in positive], [delta for _, delta in positive])
+
+        def draw():
+            while True:
+                if extra.total and rng.random() * (self.total + extra.total) >= self.total:
+                    return extra.pick(rng)
+                index = self.pick_index(rng)
+                delta = corrections.get(index, 0)
+                if delta >= 0:
+                    return index
+                weight = self.weight(index)
+                if rng.random() * weight < weight + delta:
+                    return index
+        return draw
+
+    def sample(self, k, rng=random, corrections=None):
+        """k различных элементов (повторные попадания отбрасываются).
+        corrections — {номер: добавка к весу} для немногих элементов: накопленные
+        веса не пересчитываются, выбор стоит O(len(corrections) + k log n)"""
+        k = min(k, len(self.items))
+        draw = self._corrected(corrections, rng) if corrections else lambda: self.pick_index(rng)
+        chosen = {}
+        # При сильно неравных весах добор равномерно, чтобы не крутиться долго
+        for _ in range(k * 20):
+            if len(chosen) >= k:
+                break
+            index = draw()
+            chosen.setdefault(index, self.items[index])
+        if len(chosen) < k:
+            rest = [index for index in range(len(self.items)) if index not in chosen]
+            for index in rng.sample(rest, k - len(chosen)):
+                chosen[index] = self.items[index]
+        return list(chosen.values())
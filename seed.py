@@ -0,0 +1,136 @@
+# seed.py
+# Начальный набор понятий и снимок базы для быстрого первого запуска
+#
+# Снимок собирается при сборке образа:
+#   python seed.py build
+
+import os
+import shutil
+import sys
+import tempfile
+
+import database
+from config import SEED_SNAPSHOT
+
+INITIAL_CONCEPTS = [
+    # ========== ВЕБ-ТЕХНОЛОГИИ ==========
+    ("HTML", "Язык гипертекстовой разметки для создания структуры веб-страниц", "Frontend", "<h1>Заголовок</h1>"),
+    ("CSS", "Каскадные таблицы стилей для оформления веб-страниц", "Frontend", "color: red;"),
+    ("JavaScript", "Язык программирования для интерактивности на веб-страницах", "Frontend", "console.log('Hello');"),
+    ("HTTP", "Протокол передачи гипертекста для обмена данными в вебе", "Backend", "GET /index.html"),
+    ("URL", "Универсальный локатор ресурса - адрес веб-страницы", "General", "https://example.com"),
+    ("DOM", "Объектная модель документа - представление HTML в виде дерева", "Frontend", "document.getElementById()"),
+    ("API", "Интерфейс программирования приложений для взаимодействия сервисов", "Backend", "REST API"),
+    ("JSON", "Текстовый формат обмена данными на основе JavaScript", "Backend", '{"name": "John"}'),
+    ("SQL", "Язык структурированных запросов для работы с базами данных", "Backend", "SELECT * FROM users"),
+    ("Git", "Система контроля версий для отслеживания изменений в коде", "Tools", "git commit -m 'msg'"),
+    ("Responsive Design", "Адаптивный дизайн для разных размеров экранов", "Frontend", "@media (max-width: 768px)"),
+    ("Bootstrap", "Популярный CSS-фреймворк для быстрой разработки", "Frontend", "class='container'"),
+    ("React", "JavaScript-библиотека для создания пользовательских интерфейсов", "Frontend", "<Component />"),
+    ("Node.js", "Среда выполнения JavaScript на стороне сервера", "Backend", "require('express')"),
+    ("Database", "Организованная коллекция структурированной информации", "Backend", "MySQL, PostgreSQL"),
+    ("Server", "Компьютер или программа, предоставляющая услуги клиентам", "Backend", "Web Server"),
+    ("Client", "Программа или устройство, запрашивающее услуги у сервера", "General", "Web Browser"),
+    ("Framework", "Каркас для разработки приложений с готовыми компонентами", "General", "Django, Laravel"),
+    ("Library", "Библиотека готового кода для повторного использования", "General", "jQuery, Lodash"),
+    ("Deployment", "Процесс размещения приложения на сервере для доступа пользователей", "Tools", "CI/CD"),
+    
+    # ========== PYTHON BASICS ==========
+    ("Python", "Высокоуровневый язык программирования общего назначения с простым синтаксисом", "Python Basics", "print('Hello, World!')"),
+    ("Переменная", "Именованная область памяти для хранения данных в программе", "Python Basics", "x = 10"),
+    ("Список (List)", "Упорядоченная изменяемая коллекция элементов в Python", "Python Basics", "my_list = [1, 2, 3]"),
+    ("Кортеж (Tuple)", "Упорядоченная неизменяемая коллекция элементов в Python", "Python Basics", "my_tuple = (1, 2, 3)"),
+    ("Словарь (Dict)", "Коллекция пар ключ-значение для хранения данных", "Python Basics", "my_dict = {'name': 'John'}"),
+    ("Множество (Set)", "Неупорядоченная коллекция уникальных элементов", "Python Basics", "my_set = {1, 2, 3}"),
+    ("Функция", "Именованный блок кода, который можно вызывать многократно", "Python Basics", "def func(): pass"),
+    ("Класс", "Шаблон для создания объектов с атрибутами и методами", "Python Basics", "class MyClass:"),
+    ("Модуль", "Файл с кодом Python, который можно импортировать в другие программы", "Python Basics", "import math"),
+    ("Пакет (Package)", "Каталог с модулями Python и файлом __init__.py", "Python Basics", "import package.module"),
+    ("Исключение", "Объект, представляющий ошибку во время выполнения программы", "Python Basics", "try: ... except:"),
+    ("Декоратор", "Функция, которая модифицирует поведение другой функции", "Python Basics", "@decorator"),
+    ("Генератор", "Функция, которая возвращает итератор с помощью yield", "Python Basics", "yield value"),
+    ("Лямбда-функция", "Анонимная функция, определённая в одном выражении", "Python Basics", "lambda x: x + 1"),
+    ("Метод", "Функция, определённая внутри класса и связанная с объектом", "Python Basics", "obj.method()"),
+    ("Атрибут", "Переменная, принадлежащая объекту или классу", "Python Basics", "obj.attribute"),
+    ("Итератор", "Объект, который позволяет перебирать элементы коллекции", "Python Basics", "iter(), next()"),
+    ("Контекстный менеджер", "Объект для управления ресурсами с помощью with", "Python Basics", "with open('file') as f:"),
+    ("PEP 8", "Соглашение о стиле кода для Python программ", "Python Basics", "import this"),
+    ("Virtual Environment", "Изолированная среда для установки пакетов Python", "Python Basics", "python -m venv env"),
+    
+    # ========== PYTHON LIBRARIES ==========
+    ("NumPy", "Библиотека для научных вычислений и работы с многомерными массивами", "Python Libraries", "import numpy as np"),
+    ("Pandas", "Библиотека для анализа и обработки табличных данных", "Python Libraries", "import pandas as pd"),
+    ("Matplotlib", "Библиотека для построения графиков и визуализации данных", "Python Libraries", "import matplotlib.pyplot as plt"),
+    ("Requests", "Библиотека для отправки HTTP-запросов к API и веб-сервисам", "Python Libraries", "import requests"),
+    ("BeautifulSoup", "Библиотека для парсинга HTML и XML документов", "Python Libraries", "from bs4 import BeautifulSoup"),
+    ("Flask", "Лёгкий веб-фреймворк для создания веб-приложений на Python", "Python Libraries", "from flask import Flask"),
+    ("Django", "Полнофункциональный веб-фреймворк для разработки на Python", "Python Libraries", "django-admin startproject"),
+    ("TensorFlow", "Библиотека машинного обучения от Google для нейросетей", "Python Libraries", "import tensorflow as tf"),
+    ("PyTorch", "Библиотека глубокого обучения с динамическими графами", "Python Libraries", "import torch"),
+    ("Scikit-learn", "Библиотека машинного обучения для классических алгоритмов", "Python Libraries", "from sklearn import model"),
+    ("OpenCV", "Библиотека компьютерного зрения для обработки изображений", "Python Libraries", "import cv2"),
+    ("Pillow", "Библиотека для работы с изображениями в Python", "Python Libraries", "from PIL import Image"),
+    ("SQLAlchemy", "Библиотека для работы с базами данных и ORM", "Python Libraries", "from sqlalchemy import create_engine"),
+    ("PyTest", "Фреймворк для написания и запуска тестов в Python", "Python Libraries", "pytest test_file.py"),
+    ("Logging", "Встроенный модуль для ведения логов в приложениях", "Python Libraries", "import logging"),
+    ("Datetime", "Встроенный модуль для работы с датой и временем", "Python Libraries", "from datetime import datetime"),
+    ("OS", "Встроенный модуль для взаимодействия с операционной системой", "Python Libraries", "import os"),
+    ("Re (Regex)", "Встроенный модуль для работы с регулярными выражениями", "Python Libraries", "import re"),
+    ("Random", "Встроенный модуль для генерации случайных чисел", "Python Libraries", "import random"),
+]
+
+def build_snapshot(path=SEED_SNAPSHOT):
+    """Сборка снимка базы с начальными понятиями"""
+    if os.path.exists(path):
+        os.remove(path)
+    previous = database.DATABASE_NAME
+    database.DATABASE_NAME = path
+    try:
+        database.init_database()
+        database.add_concepts(INITIAL_CONCEPTS)
+        conn = database.get_connection()
+        conn.execute('VACUUM')
+        conn.close()
+    finally:
+        database.DATABASE_NAME = previous
+    return len(INITIAL_CONCEPTS)
+
+def restore_snapshot(snapshot, target):
+    """Копирование снимка на место рабочей базы (атомарно, через временный файл)"""
+    directory = os.path.dirname(os.path.abspath(target))
+    fd, tmp_path = tempfile.mkstemp(prefix='.seed-', dir=directory)
+    os.close(fd)
+    try:
+        shutil.copyfile(snapshot, tmp_path)
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def ensure_database():
+    """Подготовка базы при запуске. Возвращает источник данных:
+    'snapshot' — скопирован снимок, 'seeded' — понятия добавлены заново,
+    'existing' — база уже была заполнена"""
+    target = database.DATABASE_NAME
+    is_new = not os.path.exists(target) or os.path.getsize(target) == 0
+
+    if is_new and os.path.exists(SEED_SNAPSHOT):
+        restore_snapshot(SEED_SNAPSHOT, target)
+        database.init_database()
+        return 'snapshot'
+
+    database.init_database()
+    if database.get_concept_count() == 0:
+        database.add_concepts(INITIAL_CONCEPTS)
+        print(f"✓ Добавлено {len(INITIAL_CONCEPTS)} начальных понятий")
+        return 'seeded'
+    return 'existing'
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == 'build':
+        path = sys.argv[2] if len(sys.argv) > 2 else SEED_SNAPSHOT
+        count = build_snapshot(path)
+        print(f"✓ Снимок {path}: {count} понятий")
+    else:
+        print("Использование: python seed.py build [путь]")
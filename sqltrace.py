@@ -0,0 +1,199 @@
+# sqltrace.py
+# Профилирование SQL-запросов: трассировка, журнал медленных запросов, EXPLAIN QUERY PLAN
+
+import logging
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+import logs
+import metrics
+from config import SQL_TRACE, SLOW_QUERY_MS, SQL_EXPLAIN
+
+# Текущие настройки (можно менять во время работы командой администратора)
+enabled = SQL_TRACE
+explain = SQL_EXPLAIN
+slow_threshold = SLOW_QUERY_MS / 1000
+
+logger = logging.getLogger('webtech.sql')
+
+SLOW_QUERIES = metrics.counter(
+    'webtech_sql_slow_queries_total', 'Запросы дольше порога SLOW_QUERY_MS', ['caller'])
+FULL_SCANS = metrics.counter(
+    'webtech_sql_full_scans_total', 'Запросы с полным просмотром таблицы (по EXPLAIN)', ['caller'])
+
+_WHITESPACE = re.compile(r'\s+')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'WITH')
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+class StatementStats:
+    """Накопленная статистика одного (нормализованного) запроса"""
+    __slots__ = ('sql', 'count', 'total', 'max', 'callers', 'plan', 'full_scan')
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.callers = {}
+        self.plan = None
+        self.full_scan = False
+
+def normalize(sql):
+    """Приведение запроса к общему виду: пробелы и списки IN (?, ?, ...)"""
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    return _IN_LIST.sub('(?…)', sql)
+
+def _ensure_handler():
+    """Журнал медленных запросов пишется в LOG_FILE, если логирование ещё не настроено"""
+    if not logger.hasHandlers():
+        logs.setup_logging()
+
+def enable(flag=True):
+    """Включение/выключение трассировки для новых соединений"""
+    global enabled
+    enabled = flag
+
+def record(conn, sql, parameters, duration, caller):
+    """Учёт выполненного запроса"""
+    key = normalize(sql)
+    with _stats_lock:
+        stats = _stats.get(key)
+        first_seen = stats is None
+        if first_seen:
+            stats = _stats[key] = StatementStats(key)
+        stats.count += 1
+        stats.total += duration
+        if duration > stats.max:
+            stats.max = duration
+        stats.callers[caller] = stats.callers.get(caller, 0) + 1
+
+    if duration >= slow_threshold:
+        SLOW_QUERIES.labels(caller).inc()
+        statement = _WHITESPACE.sub(' ', conn.last_statement).strip() if conn.last_statement else key
+        _ensure_handler()
+        logger.warning("slow query %.1f ms in %s(): %s", duration * 1000, caller, statement,
+                       extra={'event': 'slow_query', 'duration_ms': round(duration * 1000, 3),
+                              'caller': caller, 'sql': statement})
+
+    if explain and first_seen and key.upper().startswith(_EXPLAINABLE):
+        _explain(conn, sql, parameters, stats, caller)
+
+def _explain(conn, sql, parameters, stats, caller):
+    """EXPLAIN QUERY PLAN для нового запроса и поиск полных просмотров"""
+    try:
+        cursor = sqlite3.Cursor(conn)
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, parameters)
+        plan = [row[-1] for row in cursor.fetchall()]
+    except sqlite3.Error:
+        return
+    stats.plan = plan
+    scans = [step for step in plan
+             if step.startswith('SCAN ') and 'INDEX' not in step]
+    if scans:
+        stats.full_scan = True
+        FULL_SCANS.labels(caller).inc()
+        _ensure_handler()
+        logger.warning("full scan in %s(): %s | %s", caller, '; '.join(scans), stats.sql,
+                       extra={'event': 'full_scan', 'caller': caller, 'plan': scans, 'sql': stats.sql})
+
+class TracedCursor(sqlite3.Cursor):
+    """Курсор, замеряющий время выполнения запросов"""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record(self.connection, sql, parameters,
+                   time.perf_counter() - started, sys._getframe(1).f_code.co_name)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record(self.connection, sql, (),
+                   time.perf_counter() - started, sys._getframe(1).f_code.co_name)
+
+class TracedConnection(sqlite3.Connection):
+    """Соединение с трассировкой: set_trace_callback сообщает фактический текст
+    запроса (с подставленными параметрами), курсор — время выполнения"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.last_statement = None
+        self.set_trace_callback(self._trace)
+
+    def _trace(self, statement):
+        self.last_statement = statement
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        cursor = self.cursor()
+        started = time.perf_counter()
+        try:
+            return sqlite3.Cursor.execute(cursor, sql, parameters)
+        finally:
+            record(self, sql, parameters,
+                   time.perf_counter() - started, sys._getframe(1).f_code.co_name)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            record(self, 'COMMIT', (), time.perf_counter() - started, sys._getframe(1).f_code.co_name)
+
+def connect(database, **kwargs):
+    """Соединение с трассировкой"""
+    return sqlite3.connect(database, factory=TracedConnection, **kwargs)
+
+# =============================================================================
+# ОТЧЁТЫ
+# =============================================================================
+
+def top_statements(n=10):
+    """Топ-N запросов по суммарному времени"""
+    with _stats_lock:
+        items = sorted(_stats.values(), key=lambda s: s.total, reverse=True)[:n]
+        return [{
+            'sql': s.sql,
+            'count': s.count,
+            'total_ms': s.total * 1000,
+            'avg_ms': s.total * 1000 / s.count,
+            'max_ms': s.max * 1000,
+            'callers': dict(s.callers),
+            'full_scan': s.full_scan,
+        } for s in items]
+
+def format_report(n=10):
+    """Текстовый отчёт для команды администратора"""
+    statements = top_statements(n)
+    if not statements:
+        return "Нет данных (трассировка выключена или запросов ещё не было)"
+
+    lines = [f"Топ-{len(statements)} запросов по суммарному времени:"]
+    for i, s in enumerate(statements, 1):
+        callers = ', '.join(f"{name}×{count}" for name, count in
+                            sorted(s['callers'].items(), key=lambda kv: -kv[1]))
+        scan = " ⚠️ полный просмотр" if s['full_scan'] else ""
+        lines.append(
+            f"\n{i}. {s['total_ms']:.1f} мс всего, {s['count']} раз, "
+            f"ср. {s['avg_ms']:.2f} мс, макс. {s['max_ms']:.1f} мс{scan}\n"
+            f"   {callers}\n"
+            f"   {s['sql'][:300]}"
+        )
+    return '\n'.join(lines)
+
+def reset():
+    """Сброс накопленной статистики"""
+    with _stats_lock:
+        _stats.clear()
@@ -0,0 +1,75 @@
+# startup.py
+# Замер этапов запуска и фоновый прогрев кэшей
+
+import threading
+import time
+from contextlib import contextmanager
+
+import logs
+import metrics
+
+# Момент импорта модуля — практически начало работы процесса
+STARTED = time.monotonic()
+
+PHASE_SECONDS = metrics.gauge(
+    'webtech_startup_phase_seconds', 'Длительность этапов запуска', ['phase'])
+FIRST_UPDATE_SECONDS = metrics.gauge(
+    'webtech_startup_first_update_seconds', 'Время от запуска до первого обработанного обновления')
+
+_phases = []
+_warmups = []
+_first_update_seen = False
+
+@contextmanager
+def phase(name):
+    """Замер этапа запуска"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started
+        _phases.append((name, duration))
+        PHASE_SECONDS.labels(name).set(duration)
+
+def report():
+    """Сводка по этапам запуска: в консоль и в журнал"""
+    total = time.monotonic() - STARTED
+    lines = ["⏱️ Запуск:"]
+    for name, duration in _phases:
+        lines.append(f"   {name:<12} {duration * 1000:8.1f} мс")
+    lines.append(f"   {'всего':<12} {total * 1000:8.1f} мс")
+    print('\n'.join(lines))
+    logs.log_event('startup', total_ms=round(total * 1000, 1),
+                   phases={name: round(duration * 1000, 1) for name, duration in _phases})
+
+def mark_first_update():
+    """Время до первого обработанного обновления (фиксируется один раз)"""
+    global _first_update_seen
+    if _first_update_seen:
+        return
+    _first_update_seen = True
+    elapsed = time.monotonic() - STARTED
+    FIRST_UPDATE_SECONDS.set(elapsed)
+    logs.log_event('first_update', seconds_since_start=round(elapsed, 3))
+
+def add_warmup(name, function):
+    """Задача прогрева, выполняемая в фоне после запуска"""
+    _warmups.append((name, function))
+
+def _run_warmups():
+    for name, function in _warmups:
+        started = time.perf_counter()
+        try:
+            function()
+        except Exception as e:
+            logs.log_error('warmup_failed', e, warmup=name)
+            continue
+        duration = time.perf_counter() - started
+        PHASE_SECONDS.labels(f'warmup:{name}').set(duration)
+        logs.log_event('warmup', warmup=name, duration_ms=round(duration * 1000, 1))
+
+def warm_up_in_background():
+    """Прогрев кэшей в отдельном потоке, не задерживая приём обновлений"""
+    thread = threading.Thread(target=_run_warmups, name='warmup', daemon=True)
+    thread.start()
+    return thread
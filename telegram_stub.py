@@ -0,0 +1,239 @@
+# telegram_stub.py
+# Заглушка Bot API для локальной нагрузочной проверки бота (bot.py или cluster.py)
+#
+# Каждый виртуальный пользователь работает по замкнутому циклу: отправляет
+# действие, ждёт ответа бота (пока бот не замолчит на --settle мс), затем
+# нажимает одну из присланных inline-кнопок или отправляет следующую команду.
+#
+# Пример:
+#   python telegram_stub.py --users 200 --actions 20 --port 8081
+#   TELEGRAM_API_URL=http://127.0.0.1:8081/bot{0}/{1} python cluster.py --workers 4
+
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+# Сценарий пользователя: текстовые действия и нажатия кнопок ('click')
+SCRIPT = [
+    "/start", "📚 Изучить понятие", 'click', "🎯 Викторина",
+    'click', 'click', 'click', 'click', 'click', 'click',
+    "📊 Моя статистика", "/top",
+]
+
+class VirtualUser:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.step = 0
+        self.buttons = []
+        self.sent_at = None
+        self.first_reply = None
+        self.last_reply = None
+        self.done = 0
+
+class StubTelegram:
+    """Состояние заглушки: очередь обновлений и пользователи"""
+
+    def __init__(self, users, actions, settle, timeout, seed=None):
+        self.rng = random.Random(seed)
+        self.users = {1000 + i: VirtualUser(1000 + i) for i in range(users)}
+        self.actions = actions
+        self.settle = settle
+        self.timeout = timeout
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.lock = threading.Lock()
+        self.update_id = 0
+        self.message_id = 0
+        self.latencies = []
+        self.timeouts = 0
+        self.calls = {}
+        self.started = None
+        self.finished = None
+
+    # --- входящие обновления ---------------------------------------------
+
+    def _push(self, update):
+        with self.condition:
+            self.update_id += 1
+            update['update_id'] = self.update_id
+            self.pending.append(update)
+            self.condition.notify_all()
+
+    def _act(self, user):
+        """Следующее действие пользователя"""
+        action = SCRIPT[user.step % len(SCRIPT)]
+        user.step += 1
+        user.sent_at = time.perf_counter()
+        user.first_reply = user.last_reply = None
+        sender = {'id': user.user_id, 'is_bot': False, 'first_name': f'User{user.user_id}'}
+        chat = {'id': user.user_id, 'type': 'private'}
+
+        if action == 'click' and user.buttons:
+            data = self.rng.choice(user.buttons)
+            self._push({'callback_query': {
+                'id': str(self.update_id + 1), 'from': sender, 'chat_instance': str(user.user_id),
+                'data': data,
+                'message': {'message_id': self.message_id, 'date': int(time.time()), 'chat': chat, 'text': '…'},
+            }})
+        else:
+            text = action if action != 'click' else "📚 Изучить понятие"
+            self._push({'message': {
+                'message_id': self.update_id + 1, 'date': int(time.time()),
+                'from': sender, 'chat': chat, 'text': text,
+            }})
+
+    def get_updates(self, limit, wait):
+        with self.condition:
+            if not self.pending:
+                self.condition.wait(wait)
+            batch = []
+            while self.pending and len(batch) < limit:
+                batch.append(self.pending.popleft())
+            return batch
+
+    # --- ответы бота -------------------------------------------------------
+
+    def on_call(self, method, params):
+        """Учёт вызова Bot API; возвращает поле result ответа"""
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            self.message_id += 1
+            message_id = self.message_id
+
+        chat_id = params.get('chat_id')
+        user = self.users.get(int(chat_id)) if chat_id and chat_id.lstrip('-').isdigit() else None
+        if user is not None:
+            now = time.perf_counter()
+            user.first_reply = user.first_reply or now
+            user.last_reply = now
+            markup = params.get('reply_markup')
+            if markup:
+                buttons = [
+                    button['callback_data']
+                    for row in json.loads(markup).get('inline_keyboard', [])
+                    for button in row if 'callback_data' in button
+                ]
+                if buttons:
+                    user.buttons = [b for b in buttons if b != 'main_menu'] or buttons
+
+        if method in ('sendMessage', 'editMessageText', 'sendPhoto'):
+            return {
+                'message_id': message_id, 'date': int(time.time()),
+                'chat': {'id': int(chat_id or 0), 'type': 'private'}, 'text': params.get('text', ''),
+            }
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'Stub', 'username': 'stub_bot'}
+        return True
+
+    # --- цикл пользователей ------------------------------------------------
+
+    def run(self):
+        """Замкнутые циклы всех пользователей до --actions действий каждого"""
+        self.started = time.perf_counter()
+        for user in self.users.values():
+            self._act(user)
+
+        while True:
+            time.sleep(0.005)
+            now = time.perf_counter()
+            active = 0
+            for user in self.users.values():
+                if user.done >= self.actions:
+                    continue
+                active += 1
+                if user.last_reply is not None and now - user.last_reply >= self.settle:
+                    self.latencies.append(user.first_reply - user.sent_at)
+                elif now - user.sent_at >= self.timeout:
+                    self.timeouts += 1
+                else:
+                    continue
+                user.done += 1
+                if user.done < self.actions:
+                    self._act(user)
+            if not active:
+                break
+        self.finished = time.perf_counter()
+
+    def summary(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        latencies = sorted(self.latencies)
+        result = {
+            'users': len(self.users),
+            'actions': len(latencies) + self.timeouts,
+            'timeouts': self.timeouts,
+            'elapsed_seconds': round(elapsed, 3),
+            'actions_per_second': round((len(latencies) + self.timeouts) / elapsed, 1) if elapsed else None,
+            'calls': self.calls,
+        }
+        if latencies:
+            result.update(
+                latency_median_ms=round(statistics.median(latencies) * 1000, 2),
+                latency_p95_ms=round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+                latency_max_ms=round(latencies[-1] * 1000, 2),
+            )
+        return result
+
+def make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        def _handle(self):
+            parts = urlsplit(self.path)
+            params = dict(parse_qsl(parts.query))
+            length = int(self.headers.get('Content-Length') or 0)
+            if length:
+                params.update(parse_qsl(self.rfile.read(length).decode()))
+            method = parts.path.rsplit('/', 1)[-1]
+
+            if method == 'getUpdates':
+                result = [
+                    u for u in stub.get_updates(int(params.get('limit', 100)),
+                                                float(params.get('timeout', 0)) or 0.5)
+                ]
+            else:
+                result = stub.on_call(method, params)
+
+            body = json.dumps({'ok': True, 'result': result}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = do_POST = _handle
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка Telegram Bot API для нагрузочной проверки")
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--users', type=int, default=100, help="Виртуальных пользователей")
+    parser.add_argument('--actions', type=int, default=20, help="Действий на пользователя")
+    parser.add_argument('--settle', type=float, default=0.05,
+                        help="Тишина (с), после которой ответ бота считается законченным")
+    parser.add_argument('--timeout', type=float, default=10.0, help="Ожидание ответа на действие (с)")
+    parser.add_argument('--wait', type=float, default=0,
+                        help="Задержка перед началом (с), чтобы бот успел запуститься")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    stub = StubTelegram(args.users, args.actions, args.settle, args.timeout, args.seed)
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(stub))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Заглушка Bot API: http://127.0.0.1:{args.port}/bot{{0}}/{{1}}")
+
+    time.sleep(args.wait)
+    stub.run()
+    print(json.dumps(stub.summary(), ensure_ascii=False, indent=2))
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()